@@ -5,8 +5,15 @@ import time
 from func.base_logger import logger
 from func.reddit_connection import RedditData
 from func.timer import RefreshTimer
-from data.exceptions import MainOperationException, FatalLoginError
-from data.configs import BotInfo, Subreddits
+from func.poll_scheduler import PollScheduler
+from func.bulk_data import BulkDataRefresher
+from func.flavour_pool import flavour_pool
+from func.image_catalog import ImageCatalog
+from func.stream_checkpoints import CheckpointStore
+import func.scryfall_functions as sf
+from func.circuit_breaker import CircuitBreaker
+from data.exceptions import MainOperationException, FatalLoginError, CircuitOpen
+from data.configs import BotInfo, Subreddits, PollingSettings, BreakerSettings
 import func.reddit_actions as r
 
 
@@ -16,37 +23,77 @@ def main():
     print("Init...")
     logger.info('New Reddit session start.')
     image_refresh = RefreshTimer(1800)  # Joke image submissions fetch timer
+    BulkDataRefresher().start()  # Scryfall card index refresh runs in the background
+    flavour_pool.start()  # Random flavour texts are prefetched in the background
+    r.replied_index.load()  # Items replied to before a restart aren't replied to again
+    r.reply_pipeline.start()  # Replies are rendered and posted in the background
+    image_pool = r.ImagePool(Subreddits.SUBMISSION_SUBREDDITS, ImageCatalog(Subreddits.IMAGE_CATALOG_FILE))
+    image_pool.load()  # Joke images known from the previous run are available right away
 
     # Login
     try:
-        connection = RedditData(BotInfo.REDDIT_OAUTH, Subreddits.CALL_SUBREDDITS)
-        image_submission_links = r.sub_actions(connection, Subreddits.SUBMISSION_SUBREDDITS)
+        connection = RedditData(BotInfo.REDDIT_OAUTH, Subreddits.CALL_SUBREDDITS,
+                                CheckpointStore(Subreddits.STREAM_CHECKPOINT_FILE))
     except FatalLoginError as e:
         print(e)
         sys.exit()
+    r.flair_queue.start(connection.new_session)  # Image submission flair updates are applied in the background
+    r.reconcile_image_pool(connection, image_pool)  # Catches up with Reddit in the background
+
+    poll_scheduler = PollScheduler([(sub, item_type) for sub in connection.subreddit_streams
+                                    for item_type in ("comment", "submission")],
+                                   PollingSettings.MIN_POLL_INTERVAL, PollingSettings.MAX_POLL_INTERVAL,
+                                   PollingSettings.TARGET_ITEMS_PER_POLL, PollingSettings.ARRIVAL_RATE_SMOOTHING,
+                                   PollingSettings.POLL_RATE_LIMIT_SHARE)
 
     logger.info('Reddit session successfully started.')
     print("...init complete.")
 
-    # Loop
-    while True:
-        try:
+    # One circuit breaker per dependency: every stream and the image refresh fail and recover independently
+    stream_breakers = {stream: new_breaker(f"{stream[0]} {stream[1]} stream") for stream in poll_scheduler.intervals}
+    image_breaker = new_breaker("image refresh")
+
+    # Loop, the collectible counts are written back to Reddit however it ends (Ctrl+C or an uncaught error)
+    try:
+        while True:
             if image_refresh.recurring_timer():  # Has 30 minutes passed?
-                image_submission_links = r.sub_actions(connection, Subreddits.SUBMISSION_SUBREDDITS)
+                try:
+                    image_breaker.call(r.sub_actions, connection, image_pool)
+                except (MainOperationException, CircuitOpen):
+                    # Retry once the circuit allows
+                    image_refresh.new_expiry_time(image_breaker.seconds_until_retry())
+                logger.info(f"Scryfall lookup cache: {sf.image_cache.stats()}, "
+                            f"skipped for latency budget or outage: {dict(sf.degradations)}")
+                logger.info(f"Reply pipeline: {r.reply_pipeline.stats()}")
 
-            for sub in Subreddits.CALL_SUBREDDITS:
-                r.comment_action(connection, sub, image_submission_links)
-                r.submission_action(connection, sub, image_submission_links)
+            # Every stream (subreddit, or multireddit with combined streams) is polled at its own pace
+            for sub, item_type in poll_scheduler.due_streams():
+                stream_action = r.comment_action if item_type == "comment" else r.submission_action
+                stream_breaker = stream_breakers[(sub, item_type)]
+                try:
+                    # The current pool, a refresh swaps in a new list
+                    items = stream_breaker.call(stream_action, connection, sub, image_pool.urls)
+                    poll_scheduler.record_poll((sub, item_type), items)
+                except CircuitOpen:
+                    poll_scheduler.defer((sub, item_type), stream_breaker.seconds_until_retry())
+                except MainOperationException:
+                    connection.subreddit_streams[sub].reopen(item_type)  # The error ended the stream
+                    poll_scheduler.defer((sub, item_type), stream_breaker.seconds_until_retry())
+            poll_scheduler.update_rate_limits(connection.rate_limits())  # Replies and flair updates count too
 
-        except MainOperationException:
-            connection = RedditData(BotInfo.REDDIT_OAUTH, Subreddits.CALL_SUBREDDITS)
+            # Wait for the next stream that is due
+            time.sleep(max(poll_scheduler.seconds_until_due(), 0.5))
+    finally:
+        connection.close()
 
-        except FatalLoginError as e:
-            print(e)
-            sys.exit()
 
-        # Reddit has in-built sleep already but just in case sleep again
-        time.sleep(5)
+def new_breaker(name: str) -> CircuitBreaker:
+    """
+    :param name: Name of the dependency.
+    :return: A CircuitBreaker with the configured settings that counts MainOperationExceptions as failures.
+    """
+    return CircuitBreaker(name, BreakerSettings.FAILURE_THRESHOLD, BreakerSettings.BASE_DELAY,
+                          BreakerSettings.MAX_DELAY, BreakerSettings.JITTER, (MainOperationException,))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+"""Call burst handling of the inline reply loop versus the reply pipeline behind main(), against local stand-ins."""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import types
+from http.server import ThreadingHTTPServer
+
+from benchmarks.reply_fanout import StandInScryfall
+from data.configs import MiscSettings, ScryfallSettings, ReplySettings
+
+REPLY_LATENCY = 0.3  # Seconds a Reddit reply takes
+TARGET = "test"
+
+
+def recorded_burst(calls: int, serial: str) -> list:
+    """
+    A burst of call comments from different authors in a few threads, every one calling new cards
+    so that the lookup caches don't help.
+    :param calls: Number of comments.
+    :param serial: Makes the card names of this burst unique.
+    :return: A list of praw comment stand-ins.
+    """
+    return [types.SimpleNamespace(
+        body=f"Look at [[Card {serial}-{number}-a]] and [[Card {serial}-{number}-b]]",
+        id=f"{serial}{number}", fullname=f"t1_{serial}{number}", link_id=f"t3_thread{number % 4}",
+        permalink=f"/r/{TARGET}/comments/{serial}{number}", created_utc=time.time(),
+        author=types.SimpleNamespace(name=f"caller{number}"), subreddit=types.SimpleNamespace(display_name=TARGET)
+    ) for number in range(calls)]
+
+
+class StandInReddit:
+    """
+    A praw.Reddit stand-in: the comment stream of the subreddit delivers the burst, a reply takes REPLY_LATENCY.
+    """
+    def __init__(self, burst: list):
+        self.burst = burst
+
+    def subreddit(self, _name: str):
+        return types.SimpleNamespace(stream=types.SimpleNamespace(
+            comments=lambda pause_after, **options: iter(self.burst + [None]),
+            submissions=lambda pause_after, **options: iter([None])
+        ))
+
+    @staticmethod
+    def comment(_comment_id: str):
+        return types.SimpleNamespace(reply=lambda _text: time.sleep(REPLY_LATENCY))
+
+
+def stand_in_reddit_data(burst: list):
+    """
+    :param burst: Call comments.
+    :return: A RedditData stand-in whose stream delivers the burst.
+    """
+    from func.reddit_connection import SubredditData
+
+    reddit = StandInReddit(burst)
+    stream_data = SubredditData(TARGET, reddit)
+    return types.SimpleNamespace(reddit=reddit, subreddit_streams={TARGET: stream_data}, session=lambda: reddit,
+                                 done=stream_data.done)
+
+
+def main():
+    """
+    Usage: python -m benchmarks.call_burst [calls per burst]
+    """
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    with tempfile.TemporaryDirectory() as directory:
+        ReplySettings.REPLIED_INDEX_FILE = os.path.join(directory, "replied_items.log")
+        run(calls)
+
+
+def run(calls: int):
+    """
+    Runs the bursts against the stand-in server.
+    :param calls: Number of calls per burst.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInScryfall)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ScryfallSettings.API_URL = f"http://127.0.0.1:{server.server_port}"
+    ScryfallSettings.CARD_INDEX_FILE = ""
+    ScryfallSettings.RESPONSE_CACHE_FILE = ":memory:"
+    ScryfallSettings.REPLY_LATENCY_BUDGET = 30
+    ScryfallSettings.REQUESTS_PER_SECOND = 1000  # The stand-in has no rate limit
+    MiscSettings.NFT_REPLIES_ON = False
+
+    # Imported after the settings point to the stand-in server
+    import func.reddit_actions as r
+    from func.reply_pipeline import ReplyJob
+
+    image_links = ["https://example.com/joke.png"]
+    for thread_number in range(4):
+        r.title_cache.put(f"t3_thread{thread_number}", "A thread")
+
+    # The loop before the reply pipeline: every call is rendered and posted before the next one is read
+    burst = recorded_burst(calls, "inline")
+    reddit_data = stand_in_reddit_data(burst)
+    start = time.perf_counter()
+    for comment in burst:
+        regex_matches = r.get_regex_bracket_matches(comment.body)
+        if r.comment_requires_action(comment, regex_matches):
+            job = ReplyJob("comment", comment, regex_matches, None, reddit_data, image_links)
+            job.reply_text = r.render_reply(job)
+            r.post_reply(job)
+    inline_seconds = time.perf_counter() - start
+
+    # main(): one stream poll queues the calls, the reply pipeline renders and posts them in the background
+    finished = threading.Semaphore(0)
+
+    def on_finish(job: ReplyJob, replied: bool):
+        r.finish_reply(job, replied)
+        finished.release()
+
+    r.reply_pipeline.on_finish = on_finish
+    r.reply_pipeline.start()
+    reddit_data = stand_in_reddit_data(recorded_burst(calls, "pipelined"))
+    start = time.perf_counter()
+    r.comment_action(reddit_data, TARGET, image_links)
+    poll_seconds = time.perf_counter() - start
+    for _ in range(calls):
+        finished.acquire()
+    pipeline_seconds = time.perf_counter() - start
+
+    total_stats = r.reply_pipeline.stats()["total"]
+    print(f"{calls} calls, {total_stats['jobs']} pipelined replies at most {ReplySettings.REPLIES_PER_SECOND}/s "
+          f"(burst {ReplySettings.REPLY_BURST})")
+    print(f"inline loop     stream blocked {inline_seconds:6.2f} s   all replied {inline_seconds:6.2f} s")
+    print(f"reply pipeline  stream blocked {poll_seconds:6.2f} s   all replied {pipeline_seconds:6.2f} s   "
+          f"call to reply mean {total_stats['work_mean_ms'] / 1000:.2f} s, "
+          f"max {total_stats['work_max_ms'] / 1000:.2f} s")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
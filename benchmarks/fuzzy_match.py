@@ -0,0 +1,87 @@
+"""Fuzzy card name matcher build time, query latency and accuracy over 30k+ names."""
+
+import random
+import statistics
+import string
+import sys
+import time
+
+from data.configs import ScryfallSettings
+from func.card_index import CardIndex
+from func.fuzzy_match import FuzzyMatcher
+
+COMMON_WORDS = ["of", "the", "storm", "dragon", "angel", "goblin", "elf", "knight", "lord", "sphinx", "bolt",
+                "crow", "wrath", "ritual", "shrine", "temple", "mage", "giant", "spirit", "shade", "growth"]
+ONSETS = ["b", "br", "c", "ch", "cr", "d", "dr", "f", "fl", "g", "gr", "h", "j", "k", "l", "m", "n", "p", "pr",
+          "qu", "r", "s", "sh", "sk", "sl", "st", "t", "th", "tr", "v", "w", "wr", "y", "z", ""]
+VOWELS = ["a", "e", "i", "o", "u", "y", "ae", "ea", "ou", "io"]
+CODAS = ["", "", "n", "r", "l", "s", "th", "ng", "ck", "x", "m", "t", "d", "sh"]
+
+
+def synthetic_names(count: int) -> list:
+    """
+    Unique made-up card names of one to three words: common card name words mixed with invented ones.
+    """
+    generator = random.Random(1)
+    vocabulary = list({"".join(generator.choice(ONSETS) + generator.choice(VOWELS) + generator.choice(CODAS)
+                               for _ in range(generator.randint(1, 3)))
+                       for _ in range(12000)})
+    names = set()
+    while len(names) < count:
+        words = [generator.choice(COMMON_WORDS if generator.random() < 0.3 else vocabulary)
+                 for _ in range(generator.randint(1, 3))]
+        names.add(" ".join(words))
+    return list(names)
+
+
+def misspell(name: str, generator: random.Random) -> str:
+    """One random typo: a substitution, deletion, insertion or swap of adjacent characters."""
+    position = generator.randrange(1, len(name) - 1)
+    typo = generator.choice(["substitute", "delete", "insert", "swap"])
+    if typo == "substitute":
+        return name[:position] + generator.choice(string.ascii_lowercase) + name[position + 1:]
+    if typo == "delete":
+        return name[:position] + name[position + 1:]
+    if typo == "insert":
+        return name[:position] + generator.choice(string.ascii_lowercase) + name[position:]
+    return name[:position - 1] + name[position] + name[position - 1] + name[position + 1:]
+
+
+def main():
+    """
+    Usage: python -m benchmarks.fuzzy_match [queries]
+    Uses the names of the offline card index if it has been built, otherwise 32000 synthetic names.
+    """
+    queries = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    card_index = CardIndex.load(ScryfallSettings.CARD_INDEX_FILE)
+    names = list(card_index.cards) if len(card_index) >= 30000 else synthetic_names(32000)
+
+    start = time.perf_counter()
+    matcher = FuzzyMatcher(names)
+    print(f"Indexed {len(matcher)} names in {time.perf_counter() - start:.2f} s.")
+
+    generator = random.Random(2)
+    latencies = []
+    correct = 0
+    matched = 0
+    for _ in range(queries):
+        name = generator.choice(names)
+        while len(name) < 5:  # Too short to misspell and still match
+            name = generator.choice(names)
+        query = misspell(name, generator)
+        start = time.perf_counter()
+        fuzzy_match = matcher.match(query, ScryfallSettings.FUZZY_MIN_CONFIDENCE)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if fuzzy_match:
+            matched += 1
+            correct += fuzzy_match[0] == name
+
+    latencies.sort()
+    print(f"{queries} misspelled queries: mean {statistics.mean(latencies):.0f} us, "
+          f"p50 {latencies[len(latencies) // 2]:.0f} us, p99 {latencies[int(len(latencies) * 0.99) - 1]:.0f} us")
+    print(f"Matched {matched / queries:.1%} at confidence {ScryfallSettings.FUZZY_MIN_CONFIDENCE}, "
+          f"{correct / max(matched, 1):.1%} of the matches were the intended name.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Replied item index false positive rate, lookup latency and memory use with a million replied ids."""
+
+import os
+import sys
+import tempfile
+import time
+
+from data.configs import ReplySettings
+from func.replied_index import BloomFilter, RepliedIndex
+
+
+def fullnames(start: int, count: int) -> list:
+    """
+    Comment fullnames with consecutive base-36 ids, like Reddit gives out.
+    """
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    names = []
+    for number in range(start, start + count):
+        base36 = ""
+        while number:
+            number, digit = divmod(number, 36)
+            base36 = digits[digit] + base36
+        names.append("t1_" + base36)
+    return names
+
+
+def main():
+    """
+    Usage: python -m benchmarks.replied_index [replied ids]
+    Fills a Bloom filter and a RepliedIndex (with a temporary log file) with the replied ids,
+    then looks up as many ids that weren't replied to.
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    replied = fullnames(36 ** 6, count)
+    unseen = fullnames(36 ** 6 + count, count)
+
+    bloom = BloomFilter(count, ReplySettings.REPLIED_INDEX_FALSE_POSITIVE_RATE)
+    start = time.perf_counter()
+    for fullname in replied:
+        bloom.add(fullname)
+    print(f"Bloom filter: {bloom.bit_count} bits, {bloom.hash_count} hashes, {bloom.__sizeof__() / 2 ** 20:.1f} MiB, "
+          f"filled in {time.perf_counter() - start:.1f} s.")
+    start = time.perf_counter()
+    false_positives = sum(fullname in bloom for fullname in unseen)
+    elapsed = time.perf_counter() - start
+    print(f"{count} unseen ids: {false_positives / count:.4%} false positives "
+          f"(sized for {ReplySettings.REPLIED_INDEX_FALSE_POSITIVE_RATE:.4%}), {elapsed / count * 1e6:.2f} us per lookup.")
+
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = os.path.join(directory, "replied_items.log")
+        index = RepliedIndex(log_file, ReplySettings.REPLIED_INDEX_MAX_AGE, count,
+                             ReplySettings.REPLIED_INDEX_FALSE_POSITIVE_RATE, ReplySettings.REPLIED_INDEX_PRUNE_INTERVAL)
+        start = time.perf_counter()
+        for fullname in replied:
+            index.add(fullname)
+        print(f"Replied index: {count} replies logged in {time.perf_counter() - start:.1f} s, "
+              f"log file {os.path.getsize(log_file) / 2 ** 20:.1f} MiB.")
+
+        start = time.perf_counter()
+        index = RepliedIndex(log_file, ReplySettings.REPLIED_INDEX_MAX_AGE, count,
+                             ReplySettings.REPLIED_INDEX_FALSE_POSITIVE_RATE, ReplySettings.REPLIED_INDEX_PRUNE_INTERVAL)
+        index.load()
+        print(f"Loaded {len(index)} entries in {time.perf_counter() - start:.1f} s, "
+              f"{index.memory_usage() / 2 ** 20:.1f} MiB in memory.")
+
+        start = time.perf_counter()
+        wrong = sum(fullname in index for fullname in unseen) + sum(fullname not in index for fullname in replied)
+        elapsed = time.perf_counter() - start
+        print(f"{2 * count} lookups: {wrong} wrong answers, {elapsed / (2 * count) * 1e6:.2f} us per lookup.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Reply generation time with sequential versus concurrent Scryfall lookups, against a local stand-in Scryfall."""
+
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from data.configs import ScryfallSettings
+
+LATENCY = 0.15  # Seconds the stand-in server takes per request
+
+
+class StandInScryfall(BaseHTTPRequestHandler):
+    """Answers /cards/collection and /cards/random like Scryfall, after a fixed delay."""
+    protocol_version = "HTTP/1.1"
+
+    def __reply(self, payload: dict):
+        time.sleep(LATENCY)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        """Random flavour card."""
+        self.__reply({"name": "Storm Crow", "flavor_text": "Storm Crow descending, winter unending."})
+
+    def do_POST(self):
+        """Card collection, every name is a card."""
+        identifiers = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["identifiers"]
+        self.__reply({"data": [{"name": identifier["name"], "image_uris": {"normal": "https://example.com/c.jpg"}}
+                               for identifier in identifiers]})
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    """
+    Usage: python -m benchmarks.reply_fanout [replies per case]
+    Every reply uses new card names, so the lookup caches don't help.
+    """
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInScryfall)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ScryfallSettings.API_URL = f"http://127.0.0.1:{server.server_port}"
+    ScryfallSettings.CARD_INDEX_FILE = ""
+    ScryfallSettings.RESPONSE_CACHE_FILE = ":memory:"
+    ScryfallSettings.REPLY_LATENCY_BUDGET = 30
+
+    import func.text_functions as tf  # Imported after the settings point to the stand-in server
+
+    serial = 0
+    for cards in (1, 5, 100):
+        for concurrent in (False, True):
+            ScryfallSettings.CONCURRENT_LOOKUPS = concurrent
+            timings = []
+            for _ in range(rounds):
+                serial += 1
+                regex_matches = [f"Card {serial}-{number}" for number in range(cards)]
+                start = time.perf_counter()
+                tf.generate_reply_text(regex_matches, ["https://example.com/joke.png"])
+                timings.append((time.perf_counter() - start) * 1000)
+            mode = "concurrent" if concurrent else "sequential"
+            print(f"{cards:>3} cards  {mode:<10}  mean {statistics.mean(timings):7.1f} ms   "
+                  f"max {max(timings):7.1f} ms")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Scryfall request latency with cold (new connection per request) versus warm (pooled keep-alive) connections."""
+
+import statistics
+import sys
+import time
+
+import requests
+
+from data.configs import BotInfo, ScryfallSettings
+from func.scryfall_functions import ScryfallClient
+
+
+def measure(send, count: int) -> list:
+    """
+    Times a number of requests, spaced out as Scryfall asks. The spacing is not part of the latency.
+    :param send: A function that sends one request and returns the response.
+    :param count: Number of requests.
+    :return: Latencies in milliseconds.
+    """
+    latencies = []
+    for _ in range(count):
+        time.sleep(1 / ScryfallSettings.REQUESTS_PER_SECOND)
+        start = time.perf_counter()
+        send().content
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list):
+    """Prints the latency summary."""
+    ordered = sorted(latencies)
+    print(f"{label:<6} mean {statistics.mean(ordered):7.1f} ms   p50 {ordered[len(ordered) // 2]:7.1f} ms   "
+          f"p95 {ordered[int(len(ordered) * 0.95) - 1]:7.1f} ms   max {ordered[-1]:7.1f} ms")
+
+
+def main():
+    """
+    Usage: python -m benchmarks.scryfall_latency [requests] [cardname] [API URL]
+    """
+    args = sys.argv[1:]
+    count = int(args[0]) if len(args) > 0 else 20
+    cardname = args[1] if len(args) > 1 else "Storm Crow"
+    base_url = args[2] if len(args) > 2 else ScryfallSettings.API_URL
+
+    client = ScryfallClient(base_url, BotInfo.SCRYFALL_USER_AGENT_HEADER, ScryfallSettings.REQUESTS_PER_SECOND,
+                            ScryfallSettings.REQUEST_BURST, ScryfallSettings.CONNECTION_POOL_SIZE,
+                            ScryfallSettings.CONNECTION_POOLS, ScryfallSettings.MAX_RETRIES, ScryfallSettings.CONNECT_TIMEOUT,
+                            ScryfallSettings.READ_TIMEOUT)
+
+    def cold():
+        """A new connection (TCP and TLS handshake) for every request, like the bare requests.get calls."""
+        return requests.get(f"{base_url}/cards/named", params={"exact": cardname},
+                            headers=BotInfo.SCRYFALL_USER_AGENT_HEADER)
+
+    def warm():
+        """A kept-alive connection from the client's pool."""
+        return client.session.get(f"{base_url}/cards/named", params={"exact": cardname})
+
+    warm()  # Open the pooled connection
+    report("cold", measure(cold, count))
+    report("warm", measure(warm, count))
+
+
+if __name__ == "__main__":
+    main()
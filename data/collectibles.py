@@ -1,33 +1,123 @@
 """Colossal Dreadmaw special."""
 
+import sqlite3
+import threading
+
 import praw
+import praw.exceptions
+import prawcore
+
+from func.base_logger import logger
 from data.configs import MiscSettings
 
 
-class CollectibleCards:
+class CollectibleCounters:
     """
-    All 'collectible' card objects.
+    Write-back call counters of the collectible cards. Every count is read from its Reddit counter comment once,
+    collector numbers are then handed out from memory and stored locally right away. A background thread
+    writes the counts to the counter comments, one edit per changed count however many numbers were issued.
+    The local store makes sure that a restarted bot doesn't issue a number again before the comment caught up.
     """
-    TIMER_MIN = MiscSettings.NFT_REPLY_MIN_TIMER
-    TIMER_MAX = MiscSettings.NFT_REPLY_MAX_TIMER
-
-    def __init__(self, reddit: praw.Reddit):
+    def __init__(self, reddit: praw.Reddit, db_file: str, flush_interval: float):
+        """
+        Opens (and creates if needed) the local counter database.
+        :param reddit: Reddit instance used only by the counters, the writes run in their own thread.
+        :param db_file: Path to the SQLite database file.
+        :param flush_interval: Seconds between writes to the counter comments.
+        """
         self.reddit = reddit
-
-    def _previous_count(self, count_comment_id: str) -> int:
+        self.flush_interval = flush_interval
+        self.__lock = threading.Lock()
+        self.__counts = {}  # Name -> the next collector number
+        self.__flushed = {}  # Name -> the count in the counter comment
+        self.__comments = {}  # Name -> counter comment id
+        self.__stop = threading.Event()
+        self.__thread = None
+        self.__connection = sqlite3.connect(db_file, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS collectible_counts (name TEXT PRIMARY KEY, count INTEGER NOT NULL)"
+            )
+
+    def load(self, name: str, count_comment_id: str):
+        """
+        Reads a collectible's count from its counter comment and from the local store, the higher one wins.
+        :param name: Name of the collectible card.
+        :param count_comment_id: Id of the Reddit comment that holds the count.
+        """
+        remote_count = int(self.reddit.comment(count_comment_id).body)
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT count FROM collectible_counts WHERE name = ?", (name,)
+            ).fetchone()
+            self.__comments[name] = count_comment_id
+            self.__flushed[name] = remote_count
+            self.__counts[name] = max(remote_count, row[0] if row else 0)
+        logger.info(f"{name} count loaded: {self.__counts[name]} (counter comment {remote_count}).")
+
+    def issue(self, name: str) -> int:
         """
-        Fetches the current Dreadmaw call count from Reddit.
-        :return: Number of times Dreadmaw has been called.
+        Hands out the next collector number and stores the new count locally before returning it.
+        :param name: Name of the collectible card.
+        :return: The collector number.
         """
-        number = int(self.reddit.comment(count_comment_id).body)
+        with self.__lock, self.__connection:
+            number = self.__counts[name]
+            self.__counts[name] = number + 1
+            self.__connection.execute("INSERT OR REPLACE INTO collectible_counts VALUES (?, ?)", (name, number + 1))
         return number
 
-    def _increment_count(self, old_count: int, count_comment_id: str):
+    def start(self):
+        """
+        Starts the background thread that writes the counts to the counter comments. Does nothing if it's running.
+        """
+        if self.__thread is not None and self.__thread.is_alive():
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__run, name="CollectibleCounters", daemon=True)
+        self.__thread.start()
+
+    def stop(self):
         """
-        Edits the post on Reddit that contains Dreadmaw's call count and updates the count.
+        Stops the background thread after a last write.
         """
-        new_count: int = old_count + 1
-        self.reddit.comment(count_comment_id).edit(str(new_count))
+        self.__stop.set()
+        if self.__thread is not None:
+            self.__thread.join()
+
+    def __run(self):
+        """
+        Thread target: writes the changed counts every flush interval, and once more when stopped.
+        """
+        while not self.__stop.wait(self.flush_interval):
+            self.flush()
+        self.flush()
+
+    def flush(self):
+        """
+        Edits the counter comments whose counts have changed. A failed edit is tried again on the next flush.
+        """
+        with self.__lock:
+            changed = {name: count for name, count in self.__counts.items() if count != self.__flushed[name]}
+        for name, count in changed.items():
+            try:
+                self.reddit.comment(self.__comments[name]).edit(str(count))
+            except (prawcore.PrawcoreException, praw.exceptions.PRAWException) as edit_e:
+                logger.warning(f"{name} counter comment update failed, trying again later. Error code: {edit_e}")
+                continue
+            with self.__lock:
+                self.__flushed[name] = count
+
+
+class CollectibleCards:
+    """
+    All 'collectible' card objects.
+    """
+    TIMER_MIN = MiscSettings.NFT_REPLY_MIN_TIMER
+    TIMER_MAX = MiscSettings.NFT_REPLY_MAX_TIMER
+
+    def __init__(self, counters: CollectibleCounters):
+        self.counters = counters
 
     @staticmethod
     def _count_to_str(count) -> str:
@@ -56,16 +146,15 @@ class StormCrow(CollectibleCards):
     NAME = "Storm Crow"
     COUNT_COMMENT = "mlnqxci"
 
-    def __init__(self, reddit: praw.Reddit):
-        super().__init__(reddit)
+    def __init__(self, counters: CollectibleCounters):
+        super().__init__(counters)
 
     def stormcrow_ascii_art(self) -> str:
         """
-        Fetches call count, updates it and returns ASCII art with a new collector number.
+        Issues the next collector number and returns ASCII art with it. Makes no Reddit requests.
         :return: ASCII art.
         """
-        prev_count = self._previous_count(self.COUNT_COMMENT)
-        self._increment_count(prev_count, self.COUNT_COMMENT)
+        prev_count = self.counters.issue(self.NAME)
         count_str = self._count_to_str(prev_count)
         art = self.__ascii_template(count_str)
         return art
@@ -112,16 +201,15 @@ class ColossalDreadmaw(CollectibleCards):
     NAME = "Colossal Dreadmaw"
     COUNT_COMMENT = "me0tbmp"
 
-    def __init__(self, reddit: praw.Reddit):
-        super().__init__(reddit)
+    def __init__(self, counters: CollectibleCounters):
+        super().__init__(counters)
 
     def dreadmaw_ascii_art(self) -> str:
         """
-        Fetches call count, updates it and returns ASCII art with a new collector number.
+        Issues the next collector number and returns ASCII art with it. Makes no Reddit requests.
         :return: ASCII art.
         """
-        prev_count = self._previous_count(self.COUNT_COMMENT)
-        self._increment_count(prev_count, self.COUNT_COMMENT)
+        prev_count = self.counters.issue(self.NAME)
         count_str = self._count_to_str(prev_count)
         art = self.__ascii_template(count_str)
         return art
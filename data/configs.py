@@ -21,6 +21,50 @@ class BotInfo:
     SCRYFALL_USER_AGENT_HEADER = {'user-agent': 'MTGCardBelcher/1.2.0', "accept": "*/*"}
 
 
+class ScryfallSettings:
+    """
+    Offline card index and Scryfall API settings.
+
+    The card index is built from a Scryfall bulk data file (oracle-cards or default-cards)
+    and is consulted before any request is made to the Scryfall API.
+    The API is always used if the card index hasn't been built.
+    The bulk data is re-downloaded and the index rebuilt in the background once a day.
+    """
+    BULK_DATA_FILE = "oracle-cards.json"
+    BULK_DATA_TYPE = "oracle-cards"  # Or "default-cards"
+    BULK_DATA_REFRESH_INTERVAL = 86400  # 24 h
+    BULK_DATA_CHECK_SLEEP = 60
+    BULK_DATA_TIMEOUT = 60
+    CARD_INDEX_FILE = "card_index.tsv.gz"
+    API_URL = "https://api.scryfall.com"
+    REQUESTS_PER_SECOND = 10  # Scryfall asks for 50-100 ms between requests
+    REQUEST_BURST = 2  # Lets the parallel lookups of a reply go out together
+    # The reply lookups of the render workers run on REPLY_LOOKUP_WORKERS threads (on the render workers themselves
+    # without CONCURRENT_LOOKUPS), and the flavour pool refill and the bulk data refresh add one request each
+    CONNECTION_POOL_SIZE = 6  # Kept-alive connections per host, one for every request that can run at the same time
+    CONNECTION_POOLS = 2  # Hosts with kept-alive connections: the API and the bulk data download host
+    MAX_RETRIES = 2  # After a 429 Too Many Requests
+    CONNECT_TIMEOUT = 3.05
+    READ_TIMEOUT = 10
+    REPLY_LATENCY_BUDGET = 5  # Seconds of Scryfall work per reply, then the reply goes without links/flavour
+    COLLECTION_BATCH_SIZE = 75  # Maximum number of identifiers per /cards/collection request
+    CACHE_MAX_SIZE = 5000  # Cardnames
+    CACHE_TTL = 86400  # 24 h
+    CACHE_NEGATIVE_TTL = 3600  # 1 h, not-a-card results are forgotten sooner in case a new card is released
+    RESPONSE_CACHE_FILE = "scryfall_cache.sqlite3"
+    RESPONSE_CACHE_MAX_AGE = 604800  # 1 week, then refreshed in the next batch, served stale if that fails
+    RESPONSE_CACHE_NEGATIVE_MAX_AGE = 86400  # 24 h
+    FUZZY_MATCHING = True  # Match misspelled names to the closest name in the offline card index
+    FUZZY_MIN_CONFIDENCE = 0.85  # 1 - edit distance / name length
+    CONCURRENT_LOOKUPS = True  # Look up a reply's card image batches and flavour text in parallel
+    REPLY_LOOKUP_WORKERS = 4
+    FLAVOUR_POOL_SIZE = 200
+    FLAVOUR_LOW_WATERMARK = 50  # Refill the flavour pool when fewer flavours are left
+    FLAVOUR_NO_REPEAT_WINDOW = 2000  # Flavours that aren't repeated
+    FLAVOUR_REFILL_CHECK = 60
+    API_FALLBACK = False  # Also ask the live API for names that the offline index doesn't know
+
+
 class Subreddits:
     """
     Call subreddits list (where the bot comments)
@@ -28,7 +72,29 @@ class Subreddits:
     """
     CALL_SUBREDDITS = ["magicthecirclejerking", "MTGCardBelcher_dev"]
     SUBMISSION_SUBREDDITS = ["MTGCardBelcher"]
+    COMBINED_STREAMS = True  # One sub1+sub2+... stream pair for all call subreddits instead of a pair per subreddit
+    MAX_MULTIREDDIT_LENGTH = 500  # Longer multireddit names are split into several streams
     MAX_IMAGE_SUBMISSIONS = 1000  # This cannot be higher than 1000
+    INCREMENTAL_IMAGE_SUBMISSIONS = 100  # New submissions fetched per incremental refresh, one listing page
+    INFO_BATCH_SIZE = 100  # Submissions re-checked per request, Reddit's limit
+    TITLE_CACHE_SIZE = 5000  # Parent submission titles kept for the comment exclusion checks
+    TITLE_CACHE_TTL = 86400  # 24 h
+    IMAGE_FULL_RESCAN_INTERVAL = 86400  # 24 hours between full rescans
+    IMAGE_CATALOG_FILE = "image_catalog.sqlite3"  # Image submissions kept between runs
+    STREAM_CHECKPOINT_FILE = "stream_checkpoints.sqlite3"  # Newest processed item of each stream, kept between runs
+    BACKFILL_MAX_REQUESTS = 3  # Listing pages fetched per stream to catch up on the calls missed during a restart
+
+
+class PollingSettings:
+    """
+    Adaptive stream polling: interval range, wanted items per poll, arrival rate smoothing,
+    and the share of the Reddit rate limit the polls may use (the rest is left for replies and other requests).
+    """
+    MIN_POLL_INTERVAL = 2
+    MAX_POLL_INTERVAL = 60
+    TARGET_ITEMS_PER_POLL = 10
+    ARRIVAL_RATE_SMOOTHING = 0.3  # Weight of the latest poll in the arrival rate average
+    POLL_RATE_LIMIT_SHARE = 0.5
 
 
 class IMGSubmissionParams:
@@ -40,6 +106,8 @@ class IMGSubmissionParams:
     Minimum upvote ratio for image approval.
 
     Submission flair IDs: basic, pending, approved, rejected.
+
+    Flair update workers: thread count, rate limit, retries.
     """
     MAX_IMAGE_APPROVE_TIMEDELTA = 1209600  # 2 weeks
     SCORE_THRESHOLD = 30
@@ -49,6 +117,48 @@ class IMGSubmissionParams:
     APPROVED_FLAIR_ID = '882ae2ac-2e80-11ef-bf2d-f2bf21373915'
     REJECTED_FLAIR_ID = '50a490ba-9cf5-11ef-834b-f6ac6a413fab'
     META_FEEDBACK_OTHER_FLAIR_ID = '997724da-2e80-11ef-996d-26eb2b2aa996'
+    UNDECIDED_FLAIR_IDS = (CARD_SUBMISSION_FLAIR_ID, PENDING_FLAIR_ID)  # Re-checked until approved or rejected
+    FLAIR_UPDATE_WORKERS = 2
+    FLAIR_UPDATES_PER_SECOND = 1
+    FLAIR_UPDATE_BURST = 5
+    FLAIR_UPDATE_RETRIES = 3
+    FLAIR_RETRY_DELAY = 10  # Seconds before the first retry, doubled for every further retry
+
+
+class ReplySettings:
+    """
+    Reply pipeline: render threads, queue sizes between the stages, reply rate,
+    and how long a stream reader waits for room in a full render queue before skipping the call.
+
+    Reply bursts: calls waiting per thread and per author, and the call age after which no reply is posted.
+
+    Replied item index: log file, entry lifetime, Bloom filter size and false positive rate, prune interval.
+    """
+    RENDER_WORKERS = 2
+    RENDER_QUEUE_SIZE = 50
+    POST_QUEUE_SIZE = 10
+    REPLIES_PER_SECOND = 1
+    REPLY_BURST = 3
+    SUBMIT_TIMEOUT = 1
+    MAX_WAITING_PER_THREAD = 10
+    MAX_WAITING_PER_AUTHOR = 2
+    MAX_REPLY_AGE = 600  # 10 minutes, older calls are skipped
+    REPLIED_INDEX_FILE = "replied_items.log"
+    REPLIED_INDEX_MAX_AGE = 86400  # 24 h, far longer than a resumed stream reaches back
+    REPLIED_INDEX_CAPACITY = 100000
+    REPLIED_INDEX_FALSE_POSITIVE_RATE = 0.001
+    REPLIED_INDEX_PRUNE_INTERVAL = 3600  # 1 h
+
+
+class BreakerSettings:
+    """
+    Circuit breakers: failures in a row that open a circuit, first and longest cooldown in seconds,
+    and the random share the cooldowns vary by.
+    """
+    FAILURE_THRESHOLD = 3
+    BASE_DELAY = 10
+    MAX_DELAY = 600  # 10 min
+    JITTER = 0.5
 
 
 class MiscSettings:
@@ -63,6 +173,8 @@ class MiscSettings:
     NFT_REPLIES_ON = True
     NFT_REPLY_MIN_TIMER = 300  # 5 min
     NFT_REPLY_MAX_TIMER = 7200  # 2 h
+    NFT_COUNTER_FILE = "collectible_counts.sqlite3"  # Collector numbers issued, kept between runs
+    NFT_COUNTER_FLUSH_INTERVAL = 60  # Seconds between counter comment updates
     SPECIAL_TIMER = 86400  # 24 h
 
 
@@ -13,3 +13,13 @@ class FatalLoginError(Exception):
 class MainOperationException(Exception):
     """Exception during normal operation."""
     pass
+
+
+class DeadlineExceeded(Exception):
+    """The latency budget of a reply ran out."""
+    pass
+
+
+class CircuitOpen(Exception):
+    """A circuit breaker refused the call because its dependency is failing."""
+    pass
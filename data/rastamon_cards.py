@@ -73,15 +73,3 @@ class Rastamon:
         SIMBABA, JAPUDI, KUKA_BEYO, TOBO_DIBI, BOSGWAN, MWABDI, KADYOBA,
         KOMDEGE_SWIGU, DODONBE_DUGDJITA, SEMBIZI_WAMDEYO, SEBI_GYANDU, GALATIANS,
     ]
-
-    @classmethod
-    def find_card(cls, suspect_name: str) -> "RastamonCard":
-        """
-        Finds the proper name of the Rastamonliveup card from the pool of alternate spellings.
-        :param suspect_name: Suspected Rastamonliveup cardname.
-        :return: Corresponding RastamonCard object if a match is found, an empty RastamonCard if no match.
-        """
-        for card in cls.CARDS:
-            if suspect_name.casefold() in card.spellings:
-                return card
-        return RastamonCard("", [], "")
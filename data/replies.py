@@ -108,3 +108,4 @@ class Spellings:
     """Spellings of certain special card calls."""
 
     NEGATE = ["negate", "naegate", "negaete", "naegaete", "nægate", "negæte", "nægæte"]
+    REVEL_IN_RICHES = ["revel in riches"]
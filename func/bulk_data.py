@@ -0,0 +1,151 @@
+"""Streaming Scryfall bulk data ingestion and the background card index refresh."""
+
+import io
+import json
+import sys
+import threading
+import time
+
+from func.base_logger import logger
+from func.card_index import CardIndex, bulk_card_to_indexed, write_card_index
+from func.timer import RefreshTimer
+import func.scryfall_functions as sf
+from data.configs import ScryfallSettings
+
+
+def iter_bulk_cards(text_fp, chunk_size: int = 65536):
+    """
+    Stream-parses a Scryfall bulk data file (one big JSON array) one card object at a time.
+    Only a single read chunk and the card being parsed are held in memory, never the whole file.
+    :param text_fp: A text file object (or a text stream) positioned at the start of the JSON array.
+    :param chunk_size: Number of characters read at a time.
+    :return: A generator of card dictionaries.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    array_open = False
+
+    while True:
+        chunk = text_fp.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+
+        while True:
+            # Skip whitespace and the separators between card objects
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= len(buffer):
+                break
+
+            if not array_open:
+                if buffer[position] != "[":
+                    raise ValueError("Bulk data is not a JSON array.")
+                array_open = True
+                position += 1
+                continue
+
+            if buffer[position] == "]":
+                return
+
+            try:
+                bulk_card, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # The card object continues in the next chunk
+            yield bulk_card
+
+        if not chunk:
+            raise ValueError("Bulk data ended before the JSON array was closed.")
+
+
+def ingest_bulk_cards(text_fp, index_file: str) -> int:
+    """
+    Writes the compact card index from a bulk data stream.
+    Keeps only the fields the bot uses and the first printing of each card name.
+    :param text_fp: A text file object (or a text stream) of a Scryfall bulk data file.
+    :param index_file: Path to the card index file that is written.
+    :return: Number of cards written.
+    """
+    seen_names = set()
+
+    def indexed_cards():
+        """Indexable cards from the stream, duplicate printings dropped."""
+        for bulk_card in iter_bulk_cards(text_fp):
+            card = bulk_card_to_indexed(bulk_card)
+            if card and card.name not in seen_names:
+                seen_names.add(card.name)
+                yield card
+
+    return write_card_index(indexed_cards(), index_file)
+
+
+def build_card_index(bulk_file: str, index_file: str) -> int:
+    """
+    Builds the offline card index from a local Scryfall bulk data file (oracle-cards or default-cards).
+    :param bulk_file: Path to the Scryfall bulk data JSON file.
+    :param index_file: Path to the card index file that is written.
+    :return: Number of cards written.
+    """
+    with open(bulk_file, "r", encoding="utf-8") as bulk_fp:
+        count = ingest_bulk_cards(bulk_fp, index_file)
+    logger.info(f"Offline card index with {count} cards written to {index_file}.")
+    return count
+
+
+class BulkDataRefresher(threading.Thread):
+    """
+    Background thread that downloads fresh Scryfall bulk data on a schedule,
+    rewrites the card index and hot swaps it into use without pausing the main loop.
+    """
+    def __init__(self, interval: int = ScryfallSettings.BULK_DATA_REFRESH_INTERVAL):
+        super().__init__(name="BulkDataRefresher", daemon=True)
+        self.refresh_timer = RefreshTimer(interval)
+        self.last_updated_at = ""
+        if not sf.card_index:
+            self.refresh_timer.new_expiry_time(0)  # No index yet, build one right away
+
+    def run(self):
+        """Thread loop."""
+        while True:
+            if self.refresh_timer.recurring_timer():
+                self.refresh()
+            time.sleep(ScryfallSettings.BULK_DATA_CHECK_SLEEP)
+
+    def refresh(self) -> bool:
+        """
+        Streams the newest bulk data file into a new card index and swaps it in.
+        :return: True if a new card index was swapped in, otherwise False.
+        """
+        # Lazy except because the old index keeps working, just try again on the next refresh
+        try:
+            bulk_info = sf.client.get('/bulk-data/' + ScryfallSettings.BULK_DATA_TYPE,
+                                      timeout=ScryfallSettings.BULK_DATA_TIMEOUT).json()
+
+            if bulk_info["updated_at"] == self.last_updated_at:
+                logger.info("Scryfall bulk data hasn't changed. Keeping the current card index.")
+                return False
+
+            with sf.client.get(bulk_info["download_uri"], stream=True,
+                               timeout=ScryfallSettings.BULK_DATA_TIMEOUT) as bulk_response:
+                bulk_response.raise_for_status()
+                bulk_response.raw.decode_content = True  # Let urllib3 undo the gzip transfer encoding
+                bulk_response.raw.auto_close = False  # The text wrapper reads past the end of the body
+                bulk_stream = io.TextIOWrapper(bulk_response.raw, encoding="utf-8")
+                count = ingest_bulk_cards(bulk_stream, ScryfallSettings.CARD_INDEX_FILE)
+
+            sf.swap_card_index(CardIndex.load(ScryfallSettings.CARD_INDEX_FILE))
+            self.last_updated_at = bulk_info["updated_at"]
+            logger.info(f"Card index refreshed from Scryfall bulk data with {count} cards.")
+            return True
+
+        except Exception as bulk_e:
+            logger.warning("Scryfall bulk data refresh failed. Keeping the current card index: " + str(bulk_e))
+            return False
+
+
+if __name__ == "__main__":
+    # Usage: python -m func.bulk_data [bulk data file] [card index file]
+    args = sys.argv[1:]
+    source = args[0] if len(args) > 0 else ScryfallSettings.BULK_DATA_FILE
+    target = args[1] if len(args) > 1 else ScryfallSettings.CARD_INDEX_FILE
+    print(f"Indexed {build_card_index(source, target)} cards from {source}.")
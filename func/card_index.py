@@ -0,0 +1,207 @@
+"""Offline Scryfall card index built from Scryfall bulk data."""
+
+import gzip
+import os
+
+from func.base_logger import logger
+from func.fuzzy_match import FuzzyMatcher
+
+
+class IndexedCard:
+    """
+    Holds the attributes of a single card in the offline card index.
+    """
+    __slots__ = ("name", "content_warning", "image", "flavour")
+
+    def __init__(self, name: str, content_warning: bool, image: str, flavour: str = ""):
+        """
+        Constructs the indexed card object.
+        :param name: Proper name of the card.
+        :param content_warning: True if Scryfall has flagged the card with a content warning.
+        :param image: Link to the normal size card image.
+        :param flavour: Flavour text of the card (or of its first face that has one).
+        """
+        self.name = name
+        self.content_warning = content_warning
+        self.image = image
+        self.flavour = flavour
+
+    def __str__(self):
+        return f"Attributes: {dict((slot, getattr(self, slot)) for slot in self.__slots__)}"
+
+    def reply_image(self) -> str:
+        """
+        The image link that can be used in a reply.
+        :return: Image URL, empty string if the card must not be linked (content warning).
+        """
+        if self.content_warning:
+            return ""
+        return self.image
+
+
+class CardIndex:
+    """
+    A casefolded card name -> IndexedCard lookup table.
+    Double-faced, split and other multi-face cards can be found both by their full name and by any face name.
+    Misspelled names can be found with the fuzzy matcher once it has been built.
+    """
+    # Layouts that aren't real cards and whose names would shadow real cards
+    SKIPPED_LAYOUTS = {"art_series", "token", "double_faced_token", "emblem"}
+
+    def __init__(self):
+        self.cards = {}
+        self.flavours = []
+        self.fuzzy_matcher = None
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __bool__(self):
+        return bool(self.cards)
+
+    @staticmethod
+    def name_key(cardname: str) -> str:
+        """
+        The lookup key of a card name.
+        :param cardname: Card name as written in the call.
+        :return: Casefolded card name with surrounding whitespace removed.
+        """
+        return cardname.strip().casefold()
+
+    def add(self, card: IndexedCard):
+        """
+        Adds a card to the index by its full name and by each of its face names.
+        Existing full name entries are never shadowed by face names.
+        :param card: An IndexedCard object.
+        """
+        self.cards.setdefault(self.name_key(card.name), card)
+        if card.flavour and not card.content_warning:
+            self.flavours.append(card.flavour)
+        if " // " in card.name:
+            for face_name in card.name.split(" // "):
+                self.cards.setdefault(self.name_key(face_name), card)
+
+    def lookup(self, cardname: str) -> "IndexedCard | None":
+        """
+        Finds a card by its exact (case-insensitive) name.
+        :param cardname: Card name as written in the call.
+        :return: The matching IndexedCard object, None if the card is not in the index.
+        """
+        return self.cards.get(self.name_key(cardname))
+
+    def build_fuzzy_matcher(self):
+        """
+        Builds the fuzzy matcher over all indexed names. Must be called again after adding cards.
+        """
+        self.fuzzy_matcher = FuzzyMatcher(self.cards)
+
+    def fuzzy_lookup(self, cardname: str, min_confidence: float) -> "IndexedCard | None":
+        """
+        Finds the card whose name is closest to a misspelled name.
+        :param cardname: Card name as written in the call.
+        :param min_confidence: Lowest accepted match confidence, from 0 to 1.
+        :return: The closest IndexedCard object, None if no name is close enough or there's no fuzzy matcher.
+        """
+        if self.fuzzy_matcher is None:
+            return None
+        fuzzy_match = self.fuzzy_matcher.match(self.name_key(cardname), min_confidence)
+        return self.cards[fuzzy_match[0]] if fuzzy_match else None
+
+    @classmethod
+    def load(cls, index_file: str) -> "CardIndex":
+        """
+        Loads a card index written by write_card_index.
+        :param index_file: Path to the compact card index file.
+        :return: A CardIndex object, empty if the file doesn't exist or can't be read.
+        """
+        index = cls()
+        try:
+            with gzip.open(index_file, "rt", encoding="utf-8") as index_fp:
+                for line in index_fp:
+                    name, content_warning, image, *flavour = line.rstrip("\n").split("\t")
+                    index.add(IndexedCard(name, content_warning == "1", image, unescape_field("".join(flavour))))
+        except FileNotFoundError:
+            logger.warning(f"No offline card index found at {index_file}. Using the Scryfall API only.")
+        except (OSError, ValueError) as index_e:
+            logger.warning(f"Offline card index {index_file} could not be read. Using the Scryfall API only. "
+                           f"Error: {index_e}")
+            index = cls()
+        else:
+            index.build_fuzzy_matcher()
+            logger.info(f"Offline card index loaded with {len(index)} names.")
+        return index
+
+
+def bulk_card_to_indexed(bulk_card: dict) -> "IndexedCard | None":
+    """
+    Picks the fields the bot needs from a Scryfall bulk data card object.
+    :param bulk_card: A single card object from a Scryfall bulk data file.
+    :return: An IndexedCard object, None if the card should not be indexed.
+    """
+    if bulk_card.get("layout") in CardIndex.SKIPPED_LAYOUTS or not bulk_card.get("name"):
+        return None
+
+    image_uris = bulk_card.get("image_uris")
+    if not image_uris and bulk_card.get("card_faces"):
+        image_uris = bulk_card["card_faces"][0].get("image_uris")  # Front face of a double-faced card
+
+    image = image_uris.get("normal", "") if image_uris else ""
+
+    flavour = bulk_card.get("flavor_text", "")
+    if not flavour:
+        face_flavours = [face["flavor_text"] for face in bulk_card.get("card_faces", []) if face.get("flavor_text")]
+        flavour = face_flavours[0] if face_flavours else ""
+
+    return IndexedCard(bulk_card["name"], bool(bulk_card.get("content_warning")), image, flavour)
+
+
+def escape_field(text: str) -> str:
+    """
+    Escapes a free text field (flavour text) so that it fits on a single tab separated line.
+    :param text: Text to escape.
+    :return: Escaped text.
+    """
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def unescape_field(text: str) -> str:
+    """
+    Reverses escape_field.
+    :param text: Escaped text.
+    :return: Original text.
+    """
+    if "\\" not in text:
+        return text
+    unescaped = []
+    characters = iter(text)
+    for character in characters:
+        if character == "\\":
+            escaped = next(characters, "")
+            unescaped.append({"t": "\t", "n": "\n"}.get(escaped, escaped))
+        else:
+            unescaped.append(character)
+    return "".join(unescaped)
+
+
+def write_card_index(cards, index_file: str) -> int:
+    """
+    Writes the cards into the compact on-disk card index: one gzipped, tab separated line per card.
+    The index is written into a temporary file first and then atomically moved in place,
+    so a reader never sees a half-written index.
+    :param cards: An iterable of IndexedCard objects.
+    :param index_file: Path to the card index file.
+    :return: Number of cards written.
+    """
+    count = 0
+    temp_file = f"{index_file}.tmp"
+    try:
+        with gzip.open(temp_file, "wt", encoding="utf-8") as index_fp:
+            for card in cards:
+                index_fp.write(f"{card.name}\t{'1' if card.content_warning else '0'}\t{card.image}"
+                               f"\t{escape_field(card.flavour)}\n")
+                count += 1
+        os.replace(temp_file, index_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+    return count
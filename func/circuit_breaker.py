@@ -0,0 +1,124 @@
+"""Circuit breakers that pause the work depending on a failing endpoint without blocking anything else."""
+
+import random
+import threading
+
+from func.base_logger import logger
+from func.timer import RefreshTimer
+from data.exceptions import CircuitOpen
+
+
+class CircuitBreaker:
+    """
+    Counts the failures of one dependency (an API, a stream). After enough failures in a row the circuit opens
+    and calls are refused for a cooldown that doubles with every trip and is jittered, so that recovering
+    endpoints aren't hit by every client at once. After the cooldown one probe call is let through (half-open):
+    its success closes the circuit, its failure opens it again for a longer cooldown.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, name: str, failure_threshold: int, base_delay: float, max_delay: float, jitter: float,
+                 failure_errors: tuple = (Exception,)):
+        """
+        Constructs the circuit breaker, initially closed.
+        :param name: Name of the dependency for the logs.
+        :param failure_threshold: Failures in a row that open the circuit.
+        :param base_delay: Seconds of the first cooldown.
+        :param max_delay: Longest cooldown in seconds.
+        :param jitter: Cooldowns vary randomly by this share, from 0 to 1.
+        :param failure_errors: Exceptions that count as failures in call.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.failure_errors = failure_errors
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.__cooldown = RefreshTimer(0)
+        self.__lock = threading.Lock()
+
+    def __str__(self):
+        return f"Attributes: {self.__dict__}"
+
+    def allow(self) -> bool:
+        """
+        Checks whether a call may be made. Lets one probe through once the cooldown has passed.
+        :return: True if the call may be made, otherwise False.
+        """
+        with self.__lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.__cooldown.single_timer():
+                self.state = self.HALF_OPEN
+                logger.info(f"Circuit for {self.name} half-open, probing.")
+                return True
+            return False
+
+    def seconds_until_retry(self) -> float:
+        """
+        :return: Seconds until a call may be made, 0 if the circuit is closed or the cooldown has passed.
+        """
+        with self.__lock:
+            return 0.0 if self.state == self.CLOSED else self.__cooldown.seconds_left()
+
+    def record_success(self):
+        """Closes the circuit."""
+        with self.__lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit for {self.name} closed again.")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.trips = 0
+
+    def release_probe(self):
+        """
+        Gives back a half-open probe that ended without telling whether the dependency works,
+        so that the next call probes again instead of the circuit staying half-open.
+        """
+        with self.__lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.__cooldown.new_expiry_time(0)
+
+    def record_failure(self, error: Exception = None):
+        """
+        Counts a failure. Opens the circuit if the probe failed or there have been too many failures in a row.
+        :param error: The error, for the logs.
+        """
+        with self.__lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                delay = min(self.max_delay, self.base_delay * 2 ** self.trips)
+                delay *= random.uniform(1 - self.jitter, 1 + self.jitter)
+                self.trips += 1
+                self.state = self.OPEN
+                self.__cooldown.new_expiry_time(delay)
+                logger.warning(f"Circuit for {self.name} open for {delay:.0f} seconds after {self.failures} "
+                               f"failures. Error: {error}")
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls a function through the circuit breaker.
+        Raises CircuitOpen without calling the function if the circuit is open.
+        :param func: The function.
+        :param args: Positional arguments for the function.
+        :param kwargs: Keyword arguments for the function.
+        :return: The function's return value.
+        """
+        if not self.allow():
+            raise CircuitOpen(f"Circuit for {self.name} is open.")
+        try:
+            result = func(*args, **kwargs)
+        except self.failure_errors as failure_e:
+            self.record_failure(failure_e)
+            raise
+        except BaseException:
+            self.release_probe()  # Not a failure of the dependency, but not a success either
+            raise
+        self.record_success()
+        return result
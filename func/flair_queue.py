@@ -0,0 +1,171 @@
+"""Background work queue for image submission flair updates."""
+
+import queue
+import threading
+from collections import Counter
+
+import praw.exceptions
+import prawcore
+
+from func.base_logger import logger
+from func.rate_limiter import TokenBucket
+
+
+class FlairUpdateQueue:
+    """
+    Applies flair decisions in worker threads so that the listing scan doesn't wait on the writes.
+    Decisions are keyed by submission id: a newer decision for a queued submission replaces the older one,
+    and a flair that was already applied isn't applied again. Writes share a token bucket, rate limit answers
+    pause it, and failed writes are retried with exponential backoff. Every worker has its own Reddit instance.
+    """
+    RETRIED_ERRORS = (prawcore.ServerError, prawcore.RequestException, prawcore.ResponseException,
+                      praw.exceptions.RedditAPIException)
+    FINAL_ERRORS = (prawcore.Forbidden, prawcore.NotFound)  # Deleted or no longer moderated, retrying won't help
+
+    def __init__(self, apply, workers: int, rate: float, burst: int, max_retries: int, retry_delay: float):
+        """
+        Constructs the flair update queue. Updates are applied once the workers are started.
+        :param apply: A function that sets a submission's flair: apply(reddit, image_submission, flair_id).
+        :param workers: Number of worker threads.
+        :param rate: Sustained flair updates per second.
+        :param burst: Largest burst of back-to-back flair updates.
+        :param max_retries: Retries of a failed update before giving up.
+        :param retry_delay: Seconds before the first retry, doubled for every further retry.
+        """
+        self.apply = apply
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.counts = Counter()
+        self.__limiter = TokenBucket(rate, burst)
+        self.__queue = queue.Queue()
+        self.__lock = threading.Lock()
+        self.__new_session = None
+        self.__wanted = {}  # Submission id -> (submission, flair id, failure callback) not applied yet
+        self.__attempts = Counter()  # Submission id -> failed attempts of the wanted flair
+        self.__applied = {}  # Submission id -> flair id applied last
+        self.__workers = [threading.Thread(target=self.__work, name=f"FlairUpdate-{number}", daemon=True)
+                          for number in range(workers)]
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__wanted)
+
+    def start(self, new_session):
+        """
+        Starts the worker threads.
+        :param new_session: A function that returns a new Reddit instance, called once by every worker.
+        """
+        self.__new_session = new_session
+        for worker in self.__workers:
+            worker.start()
+
+    def stats(self) -> dict:
+        """
+        Flair update counters.
+        :return: A dict of the counters and the number of updates waiting.
+        """
+        return {"waiting": len(self), **self.counts}
+
+    def submit(self, image_submission: praw.Reddit.submission, flair_id: str, on_failure=None):
+        """
+        Queues a flair update. Returns right away.
+        :param image_submission: An image submission.
+        :param flair_id: The flair template id to set.
+        :param on_failure: A function called with the submission if the update fails for good, None for nothing.
+        """
+        submission_id = image_submission.id
+        with self.__lock:
+            if submission_id not in self.__wanted and self.__applied.get(submission_id) == flair_id:
+                self.counts["skipped"] += 1
+                return
+            if submission_id in self.__wanted:
+                self.counts["replaced"] += 1
+                self.__attempts.pop(submission_id, None)
+            else:
+                self.__queue.put(submission_id)
+            self.__wanted[submission_id] = (image_submission, flair_id, on_failure)
+
+    def __work(self):
+        """Worker thread loop."""
+        reddit = None
+        while True:
+            submission_id = self.__queue.get()
+            with self.__lock:
+                wanted = self.__wanted.get(submission_id)
+            if wanted is None:
+                continue
+
+            image_submission, flair_id, _ = wanted
+            self.__limiter.acquire()
+            try:
+                if reddit is None:
+                    reddit = self.__new_session()
+                self.apply(reddit, image_submission, flair_id)
+            except self.FINAL_ERRORS as final_e:
+                logger.warning(f"Flair update of {submission_id} failed for good: {final_e}")
+                self.__fail(submission_id, wanted)
+            except self.RETRIED_ERRORS as flair_e:
+                self.__retry(submission_id, wanted, flair_e)
+            except Exception as unexpected_e:  # Anything else must not end the worker
+                logger.error(f"Flair update of {submission_id} failed with an unexpected error: {unexpected_e!r}")
+                self.__fail(submission_id, wanted)
+            else:
+                self.__done(submission_id, wanted, flair_id)
+                self.counts["applied"] += 1
+
+    def __done(self, submission_id: str, wanted: tuple, applied_flair_id: "str | None"):
+        """
+        Finishes an update. If a newer decision arrived meanwhile, queues the submission again.
+        :param submission_id: Submission id.
+        :param wanted: The (submission, flair id, failure callback) tuple that was worked on.
+        :param applied_flair_id: The flair that was applied, None if the update failed.
+        """
+        with self.__lock:
+            if applied_flair_id is not None:
+                self.__applied[submission_id] = applied_flair_id
+            if self.__wanted.get(submission_id) is wanted:
+                del self.__wanted[submission_id]
+                self.__attempts.pop(submission_id, None)
+            else:
+                self.__queue.put(submission_id)
+
+    def __fail(self, submission_id: str, wanted: tuple):
+        """
+        Gives up on an update and hands the submission to its failure callback.
+        :param submission_id: Submission id.
+        :param wanted: The (submission, flair id, failure callback) tuple that was worked on.
+        """
+        self.__done(submission_id, wanted, None)
+        self.counts["failed"] += 1
+        if wanted[2] is not None:
+            wanted[2](wanted[0])
+
+    def __retry(self, submission_id: str, wanted: tuple, flair_e: Exception):
+        """
+        Queues a failed update again after a backoff delay, or gives up after the maximum number of retries.
+        :param submission_id: Submission id.
+        :param wanted: The (submission, flair id, failure callback) tuple that was worked on.
+        :param flair_e: The error.
+        """
+        with self.__lock:
+            self.__attempts[submission_id] += 1
+            attempts = self.__attempts[submission_id]
+        delay = self.retry_delay * 2 ** (attempts - 1)
+
+        # Reddit asks to slow down: no flair update for anyone until the backoff is over
+        if isinstance(flair_e, prawcore.TooManyRequests) or (
+                isinstance(flair_e, praw.exceptions.RedditAPIException)
+                and any(item.error_type == "RATELIMIT" for item in flair_e.items)):
+            self.__limiter.pause(delay)
+            self.counts["rate_limited"] += 1
+
+        if attempts > self.max_retries:
+            logger.warning(f"Flair update of {submission_id} failed {attempts} times, giving up: {flair_e}")
+            self.__fail(submission_id, wanted)
+            return
+
+        logger.info(f"Flair update of {submission_id} failed, retry in {delay} seconds: {flair_e}")
+        self.counts["retried"] += 1
+        retry_timer = threading.Timer(delay, self.__queue.put, (submission_id,))
+        retry_timer.daemon = True
+        retry_timer.start()
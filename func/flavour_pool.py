@@ -0,0 +1,112 @@
+"""Prefetched pool of random flavour texts."""
+
+import math
+import random
+import threading
+from collections import deque
+
+from func.base_logger import logger
+import func.scryfall_functions as sf
+from data.configs import ScryfallSettings
+
+
+class FlavourPool(threading.Thread):
+    """
+    A ring buffer of random flavour texts that a background thread keeps filled in batches,
+    from the offline card index if it is available, otherwise from the Scryfall search API.
+    Replies take flavours from memory. A flavour isn't used again within the no-repeat window.
+    """
+    SEARCH_PAGE_SIZE = 175  # Cards per Scryfall search page
+
+    def __init__(self, capacity: int, low_watermark: int, no_repeat_window: int):
+        """
+        Constructs the flavour pool. The pool is filled once the thread is started.
+        :param capacity: Maximum number of flavours kept ready.
+        :param low_watermark: The pool is refilled when fewer flavours than this are left.
+        :param no_repeat_window: Number of most recent flavours that aren't added to the pool again.
+        """
+        super().__init__(name="FlavourPool", daemon=True)
+        self.capacity = capacity
+        self.low_watermark = low_watermark
+        self.__flavours = deque(maxlen=capacity)
+        self.__recent = deque(maxlen=no_repeat_window)
+        self.__recent_set = set()
+        self.__refill = threading.Event()
+        self.__search_pages = 1
+        self.__refill.set()
+
+    def __len__(self):
+        return len(self.__flavours)
+
+    def pop(self) -> str:
+        """
+        Takes a flavour text from the pool and wakes the refill thread if the pool runs low.
+        :return: A flavour text, empty string if the pool is empty.
+        """
+        try:
+            flavour = self.__flavours.popleft()
+        except IndexError:
+            flavour = ""
+        if len(self.__flavours) < self.low_watermark:
+            self.__refill.set()
+        return flavour
+
+    def run(self):
+        """Thread loop."""
+        while True:
+            self.__refill.wait(ScryfallSettings.FLAVOUR_REFILL_CHECK)
+            self.__refill.clear()
+            if len(self.__flavours) < self.low_watermark:
+                self.fill()
+
+    def fill(self):
+        """
+        Adds flavour batches to the pool until it is full or a batch brings nothing new.
+        """
+        while len(self.__flavours) < self.capacity:
+            added = 0
+            # Lazy except because there's always the next refill, just try again then
+            try:
+                for flavour in self.__fetch_batch():
+                    if len(self.__flavours) >= self.capacity:
+                        break
+                    if self.__remember(flavour):
+                        self.__flavours.append(flavour)
+                        added += 1
+            except Exception as flavour_e:
+                logger.warning("Flavour pool refill failed: " + str(flavour_e))
+            if not added:
+                break
+        logger.info(f"Flavour pool refilled to {len(self.__flavours)} flavours.")
+
+    def __remember(self, flavour: str) -> bool:
+        """
+        Adds a flavour to the no-repeat window.
+        :param flavour: Flavour text.
+        :return: True if the flavour was not in the window, otherwise False.
+        """
+        if not flavour or flavour in self.__recent_set:
+            return False
+        if len(self.__recent) == self.__recent.maxlen:
+            self.__recent_set.discard(self.__recent[0])
+        self.__recent.append(flavour)
+        self.__recent_set.add(flavour)
+        return True
+
+    def __fetch_batch(self) -> list:
+        """
+        A batch of random flavour texts.
+        :return: A list of flavour texts in random order.
+        """
+        card_index = sf.card_index
+        if card_index.flavours:
+            return random.sample(card_index.flavours, min(self.capacity, len(card_index.flavours)))
+
+        flavours, total_cards = sf.fetch_scryfall_flavours(random.randint(1, self.__search_pages))
+        self.__search_pages = max(1, math.ceil(total_cards / self.SEARCH_PAGE_SIZE))
+        random.shuffle(flavours)
+        return flavours
+
+
+flavour_pool = FlavourPool(ScryfallSettings.FLAVOUR_POOL_SIZE, ScryfallSettings.FLAVOUR_LOW_WATERMARK,
+                           ScryfallSettings.FLAVOUR_NO_REPEAT_WINDOW)
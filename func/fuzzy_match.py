@@ -0,0 +1,142 @@
+"""Offline approximate card name matching for misspelled calls."""
+
+from collections import Counter
+
+
+def edit_distance(first: str, second: str, max_distance: int) -> int:
+    """
+    Optimal string alignment distance: insertions, deletions, substitutions and swaps of adjacent characters.
+    Only the band of cells within max_distance of the diagonal is computed, and the computation stops early
+    once the distance is known to exceed max_distance.
+    :param first: A string.
+    :param second: Another string.
+    :param max_distance: Largest distance of interest.
+    :return: The distance, or max_distance + 1 if it is larger than max_distance.
+    """
+    too_far = max_distance + 1
+    if abs(len(first) - len(second)) > max_distance:
+        return too_far
+
+    earlier_row = None
+    previous_row = [j if j <= max_distance else too_far for j in range(len(second) + 1)]
+    for i in range(1, len(first) + 1):
+        row = [too_far] * (len(second) + 1)
+        if i <= max_distance:
+            row[0] = i
+        for j in range(max(1, i - max_distance), min(len(second), i + max_distance) + 1):
+            cost = 0 if first[i - 1] == second[j - 1] else 1
+            distance = min(previous_row[j] + 1, row[j - 1] + 1, previous_row[j - 1] + cost)
+            if i > 1 and j > 1 and first[i - 1] == second[j - 2] and first[i - 2] == second[j - 1]:
+                distance = min(distance, earlier_row[j - 2] + 1)
+            row[j] = min(distance, too_far)
+        if min(row) > max_distance:
+            return too_far
+        earlier_row, previous_row = previous_row, row
+    return previous_row[-1]
+
+
+class FuzzyMatcher:
+    """
+    A trigram index over card names, split by name length. Only names whose length is within the allowed
+    edit distance of the query are considered. A name within edit distance k shares all but at most 4k
+    of the query's trigrams, so the common trigrams can be skipped: counting only the rarest ones still tells
+    which names can be close enough. The best of those are verified with the edit distance,
+    and the closest name is returned with a confidence score.
+    """
+    CANDIDATES = 20  # Number of best trigram candidates verified with the edit distance
+
+    def __init__(self, names):
+        """
+        Builds the trigram index.
+        :param names: An iterable of normalized (casefolded) card names.
+        """
+        self.names = list(names)
+        self.trigram_postings = {}  # trigram -> name length -> name ids
+        for name_id, name in enumerate(self.names):
+            for trigram in set(self.trigrams(name)):
+                self.trigram_postings.setdefault(trigram, {}).setdefault(len(name), []).append(name_id)
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def trigrams(name: str) -> list:
+        """
+        The overlapping three character substrings of a name, padded so that the ends count too.
+        :param name: Normalized name.
+        :return: A list of trigrams.
+        """
+        padded = f"  {name} "
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    def match(self, query: str, min_confidence: float) -> "tuple | None":
+        """
+        Finds the closest card name. Most misspellings are a single typo, so names one edit away are searched first
+        with the much narrower filter that allows, and the rest only if there are none.
+        :param query: Normalized (casefolded) name as written in the call.
+        :param min_confidence: Lowest accepted confidence, from 0 to 1.
+        :return: A tuple of the closest name and its confidence (1 - edit distance / longer name's length),
+        None if no name is at least min_confidence close.
+        """
+        if not query or min_confidence <= 0:
+            return None
+
+        # Largest edit distance any name can be away: the longer name is at most max_edits longer than the query
+        max_edits = int(len(query) * (1 - min_confidence) / min_confidence)
+        query_trigrams = set(self.trigrams(query))
+        for edits in sorted({min(1, max_edits), max_edits}):
+            # Every name within this many edits is a candidate, so the closest one found is the closest of all
+            best = self.__closest(query, query_trigrams, edits, min_confidence)
+            if best is not None:
+                return best[0], best[1]
+        return None
+
+    def __closest(self, query: str, query_trigrams: set, max_edits: int, min_confidence: float) -> "tuple | None":
+        """
+        :param query: Normalized name.
+        :param query_trigrams: The query's trigrams.
+        :param max_edits: Largest edit distance of interest.
+        :param min_confidence: Lowest accepted confidence.
+        :return: A tuple of the closest name within max_edits, its confidence and its edit distance,
+        None if there is none at least min_confidence close.
+        """
+        lengths = range(len(query) - max_edits, len(query) + max_edits + 1)
+        # A single edit changes at most 4 trigrams: a swap of adjacent characters (one edit) changes 4 of them
+        required_shared = max(1, len(query_trigrams) - 4 * max_edits)
+
+        # Posting lists of the query's trigrams within the length window, rarest trigram first
+        trigram_postings = []
+        for trigram in query_trigrams:
+            length_postings = self.trigram_postings.get(trigram, {})
+            postings = [length_postings[length] for length in lengths if length in length_postings]
+            trigram_postings.append((sum(len(posting) for posting in postings), postings))
+        trigram_postings.sort(key=lambda volume_postings: volume_postings[0])
+
+        # Skipping s trigrams lowers the shared trigrams a close name must have to required_shared - s,
+        # skip as many of the common ones as possible while still requiring two shared trigrams
+        counted = min(len(query_trigrams), len(query_trigrams) - required_shared + 2)
+        required_counted = required_shared - (len(query_trigrams) - counted)
+
+        shared = Counter()
+        for _, postings in trigram_postings[:counted]:
+            for posting in postings:
+                shared.update(posting)
+
+        candidates = [(count, name_id) for name_id, count in shared.items() if count >= required_counted]
+        candidates.sort(reverse=True)
+
+        best = None
+        for count, name_id in candidates[:self.CANDIDATES]:
+            name = self.names[name_id]
+            longer = max(len(name), len(query))
+            max_distance = min(int(longer * (1 - min_confidence)), max_edits)
+            if best is not None:
+                max_distance = min(max_distance, best[2] - 1)  # Only a strictly closer name can win
+                if count < counted - 4 * max_distance:
+                    break  # The rest share too few trigrams to be that close
+            if max_distance < 0:
+                break
+            distance = edit_distance(query, name, max_distance)
+            if distance <= max_distance:
+                best = (name, 1 - distance / longer, distance)
+        return best
@@ -0,0 +1,149 @@
+"""Persistent SQLite catalog of the image submissions."""
+
+import sqlite3
+import threading
+import time
+
+from func.base_logger import logger
+
+
+class CatalogedSubmission:
+    """
+    Holds an image submission's catalog record. Has the same attributes as ImageSubmission,
+    so the moderation checks work on records as well.
+    """
+    __slots__ = ("submission_id", "fullname", "subreddit", "url", "permalink", "flair_id", "score", "ratio",
+                 "created", "approved")
+
+    def __init__(self, submission_id: str, fullname: str, subreddit: str, url: str, permalink: str, flair_id: str,
+                 score: int, ratio: float, created: float, approved: bool):
+        """
+        Constructs the catalog record.
+        :param submission_id: Submission id.
+        :param fullname: Submission fullname (t3_ + id).
+        :param subreddit: Name of the submission's subreddit.
+        :param url: The submission's link.
+        :param permalink: The submission's permalink.
+        :param flair_id: Flair template id, the latest decided one.
+        :param score: Score when the submission was last seen.
+        :param ratio: Upvote ratio when the submission was last seen.
+        :param created: Unix time of the submission's creation.
+        :param approved: True if a mod has approved the submission.
+        """
+        self.submission_id = submission_id
+        self.fullname = fullname
+        self.subreddit = subreddit
+        self.url = url
+        self.permalink = permalink
+        self.flair_id = flair_id
+        self.score = score
+        self.ratio = ratio
+        self.created = created
+        self.approved = bool(approved)
+
+    def __str__(self):
+        return f"Attributes: {dict((slot, getattr(self, slot)) for slot in self.__slots__)}"
+
+
+class ImageCatalog:
+    """
+    A submission id -> CatalogedSubmission store in an SQLite database that survives restarts,
+    indexed by flair and by creation time.
+    """
+    COLUMNS = "id, fullname, subreddit, url, permalink, flair_id, score, ratio, created, approved"
+
+    def __init__(self, db_file: str):
+        """
+        Opens (and creates if needed) the catalog database.
+        :param db_file: Path to the SQLite database file.
+        """
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(db_file, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS image_submissions ("
+                "id TEXT PRIMARY KEY, fullname TEXT NOT NULL, subreddit TEXT NOT NULL, url TEXT NOT NULL, "
+                "permalink TEXT NOT NULL, flair_id TEXT, score INTEGER NOT NULL, ratio REAL NOT NULL, "
+                "created REAL NOT NULL, approved INTEGER NOT NULL, seen REAL NOT NULL)"
+            )
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS image_submissions_flair ON image_submissions (flair_id, created)"
+            )
+            self.__connection.execute(
+                "CREATE INDEX IF NOT EXISTS image_submissions_created ON image_submissions (subreddit, created)"
+            )
+        logger.info(f"Image submission catalog opened with {len(self)} submissions.")
+
+    def __len__(self):
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM image_submissions").fetchone()[0]
+
+    def store(self, record: CatalogedSubmission):
+        """
+        Stores (or replaces) a submission's record.
+        :param record: A CatalogedSubmission object.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO image_submissions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (record.submission_id, record.fullname, record.subreddit, record.url, record.permalink,
+                 record.flair_id, record.score, record.ratio, record.created, int(record.approved), time.time())
+            )
+
+    def by_flair(self, flair_ids, created_before: float = None, created_after: float = None) -> list:
+        """
+        Finds the submissions with any of the flairs, optionally within a creation time range.
+        E.g. pending submissions older than two weeks:
+        by_flair([PENDING_FLAIR_ID], created_before=time.time() - MAX_IMAGE_APPROVE_TIMEDELTA)
+        :param flair_ids: An iterable of flair template ids.
+        :param created_before: Only submissions created before this Unix time.
+        :param created_after: Only submissions created after this Unix time.
+        :return: A list of CatalogedSubmission objects, newest first.
+        """
+        flair_ids = list(flair_ids)
+        conditions = [f"flair_id IN ({', '.join('?' * len(flair_ids))})"]
+        params = flair_ids
+        if created_before is not None:
+            conditions.append("created < ?")
+            params.append(created_before)
+        if created_after is not None:
+            conditions.append("created > ?")
+            params.append(created_after)
+        return self.__select(f"WHERE {' AND '.join(conditions)} ORDER BY created DESC", params)
+
+    def newest(self, subreddit: str) -> "CatalogedSubmission | None":
+        """
+        Finds a subreddit's newest submission.
+        :param subreddit: Subreddit name.
+        :return: A CatalogedSubmission object, None if the catalog has no submissions from the subreddit.
+        """
+        records = self.__select("WHERE subreddit = ? ORDER BY created DESC LIMIT 1", (subreddit,))
+        return records[0] if records else None
+
+    def retain(self, subreddit: str, submission_ids):
+        """
+        Removes a subreddit's submissions that aren't listed anymore, e.g. after a full rescan.
+        :param subreddit: Subreddit name.
+        :param submission_ids: An iterable of the ids to keep.
+        """
+        keep = set(submission_ids)
+        with self.__lock, self.__connection:
+            stored = self.__connection.execute(
+                "SELECT id FROM image_submissions WHERE subreddit = ?", (subreddit,)
+            ).fetchall()
+            self.__connection.executemany(
+                "DELETE FROM image_submissions WHERE id = ?", [row for row in stored if row[0] not in keep]
+            )
+
+    def __select(self, where: str, params) -> list:
+        """
+        Selects records.
+        :param where: The WHERE (and ORDER BY, LIMIT) part of the query.
+        :param params: Query parameters.
+        :return: A list of CatalogedSubmission objects.
+        """
+        with self.__lock:
+            rows = self.__connection.execute(
+                f"SELECT {self.COLUMNS} FROM image_submissions {where}", params
+            ).fetchall()
+        return [CatalogedSubmission(*row) for row in rows]
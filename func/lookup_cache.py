@@ -0,0 +1,163 @@
+"""Bounded in-memory TTL/LRU cache for lookups, with single-flight loading."""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class LookupCache:
+    """
+    A thread-safe least recently used cache whose entries expire after a time to live.
+    Negative results (empty values, e.g. "not a card") are cached too, with their own time to live.
+    Concurrent loads of the same key are collapsed into a single load (single-flight).
+    """
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        """
+        Constructs the cache.
+        :param max_size: Maximum number of entries. The least recently used entry is evicted first.
+        :param ttl: Seconds a positive (non-empty) value is kept.
+        :param negative_ttl: Seconds a negative (empty) value is kept.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.__entries = OrderedDict()  # key -> (expiry time, value)
+        self.__in_flight = {}  # key -> threading.Event set when the load finishes
+        self.__lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __str__(self):
+        return f"Attributes: {self.stats()}"
+
+    def stats(self) -> dict:
+        """
+        Cache counters for sizing the cache.
+        :return: A dict of the counters and the current size.
+        """
+        return {
+            "size": len(self.__entries), "max_size": self.max_size,
+            "hits": self.hits, "negative_hits": self.negative_hits, "misses": self.misses,
+            "evictions": self.evictions, "expirations": self.expirations, "coalesced": self.coalesced,
+        }
+
+    def __get_locked(self, key):
+        """
+        Looks up a key. The lock must be held.
+        :return: A (found, value) tuple.
+        """
+        entry = self.__entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] < time.monotonic():
+            del self.__entries[key]
+            self.expirations += 1
+            return False, None
+        self.__entries.move_to_end(key)
+        return True, entry[1]
+
+    def __put_locked(self, key, value):
+        """
+        Stores a value and evicts the least recently used entries over the size limit. The lock must be held.
+        """
+        ttl = self.ttl if value else self.negative_ttl
+        self.__entries[key] = (time.monotonic() + ttl, value)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key):
+        """
+        Looks up a key without loading it.
+        :param key: Cache key.
+        :return: A (found, value) tuple.
+        """
+        with self.__lock:
+            found, value = self.__get_locked(key)
+            if found:
+                self.hits += 1
+                if not value:
+                    self.negative_hits += 1
+            else:
+                self.misses += 1
+            return found, value
+
+    def put(self, key, value):
+        """
+        Stores a value.
+        :param key: Cache key.
+        :param value: Value. Empty values are cached with the negative time to live.
+        """
+        with self.__lock:
+            self.__put_locked(key, value)
+
+    def get_many_or_load(self, keys: list, loader, wait_timeout: float = None) -> dict:
+        """
+        Returns cached values for the keys and loads the missing ones with a single loader call.
+        Keys that another thread is already loading are waited for instead of being loaded again.
+        :param keys: Cache keys.
+        :param loader: A function that takes a list of keys and returns a key -> value dict.
+        Keys missing from the returned dict failed to load and are not cached.
+        :param wait_timeout: Maximum number of seconds to wait for another thread's load.
+        :return: A key -> value dict of the keys that are cached or were loaded.
+        """
+        results = {}
+        own_keys = []
+        own_event = threading.Event()
+        waited_events = {}
+
+        with self.__lock:
+            for key in dict.fromkeys(keys):
+                found, value = self.__get_locked(key)
+                if found:
+                    self.hits += 1
+                    if not value:
+                        self.negative_hits += 1
+                    results[key] = value
+                elif key in self.__in_flight:
+                    self.coalesced += 1
+                    waited_events[key] = self.__in_flight[key]
+                else:
+                    self.misses += 1
+                    self.__in_flight[key] = own_event
+                    own_keys.append(key)
+
+        if own_keys:
+            loaded = {}
+            try:
+                loaded = loader(own_keys)
+            finally:
+                with self.__lock:
+                    for key in own_keys:
+                        if key in loaded:
+                            self.__put_locked(key, loaded[key])
+                        del self.__in_flight[key]
+                own_event.set()
+            results.update((key, loaded[key]) for key in own_keys if key in loaded)
+
+        for key, event in waited_events.items():
+            if event.wait(wait_timeout):
+                with self.__lock:
+                    found, value = self.__get_locked(key)
+                if found:
+                    results[key] = value
+
+        return results
+
+    def get_or_load(self, key, loader, wait_timeout: float = None):
+        """
+        Returns the cached value for the key or loads it. Concurrent loads of the same key are collapsed.
+        :param key: Cache key.
+        :param loader: A function that takes the key and returns its value. Exceptions are not cached.
+        :param wait_timeout: Maximum number of seconds to wait for another thread's load.
+        :return: The value, None if another thread's load failed or timed out.
+        """
+        return self.get_many_or_load([key], lambda keys: {keys[0]: loader(keys[0])}, wait_timeout).get(key)
@@ -0,0 +1,103 @@
+"""Adaptive polling intervals for the subreddit streams."""
+
+import time
+
+from func.timer import RefreshTimer
+
+
+class PollScheduler:
+    """
+    Gives every stream its own polling interval. The interval follows the stream's item arrival rate,
+    so that a poll finds about the target number of items: busy streams are polled faster, quiet ones back off
+    (at most doubling the interval per poll). No interval is shorter than what keeps all streams within
+    their share of the Reddit rate limit, spread evenly across the rest of the rate limit window.
+    """
+    def __init__(self, streams: list, min_interval: float, max_interval: float, target_items: float,
+                 smoothing: float, rate_limit_share: float):
+        """
+        Constructs the scheduler. Every stream is due right away.
+        :param streams: A list of stream keys.
+        :param min_interval: Shortest polling interval in seconds.
+        :param max_interval: Longest polling interval in seconds.
+        :param target_items: Wanted number of new items per poll.
+        :param smoothing: Weight of the latest poll in the arrival rate average, from 0 to 1.
+        :param rate_limit_share: Share of the remaining Reddit requests the polls may use, from 0 to 1.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_items = target_items
+        self.smoothing = smoothing
+        self.rate_limit_share = rate_limit_share
+        self.budget_interval = 0.0  # Shortest interval the rate limit allows
+        self.intervals = {}  # Stream key -> current polling interval
+        self.arrival_rates = {}  # Stream key -> average items per second
+        self.__timers = {}
+        self.__last_polls = {}
+        for stream in streams:
+            self.intervals[stream] = min_interval
+            self.arrival_rates[stream] = None
+            self.__timers[stream] = RefreshTimer(min_interval)
+            self.__timers[stream].new_expiry_time(0)
+            self.__last_polls[stream] = time.monotonic()
+
+    def __str__(self):
+        return f"Attributes: {self.__dict__}"
+
+    def due_streams(self) -> list:
+        """
+        :return: A list of the stream keys whose polling interval has passed.
+        """
+        return [stream for stream, timer in self.__timers.items() if timer.single_timer()]
+
+    def seconds_until_due(self) -> float:
+        """
+        :return: Seconds until the next stream is due, 0 if one is due already.
+        """
+        return min((timer.seconds_left() for timer in self.__timers.values()), default=self.max_interval)
+
+    def record_poll(self, stream, items: int):
+        """
+        Updates the stream's arrival rate from a poll's new items and schedules its next poll.
+        :param stream: Stream key.
+        :param items: Number of new items the poll found.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self.__last_polls[stream], 1e-3)
+        self.__last_polls[stream] = now
+
+        rate = self.arrival_rates[stream]
+        sample = items / elapsed
+        rate = sample if rate is None else (1 - self.smoothing) * rate + self.smoothing * sample
+        self.arrival_rates[stream] = rate
+
+        interval = self.target_items / rate if rate > 0 else self.max_interval
+        interval = min(interval, 2 * self.intervals[stream], self.max_interval)
+        interval = max(interval, self.min_interval, self.budget_interval)
+        self.intervals[stream] = interval
+        self.__timers[stream].new_expiry_time(interval)
+
+    def defer(self, stream, seconds: float):
+        """
+        Postpones a stream's next poll, e.g. while its circuit breaker is open.
+        :param stream: Stream key.
+        :param seconds: Seconds until the stream is due again.
+        """
+        self.__timers[stream].new_expiry_time(max(seconds, self.min_interval))
+
+    def update_rate_limits(self, limits: dict):
+        """
+        Spreads the polls evenly across the rest of the rate limit window.
+        :param limits: Reddit's rate limit state as praw exposes it (reddit.auth.limits):
+        remaining requests and the reset time of the window, None before the first request.
+        """
+        remaining = limits.get("remaining")
+        reset_timestamp = limits.get("reset_timestamp")
+        if remaining is None or reset_timestamp is None:
+            return
+
+        window = max(1.0, reset_timestamp - time.time())
+        polls_per_second = remaining * self.rate_limit_share / window
+        if polls_per_second <= 0:
+            self.budget_interval = window  # Nothing left, wait for the reset
+        else:
+            self.budget_interval = len(self.__timers) / polls_per_second
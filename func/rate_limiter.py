@@ -0,0 +1,59 @@
+"""Client-side request rate limiting."""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens are added at a steady rate up to the bucket's capacity,
+    and every request takes one. Requests wait for a token when the bucket is empty.
+    """
+    def __init__(self, rate: float, capacity: float):
+        """
+        Constructs the token bucket, initially full.
+        :param rate: Tokens added per second, i.e. the sustained number of requests per second.
+        :param capacity: Maximum number of tokens, i.e. the largest burst of back-to-back requests.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.__tokens = capacity
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def __str__(self):
+        return f"Attributes: {self.__dict__}"
+
+    def __refill_locked(self):
+        """Adds the tokens earned since the last update. The lock must be held."""
+        now = time.monotonic()
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+    def acquire(self, timeout: float = None) -> bool:
+        """
+        Takes a token, waiting until one is available.
+        :param timeout: Maximum number of seconds to wait. None waits as long as needed.
+        :return: True if a token was taken, False if the wait would have exceeded the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.__lock:
+                self.__refill_locked()
+                if self.__tokens >= 1:
+                    self.__tokens -= 1
+                    return True
+                wait = (1 - self.__tokens) / self.rate
+
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Empties the bucket so that no token is available for the given time (e.g. after a 429 Retry-After).
+        :param seconds: Seconds until the next token is available.
+        """
+        with self.__lock:
+            self.__refill_locked()
+            self.__tokens = min(self.__tokens, 1 - seconds * self.rate)
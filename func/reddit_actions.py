@@ -3,17 +3,28 @@
 import time
 import re
 import random
+import threading
+from collections import deque
 
 import praw
 import praw.exceptions
 import prawcore
+from praw.endpoints import API_PATH
 
 from func.base_logger import logger
 from func.reddit_connection import RedditData
+from func.image_catalog import CatalogedSubmission, ImageCatalog
+from func.flair_queue import FlairUpdateQueue
+from func.reply_pipeline import ReplyJob, ReplyPipeline
+from func.replied_index import RepliedIndex
+from func.lookup_cache import LookupCache
+from func.circuit_breaker import CircuitBreaker
+from func.timer import RefreshTimer
 from data.exceptions import MainOperationException
-from data.configs import IMGSubmissionParams, Subreddits, MiscSettings, dreadmaw_timer, stormcrow_timer
-from data.collectibles import ColossalDreadmaw, StormCrow
-from func.text_functions import get_regex_bracket_matches, generate_reply_text
+from data.configs import (IMGSubmissionParams, Subreddits, MiscSettings, ReplySettings, BreakerSettings,
+                          dreadmaw_timer, stormcrow_timer)
+from data.collectibles import CollectibleCards, ColossalDreadmaw, StormCrow
+from func.text_functions import get_regex_bracket_matches, generate_reply_text, special_cards
 
 
 class ImageSubmission:
@@ -30,100 +41,314 @@ class ImageSubmission:
         self.approved = image_submission.approved
 
 
+class ImagePool:
+    """
+    The joke image candidates of the image submission subreddits. The URL list is never changed in place,
+    every change swaps in a new list: a refresh can run in another thread while the reply workers pick images
+    from the list they were handed, so read urls again for the current pool. Also remembers the newest submission
+    seen in each subreddit and the submissions whose flair may still change, for the incremental refreshes.
+    """
+    DEFAULT_IMAGE = 'https://i.redd.it/pcmd6d3o1oad1.png'  # Jollyver is always an option - RIP LardFetcher
+
+    def __init__(self, source_subreddits: list, catalog: ImageCatalog = None):
+        """
+        Constructs an empty image pool. The first refresh is a full rescan.
+        :param source_subreddits: Image submission subreddits.
+        :param catalog: ImageCatalog that keeps the submissions between runs, None to not keep them.
+        """
+        self.source_subreddits = source_subreddits
+        self.catalog = catalog
+        self.urls = [self.DEFAULT_IMAGE]
+        self.newest_fullnames = {}  # Subreddit name -> fullname of the newest submission seen
+        self.watched = set()  # Fullnames of the submissions waiting for mod approval or votes
+        self.refresh_lock = threading.Lock()  # One refresh at a time, the startup one runs in the background
+        self.__submission_urls = {}  # Submission id -> image URL in the pool
+        self.__full_rescan = RefreshTimer(Subreddits.IMAGE_FULL_RESCAN_INTERVAL)
+        self.__full_rescan.new_expiry_time(0)
+
+    def load(self):
+        """
+        Fills the pool from the catalog without touching the Reddit API.
+        """
+        if self.catalog is None:
+            return
+        for record in self.catalog.by_flair([IMGSubmissionParams.APPROVED_FLAIR_ID]):
+            if is_valid_image_submission(record, record.subreddit, record.flair_id):
+                self.update(record.submission_id, record.url, True)
+        undecided = self.catalog.by_flair(IMGSubmissionParams.UNDECIDED_FLAIR_IDS)
+        self.watched.update(record.fullname for record in undecided)
+        for source in self.source_subreddits:
+            newest = self.catalog.newest(source)
+            if newest is not None:
+                self.newest_fullnames[source] = newest.fullname
+        logger.info(f"Loaded {len(self.urls)} image candidates from the image submission catalog.")
+
+    def full_rescan_due(self) -> bool:
+        """
+        Checks whether the next refresh should walk all fetchable submissions instead of only the new ones.
+        Full rescans pick up deleted, removed and manually reflaired submissions.
+        :return: True if a full rescan is due, otherwise False.
+        """
+        return self.__full_rescan.single_timer()
+
+    def see(self, source_subreddit: str, image_submission: praw.Reddit.submission):
+        """
+        Remembers the submission as the newest one seen if it is newer than the current one.
+        :param source_subreddit: The submission's subreddit.
+        :param image_submission: An image submission.
+        """
+        newest = self.newest_fullnames.get(source_subreddit)
+        if newest is None or int(image_submission.id, 36) > int(newest.split("_", 1)[1], 36):
+            self.newest_fullnames[source_subreddit] = image_submission.fullname
+
+    def watch(self, fullname: str, undecided: bool):
+        """
+        Adds the submission to or removes it from the re-check list.
+        :param fullname: The submission's fullname.
+        :param undecided: True if the submission's flair may still change.
+        """
+        if undecided:
+            self.watched.add(fullname)
+        else:
+            self.watched.discard(fullname)
+
+    def update(self, submission_id: str, url: str, valid: bool):
+        """
+        Adds a valid submission to the pool or removes an invalid one from it.
+        :param submission_id: The submission's id.
+        :param url: The submission's image URL.
+        :param valid: True if the submission is a valid image candidate.
+        """
+        if valid and submission_id not in self.__submission_urls:
+            self.__submission_urls[submission_id] = url
+            self.urls = self.urls + [url]
+        elif not valid and submission_id in self.__submission_urls:
+            urls = list(self.urls)
+            urls.remove(self.__submission_urls.pop(submission_id))
+            self.urls = urls
+
+    def record(self, image_submission: praw.Reddit.submission, flair_id: str):
+        """
+        Stores the submission in the catalog.
+        :param image_submission: An image submission.
+        :param flair_id: The submission's flair after the moderation checks.
+        """
+        if self.catalog is not None:
+            self.catalog.store(CatalogedSubmission(
+                image_submission.id, image_submission.fullname, image_submission.subreddit.display_name,
+                image_submission.url, image_submission.permalink, flair_id, image_submission.score,
+                image_submission.upvote_ratio, image_submission.created_utc, image_submission.approved
+            ))
+
+    def replace(self, valid_submissions: dict, listed_ids: dict):
+        """
+        Replaces the whole pool after a full rescan and drops the submissions that weren't listed from the catalog.
+        :param valid_submissions: Submission id -> image URL of every valid image candidate.
+        :param listed_ids: Subreddit name -> ids of every submission listed in it.
+        """
+        self.__submission_urls = dict(valid_submissions)
+        self.urls = [self.DEFAULT_IMAGE] + list(valid_submissions.values())
+        self.__full_rescan.new_expiry_time(Subreddits.IMAGE_FULL_RESCAN_INTERVAL)
+        if self.catalog is not None:
+            for source, submission_ids in listed_ids.items():
+                self.catalog.retain(source, submission_ids)
+
+
 def main_error_handler(func):
     """
-    Raises MainOperationError during abnormal operation.
+    Raises MainOperationError during abnormal operation. Doesn't wait: the caller's circuit breaker decides
+    when the failed work is tried again, and the rest of the bot carries on meanwhile.
     """
     def wrapper(*args, **kwargs):
         """Wrapper."""
         try:
             return func(*args, **kwargs)
         except prawcore.ServerError as server_err:
-            logger.warning("Server error, retry in 5 minutes. Error code: " + str(server_err))
-            time.sleep(300)
-            raise MainOperationException
+            logger.warning("Server error. Error code: " + str(server_err))
+            raise MainOperationException from server_err
         except prawcore.RequestException as request_exc:
-            logger.warning("Incomplete HTTP request, retry in 10 seconds. Error code: " + str(request_exc))
-            time.sleep(10)
-            raise MainOperationException
+            logger.warning("Incomplete HTTP request. Error code: " + str(request_exc))
+            raise MainOperationException from request_exc
         except prawcore.ResponseException as response_exc:
-            logger.warning("HTTP request response error, retry in 30 seconds. Error code: " + str(response_exc))
-            time.sleep(30)
-            raise MainOperationException
+            logger.warning("HTTP request response error. Error code: " + str(response_exc))
+            raise MainOperationException from response_exc
         except praw.exceptions.RedditAPIException as rapi_e:
-            logger.warning("RedditAPIException, retry in 10 seconds. Error code: " + str(rapi_e))
-            time.sleep(10)
-            raise MainOperationException
+            logger.warning("RedditAPIException. Error code: " + str(rapi_e))
+            raise MainOperationException from rapi_e
         except praw.exceptions.APIException as api_e:
-            logger.warning("APIException, retry in 10 seconds. Error code: " + str(api_e))
-            time.sleep(10)
-            raise MainOperationException
+            logger.warning("APIException. Error code: " + str(api_e))
+            raise MainOperationException from api_e
     return wrapper
 
 
 @main_error_handler
-def sub_actions(reddit_data: RedditData, source_subreddits: list) -> list:
+def sub_actions(reddit_data: RedditData, image_pool: ImagePool) -> list:
     """
-    Executes checks and actions in the image submission subreddit. Returns a list of image candidates.
+    Executes checks and actions in the image submission subreddits and updates the image pool.
+    The first refresh and the periodic full rescans walk every fetchable submission. The refreshes in between
+    only fetch the submissions newer than the newest one seen and re-check the ones still waiting for a decision,
+    unless the newest one seen was removed, which turns the refresh into a full rescan.
+    Runs on the calling thread's Reddit session, so it can run in a background thread.
     :param reddit_data: RedditData object.
-    :param source_subreddits: Image submission subreddit.
+    :param image_pool: ImagePool of the image submission subreddits.
     :return: A list of image candidates.
     """
-    reddit: praw.Reddit = reddit_data.reddit
-    image_candidate_urls = ['https://i.redd.it/pcmd6d3o1oad1.png'] # Jollyver is always an option - RIP LardFetcher
-    pending_count = 0
-    reject_count = 0
-    approve_count = 0
+    with image_pool.refresh_lock:
+        return refresh_image_pool(reddit_data.session(), image_pool)
+
+
+def refresh_image_pool(reddit: praw.Reddit, image_pool: ImagePool) -> list:
+    """
+    The refresh of sub_actions, run while holding the image pool's refresh lock.
+    :param reddit: Reddit instance.
+    :param image_pool: ImagePool of the image submission subreddits.
+    :return: A list of image candidates.
+    """
+    counts = {"pending": 0, "approve": 0, "reject": 0}
+
+    if image_pool.full_rescan_due() or not incremental_refresh(reddit, image_pool, counts):
+        valid_submissions = {}
+        listed_ids = {}
+        image_pool.watched.clear()
+        for source in image_pool.source_subreddits:
+            listed_ids[source] = []
+
+            # Iterate over all fetchable submissions
+            for image_submission in reddit.subreddit(source).new(limit=Subreddits.MAX_IMAGE_SUBMISSIONS):
+                image_pool.see(source, image_submission)
+                listed_ids[source].append(image_submission.id)
+                if moderate_image_submission(image_submission, image_pool, counts):
+                    valid_submissions[image_submission.id] = image_submission.url
+
+        image_pool.replace(valid_submissions, listed_ids)
+
+    logger.info(f"Found {str(counts['pending'])} new image submissions.")
+    logger.info(f"Updated {str(counts['approve'] + counts['reject'])} old submissions.")
+    logger.info(f"Flair updates: {flair_queue.stats()}")
+    logger.info(f"Using {str(len(image_pool.urls))} valid image submissions.")
+
+    return image_pool.urls
+
+
+def incremental_refresh(reddit: praw.Reddit, image_pool: ImagePool, counts: dict) -> bool:
+    """
+    Checks the submissions newer than the newest one seen, and the ones still waiting for a decision.
+    :param reddit: Reddit instance.
+    :param image_pool: ImagePool of the image submission subreddits.
+    :param counts: Moderation action counts, updated in place.
+    :return: False if the newest submission seen can't anchor the listing anymore and a full rescan is needed.
+    """
+    for source in image_pool.source_subreddits:
+
+        # Only the submissions newer than the newest one seen, Reddit lists them newest first
+        newest = image_pool.newest_fullnames.get(source)
+        params = {"before": newest} if newest else {}
+        listed = 0
+        for image_submission in reddit.subreddit(source).new(limit=Subreddits.INCREMENTAL_IMAGE_SUBMISSIONS,
+                                                             params=params):
+            listed += 1
+            image_pool.see(source, image_submission)
+            moderate_image_submission(image_submission, image_pool, counts)
+
+        # A removed submission lists nothing before it, even when newer ones exist
+        if newest and not listed:
+            latest = next(iter(reddit.subreddit(source).new(limit=1)), None)
+            if latest is not None and int(latest.id, 36) > int(newest.split("_", 1)[1], 36):
+                logger.info(f"The newest image submission seen in {source} is gone, rescanning all submissions.")
+                return False
+
+    # Submissions still waiting for a decision, fetched by fullname in batches of 100
+    watched = list(image_pool.watched)
+    for batch_start in range(0, len(watched), Subreddits.INFO_BATCH_SIZE):
+        batch = watched[batch_start:batch_start + Subreddits.INFO_BATCH_SIZE]
+        for image_submission in reddit.info(fullnames=batch):
+            moderate_image_submission(image_submission, image_pool, counts)
+    return True
+
+
+def reconcile_image_pool(reddit_data: RedditData, image_pool: ImagePool) -> threading.Thread:
+    """
+    Runs sub_actions in a background thread, so that replies can start from the pool loaded from the catalog.
+    :param reddit_data: RedditData object.
+    :param image_pool: ImagePool of the image submission subreddits.
+    :return: The started thread.
+    """
+    def reconcile():
+        """Thread target."""
+        try:
+            sub_actions(reddit_data, image_pool)
+        except MainOperationException:
+            logger.warning("Image pool reconciliation failed, the next image refresh tries again.")
 
-    for source in source_subreddits:
+    reconcile_thread = threading.Thread(target=reconcile, name="ImagePoolReconcile", daemon=True)
+    reconcile_thread.start()
+    return reconcile_thread
 
-        # Iterate over all fetchable submissions
-        for image_submission in reddit.subreddit(source).new(limit=Subreddits.MAX_IMAGE_SUBMISSIONS):
 
-            try:
-                img_sub = ImageSubmission(image_submission)
+def moderate_image_submission(image_submission: praw.Reddit.submission, image_pool: ImagePool,
+                              counts: dict) -> bool:
+    """
+    Updates an image submission's flair if its status should change, then updates the image pool
+    and its re-check list to match.
+    :param image_submission: An image submission.
+    :param image_pool: ImagePool the submission belongs to.
+    :param counts: Flair update counts by decision, incremented in place.
+    :return: True if the submission is a valid image candidate, otherwise False.
+    """
+    def on_failure(failed_submission: praw.Reddit.submission):
+        """The flair wasn't updated: re-check the submission on the next refresh."""
+        image_pool.watch(failed_submission.fullname, True)
+
+    flair_id = image_submission.link_flair_template_id
+    try:
+        img_sub = ImageSubmission(image_submission)
 
-                if should_pending(img_sub):
-                    update_flair(image_submission, IMGSubmissionParams.PENDING_FLAIR_ID)
-                    img_sub.flair_id = IMGSubmissionParams.PENDING_FLAIR_ID
-                    pending_count += 1
+        if should_pending(img_sub):
+            flair_queue.submit(image_submission, IMGSubmissionParams.PENDING_FLAIR_ID, on_failure)
+            img_sub.flair_id = IMGSubmissionParams.PENDING_FLAIR_ID
+            counts["pending"] += 1
 
-                if should_approve(img_sub):
-                    update_flair(image_submission, IMGSubmissionParams.APPROVED_FLAIR_ID)
-                    img_sub.flair_id = IMGSubmissionParams.APPROVED_FLAIR_ID
-                    approve_count += 1
+        if should_approve(img_sub):
+            flair_queue.submit(image_submission, IMGSubmissionParams.APPROVED_FLAIR_ID, on_failure)
+            img_sub.flair_id = IMGSubmissionParams.APPROVED_FLAIR_ID
+            counts["approve"] += 1
 
-                if should_reject(img_sub):
-                    update_flair(image_submission, IMGSubmissionParams.REJECTED_FLAIR_ID)
-                    img_sub.flair_id = IMGSubmissionParams.REJECTED_FLAIR_ID
-                    reject_count += 1
+        if should_reject(img_sub):
+            flair_queue.submit(image_submission, IMGSubmissionParams.REJECTED_FLAIR_ID, on_failure)
+            img_sub.flair_id = IMGSubmissionParams.REJECTED_FLAIR_ID
+            counts["reject"] += 1
 
-            except AttributeError:
-                update_flair(image_submission, IMGSubmissionParams.META_FEEDBACK_OTHER_FLAIR_ID)
-                logger.info(f"Something for https://reddit.com{image_submission.permalink} is missing. Investigate.")
-                print(f"Something for https://reddit.com{image_submission.permalink} is missing. Investigate.")
+        flair_id = img_sub.flair_id
 
-            # Check if submission has the correct flair
-            if is_valid_image_submission(image_submission, source):
-                image_candidate_urls.append(image_submission.url)
+    except AttributeError:
+        flair_queue.submit(image_submission, IMGSubmissionParams.META_FEEDBACK_OTHER_FLAIR_ID, on_failure)
+        flair_id = IMGSubmissionParams.META_FEEDBACK_OTHER_FLAIR_ID
+        logger.info(f"Something for https://reddit.com{image_submission.permalink} is missing. Investigate.")
+        print(f"Something for https://reddit.com{image_submission.permalink} is missing. Investigate.")
 
-    logger.info(f"Found {str(pending_count)} new image submissions.")
-    logger.info(f"Updated {str(approve_count + reject_count)} old submissions.")
-    logger.info(f"Using {str(len(image_candidate_urls))} valid image submissions.")
+    image_pool.watch(image_submission.fullname, flair_id in IMGSubmissionParams.UNDECIDED_FLAIR_IDS)
+    image_pool.record(image_submission, flair_id)
 
-    return image_candidate_urls
+    # Check if submission has the correct flair
+    valid = is_valid_image_submission(image_submission, image_submission.subreddit.display_name, flair_id)
+    image_pool.update(image_submission.id, image_submission.url, valid)
+    return valid
 
 
-def is_valid_image_submission(image_submission: praw.Reddit.submission, source_subreddit: str) -> bool:
+def is_valid_image_submission(image_submission: praw.Reddit.submission, source_subreddit: str,
+                              flair_id: str = None) -> bool:
     """
     Checks for image submission eligibility.
     :param image_submission: An image submission candidate.
     :param source_subreddit: Image candidate subreddit's name.
+    :param flair_id: The submission's flair if it was just updated, defaults to the flair it was fetched with.
     :return: True if image candidate is eligible, otherwise False.
     """
+    if flair_id is None:
+        flair_id = image_submission.link_flair_template_id
     if ((source_subreddit not in image_submission.url)
             and (re.search('(i.redd.it|i.imgur.com)', image_submission.url))
-            and (image_submission.link_flair_template_id == IMGSubmissionParams.APPROVED_FLAIR_ID)):
+            and (flair_id == IMGSubmissionParams.APPROVED_FLAIR_ID)):
         return True
     return False
 
@@ -171,114 +396,243 @@ def should_reject(img_sub: ImageSubmission) -> bool:
     return False
 
 
-def update_flair(image_submission: praw.Reddit.submission, new_flair_id: str):
+def update_flair(reddit: praw.Reddit, image_submission: praw.Reddit.submission, new_flair_id: str):
     """
     Updates the image submission's flair on Reddit.
+    :param reddit: The flair worker's own Reddit instance, the submission came from another thread's.
     :param image_submission: Image submission.
     :param new_flair_id:
     """
-    image_submission.mod.flair(flair_template_id=new_flair_id)
+    # What submission.mod.flair posts, in the subreddit the submission is known to be in: a lazy submission
+    # of the worker's session would be fetched first to find its subreddit
+    subreddit = reddit.subreddit(image_submission.subreddit.display_name)
+    reddit.post(API_PATH["select_flair"].format(subreddit=subreddit),
+                data={"css_class": "", "link": image_submission.fullname, "text": "",
+                      "flair_template_id": new_flair_id})
     logger.info(f"Flair status for {image_submission.id} updated.")
     print(f"Flair status for {image_submission.id} updated.")
 
 
+flair_queue = FlairUpdateQueue(update_flair, IMGSubmissionParams.FLAIR_UPDATE_WORKERS,
+                               IMGSubmissionParams.FLAIR_UPDATES_PER_SECOND, IMGSubmissionParams.FLAIR_UPDATE_BURST,
+                               IMGSubmissionParams.FLAIR_UPDATE_RETRIES, IMGSubmissionParams.FLAIR_RETRY_DELAY)
+
+
 @main_error_handler
-def comment_action(reddit_data: RedditData, target_subreddit: str, image_links: list):
+def comment_action(reddit_data: RedditData, target_subreddit: str, image_links: list) -> int:
     """
-    Executes check and reply for a comment.
+    Executes check and reply for the comments of a stream page. The parent submission titles of the calls
+    are prefetched for the whole page before the comments are checked.
     :param reddit_data: RedditData object.
-    :param target_subreddit: Targeted subreddit.
+    :param target_subreddit: Targeted stream: a subreddit or a multireddit (sub1+sub2+...).
     :param image_links: Image link candidates.
+    :return: Number of new comments in the stream.
     """
-    for comment in reddit_data.subreddit_streams[target_subreddit].comments:
-        if comment is not None:
-            try:
-                item_type = "comment"
-                comment_regex_matches = get_regex_bracket_matches(comment.body)
-                low_matches = [item.casefold() for item in comment_regex_matches]
-                if comment_requires_action(comment, comment_regex_matches):
-
-                    if (MiscSettings.NFT_REPLIES_ON
-                            and ColossalDreadmaw.NAME.casefold() in low_matches
-                            and dreadmaw_timer.single_timer()):
-                        special_reply(item_type, reddit_data, comment, ColossalDreadmaw.NAME)
-
-                    elif (MiscSettings.NFT_REPLIES_ON
-                          and StormCrow.NAME.casefold() in low_matches
-                          and stormcrow_timer.single_timer()):
-                        special_reply(item_type, reddit_data, comment, StormCrow.NAME)
-
-                    else:
-                        item_reply(item_type, comment, comment_regex_matches, image_links)
-            except AttributeError as e:
-                logger.warning(f"An AttributeError was thrown most likely due to a deleted comment. Full error: {e}")
+    stream_data = reddit_data.subreddit_streams[target_subreddit]
+    comments = deque()
+    items = 0
+    try:
+        for comment in stream_data.comments:
+            if comment is None:
                 break
-        else:
-            break
+            if not stream_data.check_in("comment", comment):
+                continue  # Delivered again by a resumed stream
+            items += 1
+            if comment.fullname in replied_index:
+                stream_data.done("comment", comment.fullname)  # Already replied to before a restart
+                continue
+            comments.append(comment)
+
+        try:
+            prefetch_titles(reddit_data.reddit, [comment.link_id for comment in comments
+                                                 if get_regex_bracket_matches(comment.body)])
+        except MainOperationException:
+            logger.warning("Title prefetch failed, the exclusion checks fetch the titles one by one.")
+        while comments:
+            if not dispatch_item(reddit_data, "comment", comments[0], image_links):
+                stream_data.done("comment", comments[0].fullname)
+            comments.popleft()
+    finally:
+        for comment in comments:  # Not handled, a reopened stream delivers them again
+            stream_data.release("comment", comment.fullname)
+        stream_data.save_checkpoint("comment")
+    return items
 
 
 @main_error_handler
-def submission_action(reddit_data: RedditData, target_subreddit, image_links: list):
+def submission_action(reddit_data: RedditData, target_subreddit, image_links: list) -> int:
     """
     Executes check and reply for a submission.
     :param reddit_data: RedditData object.
-    :param target_subreddit: Targeted subreddit.
+    :param target_subreddit: Targeted stream: a subreddit or a multireddit (sub1+sub2+...).
     :param image_links: Image link candidates.
+    :return: Number of new submissions in the stream.
     """
-    for submission in reddit_data.subreddit_streams[target_subreddit].submissions:
-        if submission is not None:
-            try:
-                item_type = "submission"
-                submission_regex_matches = get_regex_bracket_matches(submission.selftext)
-                low_matches = [item.casefold() for item in submission_regex_matches]
-                if submission_requires_action(submission, submission_regex_matches):
-
-                    if (MiscSettings.NFT_REPLIES_ON
-                            and ColossalDreadmaw.NAME.casefold() in low_matches
-                            and dreadmaw_timer.single_timer()):
-                        special_reply(item_type, reddit_data, submission, ColossalDreadmaw.NAME)
-
-                    elif (MiscSettings.NFT_REPLIES_ON
-                          and StormCrow.NAME.casefold() in low_matches
-                          and stormcrow_timer.single_timer()):
-                        special_reply(item_type, reddit_data, submission, StormCrow.NAME)
-
-                    else:
-                        item_reply(item_type, submission, submission_regex_matches, image_links)
-
-            except AttributeError as e:
-                logger.warning(f"An AttributeError was thrown most likely due to a deleted comment. Full error: {e}")
+    items = 0
+    stream_data = reddit_data.subreddit_streams[target_subreddit]
+    try:
+        for submission in stream_data.submissions:
+            if submission is None:
                 break
+            if not stream_data.check_in("submission", submission):
+                continue  # Delivered again by a resumed stream
+            items += 1
+            if submission.fullname in replied_index:
+                stream_data.done("submission", submission.fullname)  # Already replied to before a restart
+                continue
+            title_cache.put(submission.fullname, submission.title)  # For the exclusion checks of its comments
+            if not dispatch_item(reddit_data, "submission", submission, image_links):
+                stream_data.done("submission", submission.fullname)
+    finally:
+        stream_data.save_checkpoint("submission")
+    return items
+
+
+def dispatch_item(reddit_data: RedditData, item_type: str, item, image_links: list) -> bool:
+    """
+    Runs the handler of a checked in item's subreddit. A broken item is logged and skipped,
+    so that it doesn't drop the rest of the page.
+    :param reddit_data: RedditData object.
+    :param item_type: "comment" or "submission".
+    :param item: A comment or a submission.
+    :param image_links: Image link candidates.
+    :return: True if a reply job was queued, the reply pipeline marks the item done when the job finishes.
+    """
+    try:
+        handler = SUBREDDIT_HANDLERS.get(item.subreddit.display_name.casefold(), DEFAULT_HANDLERS)
+        return handler[item_type](reddit_data, item, image_links)
+    except AttributeError as e:
+        logger.warning(f"An AttributeError was thrown most likely due to a deleted {item_type}. Full error: {e}")
+    except (prawcore.PrawcoreException, praw.exceptions.PRAWException) as item_e:
+        logger.warning(f"Checking {item_type} {item.id} failed, skipping it. Error code: {item_e}")
+    return False
 
-        else:
-            break
+
+@main_error_handler
+def prefetch_titles(reddit: praw.Reddit, link_ids: list):
+    """
+    Caches the titles of the submissions, fetching the uncached ones by fullname in batches of 100.
+    :param reddit: Reddit instance.
+    :param link_ids: Submission fullnames (a comment's link_id).
+    """
+    def fetch_titles(fullnames: list) -> dict:
+        """Title cache loader."""
+        titles = {}
+        for batch_start in range(0, len(fullnames), Subreddits.INFO_BATCH_SIZE):
+            batch = fullnames[batch_start:batch_start + Subreddits.INFO_BATCH_SIZE]
+            titles.update((submission.fullname, submission.title) for submission in reddit.info(fullnames=batch))
+        return titles
+
+    if link_ids:
+        title_cache.get_many_or_load(link_ids, fetch_titles)
+
+
+def parent_title(comment: praw.Reddit.comment) -> str:
+    """
+    :param comment: A comment.
+    :return: The title of the comment's submission, from the title cache if it's there.
+    """
+    return title_cache.get_or_load(comment.link_id, lambda link_id: comment.submission.title)
+
+
+def handle_comment(reddit_data: RedditData, comment: praw.Reddit.comment, image_links: list) -> bool:
+    """
+    Checks a comment and queues a reply to it if it calls cards.
+    :param reddit_data: RedditData object.
+    :param comment: A comment from a call subreddit.
+    :param image_links: Image link candidates.
+    :return: True if a reply job was queued.
+    """
+    item_type = "comment"
+    comment_regex_matches = get_regex_bracket_matches(comment.body)
+    if comment_requires_action(comment, comment_regex_matches):
+        reply_pipeline.submit(ReplyJob(item_type, comment, comment_regex_matches,
+                                       special_callname(comment_regex_matches), reddit_data, image_links))
+        return True
+    return False
+
+
+def handle_submission(reddit_data: RedditData, submission: praw.Reddit.submission, image_links: list) -> bool:
+    """
+    Checks a submission and queues a reply to it if it calls cards.
+    :param reddit_data: RedditData object.
+    :param submission: A submission from a call subreddit.
+    :param image_links: Image link candidates.
+    :return: True if a reply job was queued.
+    """
+    item_type = "submission"
+    submission_regex_matches = get_regex_bracket_matches(submission.selftext)
+    if submission_requires_action(submission, submission_regex_matches):
+        reply_pipeline.submit(ReplyJob(item_type, submission, submission_regex_matches,
+                                       special_callname(submission_regex_matches), reddit_data, image_links))
+        return True
+    return False
+
+
+def special_callname(regex_matches: list) -> "str | None":
+    """
+    Checks whether a call gets a special collectible reply instead of a regular one. If it does, the collectible's
+    cooldown is claimed right away, so that no other call gets the reply before it ends.
+    The claim is given back with release_collectible if the reply isn't posted.
+    :param regex_matches: A list of regex matches in the item.
+    :return: Name of the collectible card, None for a regular reply.
+    """
+    if not MiscSettings.NFT_REPLIES_ON:
+        return None
+    called_specials = [special_cards.find(item) for item in regex_matches]
+    with collectible_lock:
+        collectible = special_cards.find_collectible(called_specials, available_only=True)
+        if collectible is None:
+            return None
+        COLLECTIBLE_TIMERS[collectible.name].new_expiry_time(random.randint(CollectibleCards.TIMER_MIN,
+                                                                            CollectibleCards.TIMER_MAX))
+    return collectible.name
+
+
+def release_collectible(callname: str):
+    """
+    Ends the cooldown claimed for a collectible reply that wasn't posted.
+    :param callname: Name of the collectible card.
+    """
+    with collectible_lock:
+        COLLECTIBLE_TIMERS[callname].new_expiry_time(0)
+
+
+# Cooldowns of the collectible replies, claimed when a call is detected
+COLLECTIBLE_TIMERS = {ColossalDreadmaw.NAME: dreadmaw_timer, StormCrow.NAME: stormcrow_timer}
+collectible_lock = threading.Lock()
+
+
+# Item handlers by item type. A combined stream routes every item by its subreddit,
+# subreddits that need their own handlers are added to SUBREDDIT_HANDLERS with their casefolded name as key.
+# A handler returns True if it queued a reply job, and False once it is done with the item.
+DEFAULT_HANDLERS = {"comment": handle_comment, "submission": handle_submission}
+SUBREDDIT_HANDLERS = {}
 
 
 def comment_requires_action(comment_data: praw.Reddit.comment, regex_matches: list) -> bool:
     """
     Checks whether a comment requires action, is by the bot itself, has no matches, or is excluded.
+    The cheapest checks come first, the parent submission's title is only looked at for eligible calls.
     :param comment_data: Reddit's praw comment API data.
     :param regex_matches: A list of regex matches in the comment.
     :return: True if comment requires action.
     """
-    comment_parent_exclusions = [
-        title.search(string=comment_data.submission.title) for title in MiscSettings.COMMENTS_EXCLUSIONS
-    ]
-
-    if time.time() - comment_data.created_utc > 10 * 60:
-        logger.info("The comment is over 10 minutes old i.e. Reddit is bugging out. Skipping replying. "
-                    + comment_data.id)
+    if not regex_matches:  # No regex matches
+        logger.info("No matches in comment. " + comment_data.id)
         return False
 
     elif comment_data.author.name in MiscSettings.IGNORE_CALLS_FROM:  # Bots
         logger.info("Bot will not reply to itself or to the real CardFetcher (comment). " + comment_data.id)
         return False
 
-    elif not regex_matches:  # No regex matches
-        logger.info("No matches in comment. " + comment_data.id)
+    elif time.time() - comment_data.created_utc > ReplySettings.MAX_REPLY_AGE:
+        logger.info(f"The comment is over {ReplySettings.MAX_REPLY_AGE} seconds old. Skipping replying. "
+                    + comment_data.id)
         return False
 
-    elif any(comment_parent_exclusions):  # Is on exclusion list
+    elif any(title.search(string=parent_title(comment_data))
+             for title in MiscSettings.COMMENTS_EXCLUSIONS):  # Is on exclusion list
         logger.info("Submission of the comment on exclusion list. " + comment_data.id)
         return False
 
@@ -293,18 +647,13 @@ def comment_requires_action(comment_data: praw.Reddit.comment, regex_matches: li
 def submission_requires_action(submission_data: praw.Reddit.submission, regex_matches: list) -> bool:
     """
     Checks whether a submission requires action, is by the bot itself, has no matches, or is excluded.
+    The cheapest checks come first.
     :param submission_data: Reddit's praw submission API data.
     :param regex_matches: A list of regex matches in the submission.
     :return: True if submission requires action.
     """
-
-    submission_exclusions = [
-        title.search(string=submission_data.title) for title in MiscSettings.SUBMISSION_EXCLUSIONS
-    ]
-
-    if time.time() - submission_data.created_utc > 10 * 60:
-        logger.info("The submission is over 10 minutes old i.e. Reddit is bugging out. Skipping replying. "
-                    + submission_data.id)
+    if not regex_matches:  # No regex matches
+        logger.info("No matches in submission. " + submission_data.id)
         return False
 
     elif submission_data.author.name in MiscSettings.IGNORE_CALLS_FROM:  # Bots
@@ -313,11 +662,13 @@ def submission_requires_action(submission_data: praw.Reddit.submission, regex_ma
             + submission_data.id)
         return False
 
-    elif not regex_matches:  # No regex matches
-        logger.info("No matches in submission. " + submission_data.id)
+    elif time.time() - submission_data.created_utc > ReplySettings.MAX_REPLY_AGE:
+        logger.info(f"The submission is over {ReplySettings.MAX_REPLY_AGE} seconds old. Skipping replying. "
+                    + submission_data.id)
         return False
 
-    elif any(submission_exclusions):  # Is on exclusion list
+    elif any(title.search(string=submission_data.title)
+             for title in MiscSettings.SUBMISSION_EXCLUSIONS):  # Is on exclusion list
         logger.info("Submission on exclusion list. " + submission_data.id)
         return False
 
@@ -329,38 +680,78 @@ def submission_requires_action(submission_data: praw.Reddit.submission, regex_ma
         return True
 
 
-def item_reply(item_type: str, item_data, regex_matches: list, image_links: list):
+def render_reply(job: ReplyJob) -> str:
     """
-    Executes the reply action to an eligible item.
-    :param item_type:
-    :param item_data: Item to reply to.
-    :param regex_matches: A list of regex matches in the item.
-    :param image_links: A list of image candidate links.
+    Builds the reply text of an eligible item. The render stage of the reply pipeline.
+    :param job: A ReplyJob object.
+    :return: The reply text.
+    """
+    if job.callname:
+        return special_reply_text(job.reddit_data, job.callname)
+    return generate_reply_text(job.regex_matches, job.image_links)
+
+
+def post_reply(job: ReplyJob):
+    """
+    Executes the reply action to an eligible item. The post stage of the reply pipeline.
+    The reply goes through the poster thread's own Reddit session, the item was streamed on the main thread's.
+    :param job: A ReplyJob object with the reply text.
     """
-    reply_text = generate_reply_text(regex_matches, image_links)
-    item_data.reply(reply_text)
-    logger.info(f"Reply to {item_type} successful: https://www.reddit.com" + item_data.permalink)
-    print(f"Reply to {item_type} successful: https://www.reddit.com" + item_data.permalink)
+    reddit = job.reddit_data.session()
+    reply_target = reddit.comment(job.item.id) if job.item_type == "comment" else reddit.submission(job.item.id)
+    reply_target.reply(job.reply_text)
+    replied_index.add(job.item.fullname)
+    reply_kind = f"{job.callname} NFT reply" if job.callname else "Reply"
+    logger.info(f"{reply_kind} to {job.item_type} successful: https://www.reddit.com" + job.item.permalink)
+    print(f"{reply_kind} to {job.item_type} successful: https://www.reddit.com" + job.item.permalink)
 
 
-def special_reply(item_type: str, reddit_data: RedditData, item_data, callname: str):
+def special_reply_text(reddit_data: RedditData, callname: str) -> str:
     """
-    Executes the special collectible reply action to an eligible comment or submission.
-    :param item_type:
+    Issues the collectible's next collector number. The cooldown was claimed when the call was detected.
     :param reddit_data: A RedditData object.
-    :param item_data: A comment or a submission.
     :param callname: Name of the card that was called.
+    :return: The collectible's ASCII art with the new collector number.
     """
     if callname == ColossalDreadmaw.NAME:
-        dreadmaw_art = reddit_data.collectibles[ColossalDreadmaw.NAME].dreadmaw_ascii_art()
-        item_data.reply(dreadmaw_art)
-        dreadmaw_timer.new_expiry_time(random.randint(ColossalDreadmaw.TIMER_MIN, ColossalDreadmaw.TIMER_MAX))
-        logger.info(f"Colossal Dreadmaw NFT reply to {item_type} successful: https://www.reddit.com" + item_data.permalink)
-        print(f"Colossal Dreadmaw NFT reply to {item_type} successful: https://www.reddit.com" + item_data.permalink)
+        return reddit_data.collectibles[ColossalDreadmaw.NAME].dreadmaw_ascii_art()
 
     elif callname == StormCrow.NAME:
-        stormcrow_art = reddit_data.collectibles[StormCrow.NAME].stormcrow_ascii_art()
-        item_data.reply(stormcrow_art)
-        stormcrow_timer.new_expiry_time(random.randint(StormCrow.TIMER_MIN, StormCrow.TIMER_MAX))
-        logger.info(f"Storm Crow NFT reply to {item_type} successful: https://www.reddit.com" + item_data.permalink)
-        print(f"Storm Crow NFT reply to {item_type} successful: https://www.reddit.com" + item_data.permalink)
+        return reddit_data.collectibles[StormCrow.NAME].stormcrow_ascii_art()
+
+
+def finish_reply(job: ReplyJob, replied: bool):
+    """
+    Called by the reply pipeline for every job that leaves it. Marks the job's items (with the merged calls) done
+    in their streams, and gives back the collectible cooldown of a special reply that wasn't posted.
+    :param job: A ReplyJob object.
+    :param replied: True if the reply was posted.
+    """
+    for item_type, fullname in [(job.item_type, job.item.fullname)] + job.merged:
+        job.reddit_data.done(item_type, fullname)
+    if job.callname and not replied:
+        release_collectible(job.callname)
+
+
+# Parent submission titles by fullname for the comment exclusion checks, titles can't be edited
+title_cache = LookupCache(Subreddits.TITLE_CACHE_SIZE, Subreddits.TITLE_CACHE_TTL, Subreddits.TITLE_CACHE_TTL)
+
+
+replied_index = RepliedIndex(ReplySettings.REPLIED_INDEX_FILE, ReplySettings.REPLIED_INDEX_MAX_AGE,
+                             ReplySettings.REPLIED_INDEX_CAPACITY, ReplySettings.REPLIED_INDEX_FALSE_POSITIVE_RATE,
+                             ReplySettings.REPLIED_INDEX_PRUNE_INTERVAL)
+
+
+# Reply errors that show Reddit is failing. Others (deleted comment, locked thread, banned sub) don't trip the breaker.
+REPLY_FAILURE_ERRORS = (prawcore.ServerError, prawcore.RequestException, prawcore.TooManyRequests)
+
+
+reply_pipeline = ReplyPipeline(render_reply, post_reply, ReplySettings.RENDER_WORKERS, ReplySettings.RENDER_QUEUE_SIZE,
+                               ReplySettings.POST_QUEUE_SIZE, ReplySettings.REPLIES_PER_SECOND,
+                               ReplySettings.REPLY_BURST, ReplySettings.SUBMIT_TIMEOUT,
+                               ReplySettings.MAX_WAITING_PER_THREAD, ReplySettings.MAX_WAITING_PER_AUTHOR,
+                               ReplySettings.MAX_REPLY_AGE,
+                               CircuitBreaker("Reddit replies", BreakerSettings.FAILURE_THRESHOLD,
+                                              BreakerSettings.BASE_DELAY, BreakerSettings.MAX_DELAY,
+                                              BreakerSettings.JITTER, REPLY_FAILURE_ERRORS),
+                               finish_reply)
@@ -1,6 +1,8 @@
 """Contains functions that handle logging in to Reddit."""
 
+import threading
 import time
+from collections import OrderedDict
 
 import praw
 import praw.exceptions
@@ -8,49 +10,55 @@ import prawcore
 
 from func.base_logger import logger
 from data.exceptions import LoginException, FatalLoginError
-from data.collectibles import ColossalDreadmaw, StormCrow
+from data.collectibles import CollectibleCounters, ColossalDreadmaw, StormCrow
+from data.configs import Subreddits, BreakerSettings, ReplySettings, MiscSettings
+from func.circuit_breaker import CircuitBreaker
+from func.stream_checkpoints import CheckpointStore
 
 
 class RedditData:
     """
     A combined Reddit, SubredditData, and collectible card objects dict -object with the active connection to Reddit.
+    praw isn't thread-safe: self.reddit belongs to the thread that logged in, other threads use session().
     """
-    def __init__(self, login_info, targets: list):
+    def __init__(self, login_info, targets: list, checkpoint_store: CheckpointStore = None):
+        self.login_info = login_info
         self.targets = targets
+        self.checkpoint_store = checkpoint_store
         self.reddit = None
+        self.__owner = threading.get_ident()  # The thread that logged in owns self.reddit
+        self.__sessions = threading.local()  # The other threads' Reddit instances
+        self.__all_sessions = []  # Every Reddit instance made by new_session, they share the rate limit
+        self.__all_sessions_lock = threading.Lock()
         self.subreddit_streams = {}
         self.collectibles = {}
+        self.collectible_counters = None
         self.__try_login_loop(login_info)
 
     @staticmethod
     def __login_error_handler(func):
         """
-        Handles the errors during login. Does not re-attempt login.
+        Handles the errors during login. Does not re-attempt login or wait, the login loop does.
         """
         def wrapper(*args, **kwargs):
             """Wrapper."""
             try:
                 return func(*args, **kwargs)
             except prawcore.ServerError as server_err:
-                logger.warning("Server error, retry in 5 minutes. Error code: " + str(server_err))
-                time.sleep(300)
-                raise LoginException
+                logger.warning("Server error. Error code: " + str(server_err))
+                raise LoginException from server_err
             except prawcore.RequestException as request_exc:
-                logger.warning("Incomplete HTTP request, retry in 10 seconds. Error code: " + str(request_exc))
-                time.sleep(10)
-                raise LoginException
+                logger.warning("Incomplete HTTP request. Error code: " + str(request_exc))
+                raise LoginException from request_exc
             except prawcore.ResponseException as response_exc:
-                logger.warning("HTTP request response error, retry in 30 seconds. Error code: " + str(response_exc))
-                time.sleep(30)
-                raise LoginException
+                logger.warning("HTTP request response error. Error code: " + str(response_exc))
+                raise LoginException from response_exc
             except praw.exceptions.RedditAPIException as rapi_e:
-                logger.warning("RedditAPIException, retry in 10 seconds. Error code: " + str(rapi_e))
-                time.sleep(10)
-                raise LoginException
+                logger.warning("RedditAPIException. Error code: " + str(rapi_e))
+                raise LoginException from rapi_e
             except praw.exceptions.APIException as api_e:
-                logger.warning("APIException, retry in 10 seconds. Error code: " + str(api_e))
-                time.sleep(10)
-                raise LoginException
+                logger.warning("APIException. Error code: " + str(api_e))
+                raise LoginException from api_e
         return wrapper
 
     @__login_error_handler
@@ -59,15 +67,7 @@ class RedditData:
         Logs in to Reddit.
         :param login_info: A text file containing the OAuth info.
         """
-        with open(login_info, "r") as oauth_file:
-            info = oauth_file.read().splitlines()
-
-        reddit_instance = praw.Reddit(
-            user_agent=info[0],
-            username=info[1],
-            password=info[2],
-            client_id=info[3],
-            client_secret=info[4])
+        reddit_instance = praw.Reddit(**read_oauth_file(login_info))
 
         self.reddit = reddit_instance
         logger.info("Reddit login successful.")
@@ -75,19 +75,84 @@ class RedditData:
     @__login_error_handler
     def __open_streams(self):
         """
-        Creates a dictionary with SubredditData objects with subreddit names as keys.
+        Creates a dictionary with SubredditData objects with stream names as keys. A stream name is a subreddit name,
+        or with combined streams a multireddit name (sub1+sub2+...) that covers several subreddits in one listing.
         """
-        for subreddit in self.targets:
-            self.subreddit_streams[subreddit] = SubredditData(subreddit, self.reddit)
-            logger.info(f"Stream connections for {subreddit} were initiated.")
+        if Subreddits.COMBINED_STREAMS:
+            stream_names = multireddit_chunks(self.targets, Subreddits.MAX_MULTIREDDIT_LENGTH)
+        else:
+            stream_names = self.targets
+        for stream_name in stream_names:
+            self.subreddit_streams[stream_name] = SubredditData(stream_name, self.reddit, self.checkpoint_store)
+            logger.info(f"Stream connections for {stream_name} were initiated.")
 
     @__login_error_handler
     def __collectibles(self):
         """
-        Creates instances of the collectible card objects.
+        Loads the collectible counts and creates instances of the collectible card objects.
+        The counts are written back to Reddit in the background, through a Reddit instance of their own.
+        """
+        counters = CollectibleCounters(self.new_session(), MiscSettings.NFT_COUNTER_FILE,
+                                       MiscSettings.NFT_COUNTER_FLUSH_INTERVAL)
+        for collectible in (ColossalDreadmaw, StormCrow):
+            counters.load(collectible.NAME, collectible.COUNT_COMMENT)
+            self.collectibles[collectible.NAME] = collectible(counters)
+        counters.start()
+        self.collectible_counters = counters
+
+    def new_session(self) -> praw.Reddit:
+        """
+        Creates a separate Reddit instance with the same login, for a long-lived thread of its own.
+        Creating it doesn't make a request, the token is fetched with the first one.
+        :return: A new Reddit instance.
+        """
+        reddit = praw.Reddit(**read_oauth_file(self.login_info))
+        with self.__all_sessions_lock:
+            self.__all_sessions.append(reddit)
+        return reddit
+
+    def session(self) -> praw.Reddit:
+        """
+        :return: The calling thread's Reddit instance: self.reddit on the thread that logged in,
+        a Reddit instance of its own (created on the first call) on any other thread.
+        """
+        if threading.get_ident() == self.__owner:
+            return self.reddit
+        reddit = getattr(self.__sessions, "reddit", None)
+        if reddit is None:
+            reddit = self.__sessions.reddit = self.new_session()
+        return reddit
+
+    def rate_limits(self) -> dict:
+        """
+        Reddit's rate limit state across all the Reddit instances. They use the same login and so share one limit,
+        but every instance only sees the state of its own latest request: the lowest remaining count among
+        the instances whose rate limit window hasn't been reset is the closest to the truth.
+        :return: A dict like reddit.auth.limits, of self.reddit if no instance has a current window.
+        """
+        with self.__all_sessions_lock:
+            sessions = [self.reddit] + self.__all_sessions
+        now = time.time()
+        current = [reddit.auth.limits for reddit in sessions]
+        current = [limits for limits in current
+                   if limits.get("remaining") is not None and (limits.get("reset_timestamp") or 0) > now]
+        return min(current, key=lambda limits: limits["remaining"], default=self.reddit.auth.limits)
+
+    def done(self, item_type: str, fullname: str):
+        """
+        Marks a checked in item processed in the stream that delivered it.
+        :param item_type: "comment" or "submission".
+        :param fullname: Fullname of the item.
         """
-        self.collectibles[ColossalDreadmaw.NAME] = ColossalDreadmaw(self.reddit)
-        self.collectibles[StormCrow.NAME] = StormCrow(self.reddit)
+        for stream_data in self.subreddit_streams.values():
+            stream_data.done(item_type, fullname)
+
+    def close(self):
+        """
+        Writes the collectible counts that the counter comments don't have yet. Call once the bot stops.
+        """
+        if self.collectible_counters is not None:
+            self.collectible_counters.stop()
 
     def __try_login_loop(self, login_info):
         """
@@ -96,6 +161,8 @@ class RedditData:
         :return: A RedditData object containing the Reddit instance and subreddit streams.
         """
         attempts = 0
+        # Waits 1, 2, 4... seconds (jittered) between the attempts
+        login_breaker = CircuitBreaker("Reddit login", 1, 1, BreakerSettings.MAX_DELAY, BreakerSettings.JITTER)
 
         while attempts < 20:
             try:
@@ -104,10 +171,12 @@ class RedditData:
                 self.__collectibles()
                 break
 
-            except LoginException:
-                time.sleep(2 ** attempts)
+            except LoginException as login_e:
+                login_breaker.record_failure(login_e)
+                retry_delay = login_breaker.seconds_until_retry()
                 logger.warning(f"Exception while retrieving Reddit data during login. "
-                               f"Retrying after {2 ** attempts} seconds.")
+                               f"Retrying after {retry_delay:.0f} seconds.")
+                time.sleep(retry_delay)  # Nothing on this thread can run before the login
                 attempts += 1
 
         if attempts >= 20:
@@ -115,11 +184,192 @@ class RedditData:
             raise FatalLoginError("Too many failed login attemps. Exiting program. Goodbye.")
 
 
+def read_oauth_file(login_info) -> dict:
+    """
+    Reads the OAuth info.
+    :param login_info: A text file containing the OAuth info, one item per line.
+    :return: A dict of the praw.Reddit login keyword arguments.
+    """
+    with open(login_info, "r") as oauth_file:
+        info = oauth_file.read().splitlines()
+
+    return {
+        "user_agent": info[0],
+        "username": info[1],
+        "password": info[2],
+        "client_id": info[3],
+        "client_secret": info[4]}
+
+
+def multireddit_chunks(subreddits: list, max_length: int) -> list:
+    """
+    Joins subreddit names into multireddit names (sub1+sub2+...) no longer than max_length,
+    so that one listing covers as many subreddits as Reddit accepts.
+    :param subreddits: A list of subreddit names.
+    :param max_length: Maximum length of a multireddit name.
+    :return: A list of multireddit names, a lone subreddit's name if it doesn't fit with others.
+    """
+    chunks = []
+    chunk = ""
+    for subreddit in subreddits:
+        if chunk and len(chunk) + 1 + len(subreddit) > max_length:
+            chunks.append(chunk)
+            chunk = ""
+        chunk = f"{chunk}+{subreddit}" if chunk else subreddit
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+
 class SubredditData:
     """
-    Subreddit streams object. Target, submissions, comments.
+    Subreddit streams object. Target (a subreddit or a multireddit name), submissions, comments,
+    and the newest processed item of each stream to resume from. An item counts as processed once its handling
+    is done (no reply needed, or its reply posted, shed or failed), so the checkpoint only moves past an item
+    after that, and never past an older item still waiting in the reply pipeline.
     """
-    def __init__(self, target: str, reddit: praw.Reddit):
+    def __init__(self, target: str, reddit: praw.Reddit, checkpoint_store: CheckpointStore = None):
+        """
+        Opens the streams. With a checkpoint store, the streams resume after the items processed before a restart.
+        :param target: A subreddit or a multireddit (sub1+sub2+...).
+        :param reddit: Reddit instance.
+        :param checkpoint_store: CheckpointStore that keeps the checkpoints between runs, None to not keep them.
+        """
         self.target = target
-        self.submissions = reddit.subreddit(target).stream.submissions(skip_existing=True, pause_after=1)
-        self.comments = reddit.subreddit(target).stream.comments(skip_existing=True, pause_after=1)
+        self.reddit = reddit
+        self.checkpoint_store = checkpoint_store
+        self.submissions = None
+        self.comments = None
+        self.checkpoints = {"comment": None, "submission": None}  # Item type -> (fullname, created_utc)
+        # Item type -> fullname -> [created_utc, done], the items after the checkpoint in stream order
+        self.in_flight = {"comment": OrderedDict(), "submission": OrderedDict()}
+        self.__lock = threading.Lock()  # Items are done in the reply pipeline's threads
+        if checkpoint_store is not None:
+            for item_type in self.checkpoints:
+                self.checkpoints[item_type] = checkpoint_store.load(target, item_type)
+        self.reopen("submission")
+        self.reopen("comment")
+
+    def reopen(self, item_type: str):
+        """
+        Opens a new stream in place of one that an error (or a restart) ended. The Reddit session is kept.
+        With a checkpoint the new stream first catches up on the items posted after the newest processed item
+        (however old that item is, the catch-up itself skips the items too old for a reply),
+        and then switches to live streaming.
+        :param item_type: "comment" or "submission".
+        """
+        checkpoint = self.checkpoints[item_type]
+        if checkpoint is not None:
+            logger.info(f"Resuming the {item_type} stream of {self.target} after {checkpoint[0]}.")
+            stream = self.__resumed_stream(item_type, checkpoint[0])
+        else:
+            stream = self.__live_stream(item_type, skip_existing=True)
+
+        if item_type == "comment":
+            self.comments = stream
+        else:
+            self.submissions = stream
+
+    def __live_stream(self, item_type: str, **stream_options):
+        """
+        :param item_type: "comment" or "submission".
+        :param stream_options: skip_existing or continue_after_id.
+        :return: A praw stream of the target's new items.
+        """
+        # pause_after=0: every poll is one request (more while there are new items), the PollScheduler sets the pace
+        stream = self.reddit.subreddit(self.target).stream
+        if item_type == "comment":
+            return stream.comments(pause_after=0, **stream_options)
+        return stream.submissions(pause_after=0, **stream_options)
+
+    def __resumed_stream(self, item_type: str, checkpoint_fullname: str):
+        """
+        Pages backwards from the newest item to the checkpoint, yields the missed items oldest first,
+        and then the live stream from the newest listed item. The catch-up stops at items older than the reply age limit
+        and after Subreddits.BACKFILL_MAX_REQUESTS listing pages, the calls beyond those are skipped.
+        Runs lazily, so the catch-up requests are made by the first poll under its error handling.
+        :param item_type: "comment" or "submission".
+        :param checkpoint_fullname: Fullname of the newest processed item.
+        """
+        subreddit = self.reddit.subreddit(self.target)
+        listing = subreddit.comments if item_type == "comment" else subreddit.new
+        checkpoint_id = int(checkpoint_fullname.split("_", 1)[1], 36)
+        oldest_created = time.time() - ReplySettings.MAX_REPLY_AGE
+
+        missed = []
+        newest = None
+        # A listing page has 100 items, so the limit caps the number of requests
+        for item in listing(limit=100 * Subreddits.BACKFILL_MAX_REQUESTS):
+            if newest is None:
+                newest = item.fullname
+            if int(item.id, 36) <= checkpoint_id or item.created_utc < oldest_created:
+                break
+            missed.append(item)
+        logger.info(f"Caught up on {len(missed)} {item_type}s of {self.target} after {checkpoint_fullname}.")
+
+        missed.reverse()
+        yield from missed
+        if newest is None:  # Nothing listed, there is no item to continue after
+            yield from self.__live_stream(item_type, skip_existing=True)
+        else:
+            # The newest listed item, not an old checkpoint that praw would page from
+            yield from self.__live_stream(item_type, continue_after_id=newest)
+
+    def check_in(self, item_type: str, item) -> bool:
+        """
+        Starts tracking an item, unless it was processed already or is being processed. Reddit ids grow with time,
+        so an item at or before the checkpoint, or one in flight, is one that a resumed stream delivered again.
+        Every checked in item must be passed to done() or release().
+        :param item_type: "comment" or "submission".
+        :param item: A comment or a submission from the stream.
+        :return: True if the item is new, False if it was processed already.
+        """
+        with self.__lock:
+            checkpoint = self.checkpoints[item_type]
+            if checkpoint is not None and int(item.id, 36) <= int(checkpoint[0].split("_", 1)[1], 36):
+                return False
+            if item.fullname in self.in_flight[item_type]:
+                return False
+            self.in_flight[item_type][item.fullname] = [item.created_utc, False]
+            return True
+
+    def done(self, item_type: str, fullname: str):
+        """
+        Marks a checked in item processed. Does nothing for an item this stream doesn't track.
+        :param item_type: "comment" or "submission".
+        :param fullname: Fullname of the item.
+        """
+        with self.__lock:
+            entry = self.in_flight[item_type].get(fullname)
+            if entry is not None:
+                entry[1] = True
+
+    def release(self, item_type: str, fullname: str):
+        """
+        Stops tracking a checked in item that wasn't handled, so that a reopened stream can deliver it again.
+        :param item_type: "comment" or "submission".
+        :param fullname: Fullname of the item.
+        """
+        with self.__lock:
+            self.in_flight[item_type].pop(fullname, None)
+
+    def save_checkpoint(self, item_type: str):
+        """
+        Moves the checkpoint to the newest item before the oldest one still in flight, and stores it
+        so that a restarted bot resumes from it. One write however many items were processed.
+        :param item_type: "comment" or "submission".
+        """
+        with self.__lock:
+            in_flight = self.in_flight[item_type]
+            checkpoint = self.checkpoints[item_type]
+            while in_flight:
+                fullname, (created, done) = next(iter(in_flight.items()))
+                if not done:
+                    break
+                in_flight.popitem(last=False)
+                checkpoint = (fullname, created)
+            if checkpoint == self.checkpoints[item_type]:
+                return
+            self.checkpoints[item_type] = checkpoint
+        if self.checkpoint_store is not None:
+            self.checkpoint_store.save(self.target, item_type, *checkpoint)
@@ -0,0 +1,136 @@
+"""Persistent index of the items the bot has replied to."""
+
+import hashlib
+import math
+import os
+import threading
+import time
+
+from func.base_logger import logger
+from func.timer import RefreshTimer
+
+
+class BloomFilter:
+    """
+    A fixed-size Bloom filter of strings. Never misses an added string, and wrongly reports
+    an unseen string with roughly the false positive rate it was sized for.
+    """
+    def __init__(self, capacity: int, false_positive_rate: float):
+        """
+        Constructs an empty filter.
+        :param capacity: Number of strings the filter is sized for.
+        :param false_positive_rate: Wanted false positive rate at full capacity.
+        """
+        self.bit_count = max(8, int(-capacity * math.log(false_positive_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.bit_count / capacity * math.log(2)))
+        self.__bits = bytearray((self.bit_count + 7) // 8)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.__bits.__sizeof__()
+
+    def __positions(self, key: str):
+        """
+        :param key: A string.
+        :return: The bit positions of the string, from two 64-bit hashes (double hashing).
+        """
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, key: str):
+        """
+        Adds a string to the filter.
+        :param key: A string.
+        """
+        for position in self.__positions(key):
+            self.__bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.__bits[position >> 3] & (1 << (position & 7)) for position in self.__positions(key))
+
+
+class RepliedIndex:
+    """
+    The fullnames of the items replied to, kept in an append-only log file so that replies stay idempotent
+    across reconnects and restarts. In memory a Bloom filter answers most lookups (the items never replied to)
+    and an exact fullname -> reply time dict settles the rest. Entries older than max_age are pruned.
+    """
+    def __init__(self, log_file: str, max_age: float, capacity: int, false_positive_rate: float,
+                 prune_interval: int):
+        """
+        Constructs an empty index. load() reads the log file.
+        :param log_file: Path to the log file, one "fullname<TAB>reply time" line per reply.
+        :param max_age: Seconds an entry is kept.
+        :param capacity: Number of entries the Bloom filter is sized for.
+        :param false_positive_rate: Wanted Bloom filter false positive rate at full capacity.
+        :param prune_interval: Seconds between prunes.
+        """
+        self.log_file = log_file
+        self.max_age = max_age
+        self.capacity = capacity
+        self.false_positive_rate = false_positive_rate
+        self.__lock = threading.Lock()
+        self.__replied = {}  # Fullname -> Unix time of the reply
+        self.__bloom = BloomFilter(capacity, false_positive_rate)
+        self.__prune_timer = RefreshTimer(prune_interval)
+
+    def __len__(self):
+        return len(self.__replied)
+
+    def __contains__(self, fullname: str) -> bool:
+        return fullname in self.__bloom and fullname in self.__replied
+
+    def load(self):
+        """
+        Reads the entries from the log file and compacts it, dropping the expired entries.
+        """
+        if os.path.exists(self.log_file):
+            with open(self.log_file, "r", encoding="utf-8") as log:
+                for line in log:
+                    fullname, _, replied = line.rstrip("\n").partition("\t")
+                    try:
+                        self.__replied[fullname] = float(replied)
+                    except ValueError:  # A line cut short by a crash
+                        continue
+        self.prune()
+        logger.info(f"Loaded {len(self)} replied items from the replied item index.")
+
+    def add(self, fullname: str):
+        """
+        Records a reply to an item. Prunes the index if the prune interval has passed.
+        :param fullname: Fullname of the item replied to.
+        """
+        replied = time.time()
+        with self.__lock:
+            self.__replied[fullname] = replied
+            self.__bloom.add(fullname)
+            with open(self.log_file, "a", encoding="utf-8") as log:
+                log.write(f"{fullname}\t{replied:.0f}\n")
+        if self.__prune_timer.recurring_timer():
+            self.prune()
+
+    def prune(self):
+        """
+        Drops the expired entries, rebuilds the Bloom filter (entries can't be removed from one)
+        and rewrites the log file with the remaining entries.
+        """
+        oldest = time.time() - self.max_age
+        with self.__lock:
+            self.__replied = {fullname: replied for fullname, replied in self.__replied.items() if replied >= oldest}
+            bloom = BloomFilter(max(self.capacity, len(self.__replied)), self.false_positive_rate)
+            for fullname in self.__replied:
+                bloom.add(fullname)
+            self.__bloom = bloom  # Swapped in whole, lookups meanwhile use the old filter
+            temporary_file = self.log_file + ".tmp"
+            with open(temporary_file, "w", encoding="utf-8") as log:
+                log.writelines(f"{fullname}\t{replied:.0f}\n" for fullname, replied in self.__replied.items())
+            os.replace(temporary_file, self.log_file)  # Atomic, a crash leaves the old log in place
+
+    def memory_usage(self) -> int:
+        """
+        :return: Approximate bytes used by the Bloom filter and the exact dict with its keys.
+        """
+        return (self.__bloom.__sizeof__() + self.__replied.__sizeof__()
+                + sum(fullname.__sizeof__() for fullname in self.__replied)
+                + 24 * len(self.__replied))  # Reply time floats
@@ -0,0 +1,404 @@
+"""Staged reply pipeline: detect -> render -> post, connected by bounded queues."""
+
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import Counter
+
+from func.base_logger import logger
+from func.rate_limiter import TokenBucket
+
+
+class ReplyJob:
+    """
+    Holds a call that should be replied to, as it moves through the pipeline.
+    """
+    __slots__ = ("item_type", "item", "regex_matches", "callname", "reddit_data", "image_links", "reply_text",
+                 "detected", "enqueued", "created", "thread_id", "author", "cancelled", "merged")
+
+    def __init__(self, item_type: str, item, regex_matches: list, callname: "str | None", reddit_data,
+                 image_links: list):
+        """
+        Constructs the reply job.
+        :param item_type: "comment" or "submission".
+        :param item: The comment or submission to reply to.
+        :param regex_matches: A list of regex matches in the item.
+        :param callname: Name of the collectible card for a special reply, None for a regular reply.
+        :param reddit_data: A RedditData object.
+        :param image_links: Image link candidates.
+        """
+        self.item_type = item_type
+        self.item = item
+        self.regex_matches = regex_matches
+        self.callname = callname
+        self.reddit_data = reddit_data
+        self.image_links = image_links
+        self.reply_text = None
+        self.detected = time.monotonic()
+        self.enqueued = self.detected
+        self.created = item.created_utc
+        self.thread_id = getattr(item, "link_id", None) or item.fullname  # A comment's submission or the submission
+        self.author = item.author.name if item.author else None
+        self.cancelled = False  # Merged into a newer job of the same author
+        self.merged = []  # (item type, fullname) of the older calls this reply answers too
+
+    def age(self) -> float:
+        """
+        :return: Seconds since the call was posted.
+        """
+        return time.time() - self.created
+
+    def merge(self, older_job: "ReplyJob"):
+        """
+        Adds an older call's card names to this job, so that one reply answers both calls.
+        :param older_job: A regular ReplyJob of the same author in the same thread.
+        """
+        seen = set(match.casefold() for match in self.regex_matches)
+        merged = [match for match in older_job.regex_matches if match.casefold() not in seen]
+        self.regex_matches = merged + self.regex_matches
+        self.detected = min(self.detected, older_job.detected)
+        self.merged += [(older_job.item_type, older_job.item.fullname)] + older_job.merged
+        older_job.cancelled = True
+
+    def __str__(self):
+        return f"Attributes: {dict((slot, getattr(self, slot)) for slot in self.__slots__)}"
+
+
+class StageStats:
+    """
+    Counters of a pipeline stage: jobs, time waited in the stage's queue and time spent in the stage.
+    """
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.jobs = 0
+        self.failures = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.work_total = 0.0
+        self.work_max = 0.0
+
+    def record(self, waited: float, worked: float, failed: bool = False):
+        """
+        Counts a job that went through the stage.
+        :param waited: Seconds the job waited in the stage's queue.
+        :param worked: Seconds the stage spent on the job.
+        :param failed: True if the stage failed the job.
+        """
+        with self.__lock:
+            self.jobs += 1
+            self.failures += failed
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.work_total += worked
+            self.work_max = max(self.work_max, worked)
+
+    def stats(self) -> dict:
+        """
+        :return: A dict of the job counts and the mean and max wait and work times in milliseconds.
+        """
+        with self.__lock:
+            jobs = max(self.jobs, 1)
+            return {
+                "jobs": self.jobs, "failures": self.failures,
+                "wait_mean_ms": round(self.wait_total / jobs * 1000), "wait_max_ms": round(self.wait_max * 1000),
+                "work_mean_ms": round(self.work_total / jobs * 1000), "work_max_ms": round(self.work_max * 1000),
+            }
+
+
+class ReplyScheduler:
+    """
+    A bounded priority queue of reply jobs for bursts of calls. The freshest call is rendered first.
+    A new regular call merges the waiting call of the same author in the same thread into itself.
+    Calls over the per-thread or per-author cap, and calls whose reply would land after the maximum reply age,
+    are shed early instead of waiting in line, and every shed call is counted by reason. When the queue is full,
+    the oldest waiting call makes room for a fresher one.
+    """
+    def __init__(self, max_size: int, max_per_thread: int, max_per_author: int, max_age: float, expected_wait,
+                 on_shed=None):
+        """
+        Constructs the scheduler.
+        :param max_size: Maximum number of waiting jobs.
+        :param max_per_thread: Maximum number of waiting jobs per thread.
+        :param max_per_author: Maximum number of waiting jobs per author.
+        :param max_age: Seconds after the call beyond which a reply isn't posted anymore.
+        :param expected_wait: A function that estimates the seconds from dequeuing a job to its posted reply.
+        :param on_shed: A function called with every shed job, None for nothing.
+        """
+        self.max_size = max_size
+        self.max_per_thread = max_per_thread
+        self.max_per_author = max_per_author
+        self.max_age = max_age
+        self.expected_wait = expected_wait
+        self.on_shed = on_shed
+        self.counts = Counter()
+        self.__heap = []  # (-created, sequence number, job), freshest first
+        self.__sequence = itertools.count()
+        self.__waiting = 0
+        self.__per_thread = Counter()
+        self.__per_author = Counter()
+        self.__regular_jobs = {}  # (thread id, author) -> waiting regular job, for merging
+        self.__condition = threading.Condition()
+
+    def qsize(self) -> int:
+        """
+        :return: Number of waiting jobs.
+        """
+        with self.__condition:
+            return self.__waiting
+
+    def put(self, job: ReplyJob, timeout: float) -> bool:
+        """
+        Queues a job, or merges it with the author's waiting call, or sheds it.
+        :param job: A ReplyJob object.
+        :param timeout: Seconds to wait for room if the queue is full and every waiting job is fresher.
+        :return: True if the job was queued, False if it was shed.
+        """
+        with self.__condition:
+            author_key = (job.thread_id, job.author)
+            waiting_job = self.__regular_jobs.get(author_key)
+            if job.callname is None and waiting_job is not None:
+                job.merge(waiting_job)
+                self.__forget_locked(waiting_job)
+                self.counts["merged"] += 1
+
+            if self.__per_thread[job.thread_id] >= self.max_per_thread:
+                return self.__shed_locked(job, "thread_cap")
+            if job.author is not None and self.__per_author[job.author] >= self.max_per_author:
+                return self.__shed_locked(job, "author_cap")
+            if job.age() + self.expected_wait() > self.max_age:
+                return self.__shed_locked(job, "stale")
+
+            if self.__waiting >= self.max_size:
+                oldest = min((entry[2] for entry in self.__heap if not entry[2].cancelled),
+                             key=lambda waiting: waiting.created)
+                if oldest.created < job.created:
+                    self.__forget_locked(oldest)
+                    oldest.cancelled = True
+                    self.counts["shed_full"] += 1
+                    if self.on_shed is not None:
+                        self.on_shed(oldest)
+                elif not self.__condition.wait_for(lambda: self.__waiting < self.max_size, timeout):
+                    return self.__shed_locked(job, "full")
+
+            heapq.heappush(self.__heap, (-job.created, next(self.__sequence), job))
+            self.__waiting += 1
+            self.__per_thread[job.thread_id] += 1
+            if job.author is not None:
+                self.__per_author[job.author] += 1
+            if job.callname is None:
+                self.__regular_jobs[author_key] = job
+            self.__condition.notify_all()
+            return True
+
+    def get(self) -> ReplyJob:
+        """
+        Takes the freshest job that can still be replied to in time, waiting for one if needed.
+        Jobs that can't anymore are shed on the way.
+        :return: A ReplyJob object.
+        """
+        with self.__condition:
+            while True:
+                self.__condition.wait_for(lambda: self.__heap)
+                job = heapq.heappop(self.__heap)[2]
+                if job.cancelled:
+                    continue
+                self.__forget_locked(job)
+                if job.age() + self.expected_wait() > self.max_age:
+                    self.counts["shed_stale"] += 1
+                    logger.info(f"Shed a stale {job.item_type} call: https://www.reddit.com{job.item.permalink}")
+                    if self.on_shed is not None:
+                        self.on_shed(job)
+                    continue
+                return job
+
+    def shed(self, job: ReplyJob, reason: str):
+        """
+        Counts and logs a job that a later stage shed, and hands it to on_shed.
+        :param job: The ReplyJob object.
+        :param reason: Why the job was shed.
+        """
+        with self.__condition:
+            self.__shed_locked(job, reason)
+
+    def counts_snapshot(self) -> dict:
+        """
+        :return: A copy of the merged and shed call counts.
+        """
+        with self.__condition:
+            return dict(self.counts)
+
+    def __forget_locked(self, job: ReplyJob):
+        """
+        Removes a waiting job from the counts. The lock must be held.
+        :param job: A waiting ReplyJob object.
+        """
+        self.__waiting -= 1
+        self.__per_thread[job.thread_id] -= 1
+        if job.author is not None:
+            self.__per_author[job.author] -= 1
+        if self.__regular_jobs.get((job.thread_id, job.author)) is job:
+            del self.__regular_jobs[(job.thread_id, job.author)]
+        self.__condition.notify_all()
+
+    def __shed_locked(self, job: ReplyJob, reason: str) -> bool:
+        """
+        Counts and logs a shed job. The lock must be held.
+        :param job: The ReplyJob object.
+        :param reason: Why the job was shed.
+        :return: False.
+        """
+        self.counts[f"shed_{reason}"] += 1
+        logger.info(f"Shed a {job.item_type} call ({reason}): https://www.reddit.com{job.item.permalink}")
+        if self.on_shed is not None:
+            self.on_shed(job)
+        return False
+
+
+class ReplyPipeline:
+    """
+    Replies in three stages so that slow replies don't hold up the streams. The stream readers detect calls and
+    submit jobs, render workers build the reply texts, and a poster sends the replies at the rate Reddit allows.
+    The queues between the stages are bounded: a full post queue makes the render workers wait, and the render
+    queue is a ReplyScheduler that sheds the calls it can't answer in time, so the backlog can't grow without limit.
+    """
+    def __init__(self, render, post, render_workers: int, render_queue_size: int, post_queue_size: int,
+                 replies_per_second: float, reply_burst: int, submit_timeout: float, max_per_thread: int,
+                 max_per_author: int, max_age: float, breaker=None, on_finish=None):
+        """
+        Constructs the pipeline. Jobs are processed once the stages are started.
+        :param render: A function that builds a job's reply text: render(job) -> str.
+        :param post: A function that posts a job's reply: post(job).
+        :param render_workers: Number of render threads.
+        :param render_queue_size: Maximum number of jobs waiting to be rendered.
+        :param post_queue_size: Maximum number of rendered replies waiting to be posted.
+        :param replies_per_second: Sustained replies per second.
+        :param reply_burst: Largest burst of back-to-back replies.
+        :param submit_timeout: Seconds submit waits for room in a full render queue before shedding the job.
+        :param max_per_thread: Maximum number of calls waiting to be rendered per thread.
+        :param max_per_author: Maximum number of calls waiting to be rendered per author.
+        :param max_age: Seconds after the call beyond which a reply isn't posted anymore.
+        :param breaker: CircuitBreaker of the replies, None for no breaker. While it is open only the poster waits.
+        :param on_finish: A function called when a job leaves the pipeline: on_finish(job, replied),
+        replied is False if the job was shed or failed. None for nothing.
+        """
+        self.render = render
+        self.breaker = breaker
+        self.post = post
+        self.on_finish = on_finish
+        self.replies_per_second = replies_per_second
+        self.submit_timeout = submit_timeout
+        self.render_stats = StageStats()
+        self.post_stats = StageStats()
+        self.total_stats = StageStats()  # From detection to posted reply
+        self.render_queue = ReplyScheduler(render_queue_size, max_per_thread, max_per_author, max_age,
+                                           self.expected_wait, lambda job: self.__finish(job, False))
+        self.post_queue = queue.Queue(maxsize=post_queue_size)
+        self.__limiter = TokenBucket(replies_per_second, reply_burst)
+        self.__threads = [threading.Thread(target=self.__render_loop, name=f"ReplyRender-{number}", daemon=True)
+                          for number in range(render_workers)]
+        self.__threads.append(threading.Thread(target=self.__post_loop, name="ReplyPost", daemon=True))
+
+    def start(self):
+        """Starts the render and post threads."""
+        for thread in self.__threads:
+            thread.start()
+
+    def stats(self) -> dict:
+        """
+        :return: A dict of the queue depths, the merged and shed call counts and the stats of every stage.
+        """
+        return {
+            "render_depth": self.render_queue.qsize(), "post_depth": self.post_queue.qsize(),
+            **self.render_queue.counts_snapshot(), "render": self.render_stats.stats(), "post": self.post_stats.stats(),
+            "total": self.total_stats.stats(),
+        }
+
+    def expected_wait(self) -> float:
+        """
+        Estimates the time from the start of rendering to the posted reply.
+        :return: Seconds.
+        """
+        render_stats = self.render_stats.stats()
+        return render_stats["work_mean_ms"] / 1000 + (self.post_queue.qsize() + 1) / self.replies_per_second
+
+    def submit(self, job: ReplyJob) -> bool:
+        """
+        Queues a job for rendering. Waits at most submit_timeout if the render queue is full of fresher calls.
+        :param job: A ReplyJob object.
+        :return: True if the job was queued, False if it was shed.
+        """
+        job.enqueued = time.monotonic()
+        return self.render_queue.put(job, self.submit_timeout)
+
+    def __finish(self, job: ReplyJob, replied: bool):
+        """
+        Hands a job that left the pipeline to the on_finish function.
+        :param job: The ReplyJob object.
+        :param replied: True if the reply was posted.
+        """
+        if self.on_finish is not None:
+            self.on_finish(job, replied)
+
+    def __render_loop(self):
+        """Render thread loop."""
+        while True:
+            job = self.render_queue.get()
+            started = time.monotonic()
+            try:
+                job.reply_text = self.render(job)
+            except Exception as render_e:
+                # A broken reply must not stop the stage
+                self.render_stats.record(started - job.enqueued, time.monotonic() - started, True)
+                logger.warning(f"Rendering a reply to {job.item_type} failed: {render_e}")
+                self.__finish(job, False)
+                continue
+            finished = time.monotonic()
+            self.render_stats.record(started - job.enqueued, finished - started)
+            job.enqueued = finished
+            self.post_queue.put(job)  # Waits while the poster is behind
+
+    def __post_loop(self):
+        """
+        Post thread loop. Only the breaker's failure errors (transport and rate limit errors) count as failures,
+        any other answer from Reddit (deleted comment, locked thread) shows that Reddit works.
+        """
+        while True:
+            job = self.post_queue.get()
+            if job.age() > self.render_queue.max_age:  # Shed before taking a half-open probe
+                self.render_queue.shed(job, "late")  # Finishes the job through on_shed
+                continue
+            while self.breaker is not None and not self.breaker.allow():
+                time.sleep(max(self.breaker.seconds_until_retry(), 0.1))
+
+            recorded = False
+            try:
+                self.__limiter.acquire()
+                if job.age() > self.render_queue.max_age:
+                    self.render_queue.shed(job, "late")
+                    continue
+                started = time.monotonic()
+                try:
+                    self.post(job)
+                except Exception as post_e:
+                    self.post_stats.record(started - job.enqueued, time.monotonic() - started, True)
+                    logger.warning(f"Posting a reply to {job.item_type} failed: {post_e}")
+                    if self.breaker is not None:
+                        if isinstance(post_e, self.breaker.failure_errors):
+                            self.breaker.record_failure(post_e)
+                        else:
+                            self.breaker.record_success()
+                        recorded = True
+                    self.__finish(job, False)
+                    continue
+                if self.breaker is not None:
+                    self.breaker.record_success()
+                    recorded = True
+                self.__finish(job, True)
+                finished = time.monotonic()
+                self.post_stats.record(started - job.enqueued, finished - started)
+                self.total_stats.record(0.0, finished - job.detected)
+            finally:
+                if self.breaker is not None and not recorded:
+                    self.breaker.release_probe()  # The probe was shed or ended without an answer
@@ -0,0 +1,108 @@
+"""Persistent SQLite cache of Scryfall API responses."""
+
+import sqlite3
+import threading
+import time
+
+from func.base_logger import logger
+
+
+class CachedResponse:
+    """
+    Holds a cached Scryfall response.
+    """
+    __slots__ = ("status", "body", "fetched")
+
+    def __init__(self, status: int, body: str, fetched: float):
+        """
+        Constructs the cached response object.
+        :param status: HTTP status code of the response, 200 for a card and 404 for a name that isn't a card.
+        :param body: Response body (card JSON object), empty for a 404.
+        :param fetched: Unix time of the fetch.
+        """
+        self.status = status
+        self.body = body
+        self.fetched = fetched
+
+    def __str__(self):
+        return f"Attributes: {dict((slot, getattr(self, slot)) for slot in self.__slots__)}"
+
+    def age(self) -> float:
+        """
+        :return: Seconds since the response was fetched.
+        """
+        return time.time() - self.fetched
+
+
+class ResponseCache:
+    """
+    A normalized cardname -> CachedResponse store in an SQLite database that survives restarts.
+    The database is opened on first use, so that importing the module that holds the cache creates no files.
+    """
+    def __init__(self, db_file: str, max_age: float, negative_max_age: float):
+        """
+        Constructs the cache. The database is opened (and created if needed) on first use.
+        :param db_file: Path to the SQLite database file.
+        :param max_age: Seconds a card response is served before it's fetched again.
+        :param negative_max_age: Seconds a 'not a card' response is served before it's fetched again.
+        """
+        self.db_file = db_file
+        self.max_age = max_age
+        self.negative_max_age = negative_max_age
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+    def __len__(self):
+        with self.__lock:
+            return self.__connect().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def __connect(self) -> sqlite3.Connection:
+        """
+        Opens (and creates if needed) the cache database, unless it's open already. The lock must be held.
+        :return: The database connection.
+        """
+        if self.__connection is None:
+            connection = sqlite3.connect(self.db_file, check_same_thread=False)
+            with connection:
+                connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "name_key TEXT PRIMARY KEY, status INTEGER NOT NULL, body TEXT NOT NULL, fetched REAL NOT NULL)"
+                )
+            count = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            logger.info(f"Scryfall response cache opened with {count} responses.")
+            self.__connection = connection
+        return self.__connection
+
+    def is_fresh(self, response: CachedResponse) -> bool:
+        """
+        :param response: A CachedResponse object.
+        :return: True if the response can be served without fetching it again.
+        """
+        max_age = self.max_age if response.status == 200 else self.negative_max_age
+        return response.age() < max_age
+
+    def get(self, name_key: str) -> "CachedResponse | None":
+        """
+        Finds a cached response.
+        :param name_key: Normalized cardname.
+        :return: A CachedResponse object, None if nothing is cached for the name.
+        """
+        with self.__lock:
+            row = self.__connect().execute(
+                "SELECT status, body, fetched FROM responses WHERE name_key = ?", (name_key,)
+            ).fetchone()
+        return CachedResponse(*row) if row else None
+
+    def store(self, name_key: str, status: int, body: str):
+        """
+        Stores (or replaces) a response.
+        :param name_key: Normalized cardname.
+        :param status: HTTP status code.
+        :param body: Response body.
+        """
+        with self.__lock, self.__connect() as connection:
+            # Named columns, so that databases created with the former validator columns still work
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (name_key, status, body, fetched) VALUES (?, ?, ?, ?)",
+                (name_key, status, body, time.time())
+            )
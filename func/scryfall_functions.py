@@ -1,45 +1,331 @@
 """Functions that communicate with Scryfall."""
 
+import json
+from collections import Counter
+
 import requests
+import requests.adapters
 
 from func.base_logger import logger
-from data.configs import BotInfo
+from func.card_index import CardIndex, bulk_card_to_indexed
+from func.lookup_cache import LookupCache
+from func.response_cache import ResponseCache
+from func.rate_limiter import TokenBucket
+from func.timer import Deadline
+from func.circuit_breaker import CircuitBreaker
+from data.configs import BotInfo, ScryfallSettings, BreakerSettings
+from data.exceptions import DeadlineExceeded, CircuitOpen
 
 
-def get_scryfall_image(cardname: str) -> str:
+class ScryfallClient:
     """
-    Fetches the image URL that matches the cardname.
-    :param cardname: Cardname.
-    :return: Image URL if an exact match is found, empty string if no match is found or Scryfall can't be reached.
+    Shared Scryfall HTTP client: one pooled keep-alive session, so connections (and TLS sessions) are reused,
+    a token bucket that keeps requests within Scryfall's rate limits, and Retry-After handling for 429s.
+    Every request has connect and read timeouts, and they are shortened to fit a deadline if one is given.
+    An optional circuit breaker stops the requests for a while when Scryfall is down.
     """
-    try:
-        cardname_match = requests.get(url=f'https://api.scryfall.com/cards/named?exact={cardname}',
-                                      headers=BotInfo.SCRYFALL_USER_AGENT_HEADER)
-        if cardname_match:
-            if cardname_match.json().get('content_warning'):  # Don't append the forbidden cards
-                image_url = ""
+    def __init__(self, base_url: str, headers: dict, requests_per_second: float, burst: float,
+                 pool_size: int, pool_count: int, max_retries: int, connect_timeout: float, read_timeout: float,
+                 breaker: CircuitBreaker = None):
+        """
+        Constructs the client.
+        :param base_url: Scryfall API URL that relative request paths are joined to.
+        :param headers: Headers sent with every request (User-Agent and Accept).
+        :param requests_per_second: Sustained request rate.
+        :param burst: Number of requests that may be sent back-to-back.
+        :param pool_size: Maximum number of kept-alive connections per host.
+        :param pool_count: Number of hosts whose connection pools are kept.
+        :param max_retries: Number of retries after a 429 Too Many Requests response.
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for the server between bytes of the response.
+        :param breaker: CircuitBreaker counting request errors (connection, timeout, SSL, broken responses)
+        and 5xx responses, None for no breaker.
+        """
+        self.base_url = base_url
+        self.breaker = breaker
+        self.max_retries = max_retries
+        self.timeout = (connect_timeout, read_timeout)
+        self.limiter = TokenBucket(requests_per_second, burst)
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_count, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, deadline: Deadline = None, **kwargs) -> requests.Response:
+        """
+        Sends a rate limited request. 429 responses are retried after the time Scryfall asks for.
+        Raises DeadlineExceeded if the deadline runs out before the request can be sent,
+        and CircuitOpen if the circuit breaker is open.
+        :param method: HTTP method.
+        :param url: A path relative to the API URL (e.g. '/cards/named') or a full URL.
+        :param deadline: Optional Deadline object that the request must finish within.
+        :param kwargs: Keyword arguments for requests.Session.request.
+        :return: The response.
+        """
+        if not url.startswith("http"):
+            url = self.base_url + url
+        timeout = kwargs.pop("timeout", self.timeout)
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+
+        attempt = 0
+        while True:
+            if deadline is None:
+                self.limiter.acquire()
+                timeout = (connect_timeout, read_timeout)
             else:
-                image_url = cardname_match.json()['image_uris']['normal']
+                if deadline.expired() or not self.limiter.acquire(timeout=deadline.remaining()):
+                    raise DeadlineExceeded(f"No time left for a Scryfall request to {url}.")
+                remaining = deadline.remaining()
+                timeout = (min(connect_timeout, remaining), min(read_timeout, remaining))
+
+            if self.breaker is not None and not self.breaker.allow():
+                raise CircuitOpen(f"Scryfall requests paused, no request to {url}.")
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as connection_e:  # Connection, timeout, SSL, broken response...
+                if self.breaker is not None:
+                    self.breaker.record_failure(connection_e)
+                raise
+            except BaseException:
+                if self.breaker is not None:
+                    self.breaker.release_probe()
+                raise
+            if self.breaker is not None:
+                if response.status_code >= 500:
+                    self.breaker.record_failure(f"HTTP {response.status_code} from {url}")
+                else:
+                    self.breaker.record_success()
+
+            if response.status_code != 429 or attempt >= self.max_retries:
+                return response
+
+            retry_after = self.retry_after_seconds(response)
+            logger.warning(f"Scryfall rate limit hit. Pausing Scryfall requests for {retry_after} seconds.")
+            self.limiter.pause(retry_after)
+            response.close()
+            attempt += 1
+
+    def get(self, url: str, deadline: Deadline = None, **kwargs) -> requests.Response:
+        """GET request, see request."""
+        return self.request("GET", url, deadline, **kwargs)
+
+    def post(self, url: str, deadline: Deadline = None, **kwargs) -> requests.Response:
+        """POST request, see request."""
+        return self.request("POST", url, deadline, **kwargs)
+
+    @staticmethod
+    def retry_after_seconds(response: requests.Response) -> float:
+        """
+        Reads the Retry-After header of a 429 response.
+        :param response: The 429 response.
+        :return: Seconds to wait, capped to a minute. One second if the header is missing or is not a number.
+        """
+        try:
+            return min(max(float(response.headers.get("Retry-After", 1)), 0.0), 60.0)
+        except ValueError:
+            return 1.0
+
+# Offline card index, consulted before the Scryfall API
+card_index = CardIndex.load(ScryfallSettings.CARD_INDEX_FILE)
+
+# Casefolded cardname -> image URL results of the Scryfall API, empty string for names that aren't cards
+image_cache = LookupCache(ScryfallSettings.CACHE_MAX_SIZE, ScryfallSettings.CACHE_TTL,
+                          ScryfallSettings.CACHE_NEGATIVE_TTL)
+
+# Scryfall API responses by casefolded cardname, kept over restarts
+response_cache = ResponseCache(ScryfallSettings.RESPONSE_CACHE_FILE, ScryfallSettings.RESPONSE_CACHE_MAX_AGE,
+                               ScryfallSettings.RESPONSE_CACHE_NEGATIVE_MAX_AGE)
+
+# All Scryfall requests go through this client
+client = ScryfallClient(ScryfallSettings.API_URL, BotInfo.SCRYFALL_USER_AGENT_HEADER,
+                        ScryfallSettings.REQUESTS_PER_SECOND, ScryfallSettings.REQUEST_BURST,
+                        ScryfallSettings.CONNECTION_POOL_SIZE, ScryfallSettings.CONNECTION_POOLS,
+                        ScryfallSettings.MAX_RETRIES, ScryfallSettings.CONNECT_TIMEOUT, ScryfallSettings.READ_TIMEOUT,
+                        CircuitBreaker("Scryfall", BreakerSettings.FAILURE_THRESHOLD, BreakerSettings.BASE_DELAY,
+                                       BreakerSettings.MAX_DELAY, BreakerSettings.JITTER))
+
+# Scryfall work skipped because a reply ran out of its latency budget, by kind of work
+degradations = Counter()
+
+
+def record_degradation(kind: str, reason: Exception):
+    """
+    Counts and logs Scryfall work that was skipped to keep a reply within its latency budget
+    or because Scryfall requests are paused.
+    :param kind: Kind of work that was skipped, e.g. 'image' or 'flavour'.
+    :param reason: The timeout, DeadlineExceeded or CircuitOpen exception.
+    """
+    degradations[kind] += 1
+    logger.warning(f"Scryfall {kind} skipped, the reply goes without it ({degradations[kind]} times so far). "
+                   f"Reason: {reason}")
+
+
+def swap_card_index(new_index: CardIndex):
+    """
+    Replaces the offline card index in use. Lookups in progress finish with the old index.
+    :param new_index: A fully loaded CardIndex object.
+    """
+    global card_index
+    card_index = new_index
+
+
+def get_card_images(cardnames: list, deadline: Deadline = None) -> dict:
+    """
+    Finds the image URLs that match the cardnames, from the offline card index first.
+    Misspelled names are matched to the closest indexed name if it is close enough.
+    The Scryfall API is only asked if the index isn't available or if the API fallback is on,
+    and then all the remaining cardnames are resolved together.
+    :param cardnames: Cardnames, e.g. the regex matches of a comment.
+    :param deadline: Optional Deadline object that the Scryfall requests must finish within.
+    :return: A cardname -> image URL dict. Empty string if no exact match is found.
+    """
+    images = {}
+    unresolved = []
+    for cardname in cardnames:
+        indexed_card = card_index.lookup(cardname)
+        if indexed_card is None and ScryfallSettings.FUZZY_MATCHING:
+            indexed_card = card_index.fuzzy_lookup(cardname, ScryfallSettings.FUZZY_MIN_CONFIDENCE)
+            if indexed_card is not None:
+                logger.info(f"Fuzzy matched '{cardname}' to '{indexed_card.name}'.")
+
+        if indexed_card is not None:
+            images[cardname] = indexed_card.reply_image()
         else:
-            image_url = ""
+            images[cardname] = ""
+            unresolved.append(cardname)
 
-    # Lazy Except because Scryfall isn't that important, just skip this if it doesn't work
-    except Exception as scryfall_e:
-        image_url = ""
-        logger.warning("Something went wrong with Scryfall. Ignoring Scryfall: " + str(scryfall_e))
+    if unresolved and (not card_index or ScryfallSettings.API_FALLBACK):
+        images.update(get_scryfall_images(unresolved, deadline))
+    return images
+
+
+def get_scryfall_images(cardnames: list, deadline: Deadline = None) -> dict:
+    """
+    Fetches the image URLs that match the cardnames with /cards/collection requests,
+    up to COLLECTION_BATCH_SIZE cardnames per request. Cached cardnames aren't requested again.
+    :param cardnames: Cardnames.
+    :param deadline: Optional Deadline object that the Scryfall requests must finish within.
+    :return: A cardname -> image URL dict. Empty string if no exact match is found or Scryfall can't be reached.
+    """
+    # Calls that differ only by case are the same card
+    keys = {cardname: CardIndex.name_key(cardname) for cardname in cardnames}
+    cached_images = image_cache.get_many_or_load(list(keys.values()),
+                                                 lambda missing: fetch_scryfall_collection(missing, deadline),
+                                                 deadline.remaining() if deadline else None)
+    return {cardname: cached_images.get(key, "") for cardname, key in keys.items()}
+
+
+def fetch_scryfall_collection(keys: list, deadline: Deadline = None) -> dict:
+    """
+    Fetches the image URLs of cardname keys, from the persistent response cache if the response is fresh,
+    otherwise from the /cards/collection endpoint. Stale responses are refreshed in the same batches,
+    and served as they are if the refresh fails.
+    :param keys: Casefolded cardnames.
+    :param deadline: Optional Deadline object that the Scryfall requests must finish within.
+    :return: A key -> image URL dict with an empty string for names that aren't cards (or have a content warning).
+    Keys of batches that failed are left out so that they aren't cached, unless a stale response was served.
+    """
+    images = {}
+    outdated_keys = []
+    stale = {}  # Key -> stale CachedResponse, served if its refresh fails
+    for key in keys:
+        cached = response_cache.get(key)
+        if cached and response_cache.is_fresh(cached):
+            images[key] = image_from_response(cached.status, cached.body)
+        else:
+            outdated_keys.append(key)
+            if cached:
+                stale[key] = cached
+
+    for start in range(0, len(outdated_keys), ScryfallSettings.COLLECTION_BATCH_SIZE):
+        batch = outdated_keys[start:start + ScryfallSettings.COLLECTION_BATCH_SIZE]
+        try:
+            collection = client.post('/cards/collection', deadline,
+                                     json={"identifiers": [{"name": key} for key in batch]})
+            collection.raise_for_status()
+
+            batch_bodies = dict.fromkeys(batch, "")  # Names not found are not cards
+            for card_data in collection.json()["data"]:
+                card = bulk_card_to_indexed(card_data)
+                if card is None:
+                    continue
+                # The card is found by its full name or by any of its face names
+                for key in {CardIndex.name_key(name) for name in [card.name] + card.name.split(" // ")}:
+                    if key in batch_bodies:
+                        batch_bodies[key] = json.dumps(card_data)
+
+            for key, body in batch_bodies.items():
+                status = 200 if body else 404
+                response_cache.store(key, status, body)
+                images[key] = image_from_response(status, body)
+
+        except (DeadlineExceeded, CircuitOpen, requests.Timeout) as deadline_e:
+            record_degradation("image", deadline_e)
+            images.update(stale_images(batch, stale))
+
+        # Lazy Except because Scryfall isn't that important, just skip this if it doesn't work
+        except Exception as scryfall_e:
+            logger.warning("Something went wrong with Scryfall. Ignoring Scryfall: " + str(scryfall_e))
+            images.update(stale_images(batch, stale))
+
+    return images
+
+
+def stale_images(batch: list, stale: dict) -> dict:
+    """
+    The image URLs of a failed batch's keys that have a stale cached response (stale-if-error).
+    :param batch: Casefolded cardnames of the failed batch.
+    :param stale: Key -> stale CachedResponse.
+    :return: A key -> image URL dict.
+    """
+    return {key: image_from_response(stale[key].status, stale[key].body) for key in batch if key in stale}
+
+
+def image_from_response(status: int, body: str) -> str:
+    """
+    Picks the image URL from a Scryfall card response.
+    :param status: HTTP status code of the response.
+    :param body: Response body.
+    :return: Image URL, empty string if the response is not a card or the card has a content warning.
+    """
+    if status != 200:
+        return ""
+    card = bulk_card_to_indexed(json.loads(body))
+    return card.reply_image() if card else ""  # Don't append the forbidden cards
+
+
+def fetch_scryfall_flavours(page: int) -> tuple:
+    """
+    Fetches a page of cards with flavour text from the Scryfall search API.
+    :param page: Search result page number, starting from 1.
+    :return: A tuple of a list of the flavour texts on the page and the total number of cards with flavour text.
+    """
+    search_page = client.get('/cards/search', params={"q": "has:flavor", "page": page})
+    search_page.raise_for_status()
+    search_result = search_page.json()
 
-    return image_url
+    flavours = []
+    for card_data in search_result["data"]:
+        card = bulk_card_to_indexed(card_data)
+        if card and card.flavour and not card.content_warning:
+            flavours.append(card.flavour)
+    return flavours, search_result["total_cards"]
 
 
-def get_scryfall_flavour() -> str:
+def get_scryfall_flavour(deadline: Deadline = None) -> str:
     """
     Fetches a random flavour text from Scryfall.
-    :return: A random flavour text, a standard funny error text string if Scryfall can't be reached.
+    :param deadline: Optional Deadline object that the Scryfall request must finish within.
+    :return: A random flavour text, a standard funny error text string if Scryfall can't be reached,
+    an empty string if the deadline ran out.
     """
     try:
-        random_flavour_card = requests.get(url='https://api.scryfall.com/cards/random?q=has%3Aflavor',
-                                           headers=BotInfo.SCRYFALL_USER_AGENT_HEADER)
+        random_flavour_card = client.get('/cards/random', deadline, params={"q": "has:flavor"})
         random_flavour = random_flavour_card.json()['flavor_text']
+    except (DeadlineExceeded, CircuitOpen, requests.Timeout) as deadline_e:
+        record_degradation("flavour", deadline_e)
+        random_flavour = ""
     # Lazy except because Scryfall isn't that important, just skip it if it doesn't work
     except Exception as scryfall_e:
         logger.warning("Something went wrong with Scryfall. Ignoring Scryfall: " + str(scryfall_e))
@@ -0,0 +1,94 @@
+"""Special card registry: normalized card names -> special reply handlers."""
+
+import unicodedata
+
+
+def normalize_callname(name: str) -> str:
+    """
+    Normalizes a called card name for the special card lookups: compatibility decomposition (NFKD),
+    accents stripped, casefolded. E.g. "Tōbō Dibi" -> "tobo dibi".
+    :param name: Card name as written in the call.
+    :return: The normalized name.
+    """
+    decomposed = unicodedata.normalize("NFKD", name.strip())
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+class SpecialCard:
+    """
+    Holds a special card's reply handler.
+    """
+    __slots__ = ("name", "handler", "collectible", "available", "sets_flavour")
+
+    def __init__(self, name: str, handler, collectible: bool, available, sets_flavour: bool):
+        """
+        Constructs the special card object.
+        :param name: Proper name of the card.
+        :param handler: A function that takes a BotReplyText and the called name and returns the BotReplyText.
+        :param collectible: True if a call gets the collectible reply instead of a regular one.
+        :param available: A function that returns False while the special reply is on cooldown.
+        :param sets_flavour: True if the handler sets the reply's flavour text, so no random flavour is needed.
+        """
+        self.name = name
+        self.handler = handler
+        self.collectible = collectible
+        self.available = available
+        self.sets_flavour = sets_flavour
+
+    def __str__(self):
+        return f"Attributes: {dict((slot, getattr(self, slot)) for slot in self.__slots__)}"
+
+
+class SpecialCardIndex:
+    """
+    A normalized spelling -> SpecialCard lookup table. Special cards are registered once at import time,
+    after which every called name is classified with a single dict lookup.
+    """
+    def __init__(self):
+        self.__cards = {}  # Normalized spelling -> SpecialCard
+        self.collectibles = []  # Collectible SpecialCards in priority order
+
+    def __len__(self):
+        return len(self.__cards)
+
+    def register(self, name: str, spellings, handler, collectible: bool = False, available=None,
+                 sets_flavour: bool = False) -> SpecialCard:
+        """
+        Adds a special card. Raises ValueError if a spelling already belongs to another special card.
+        :param name: Proper name of the card.
+        :param spellings: The names that call the card, normalized when registered.
+        :param handler: A function that takes a BotReplyText and the called name and returns the BotReplyText.
+        :param collectible: True if a call gets the collectible reply instead of a regular one.
+        Collectibles registered first take priority.
+        :param available: A function that returns False while the special reply is on cooldown, None for no cooldown.
+        :param sets_flavour: True if the handler sets the reply's flavour text.
+        :return: The SpecialCard object.
+        """
+        special_card = SpecialCard(name, handler, collectible, available or (lambda: True), sets_flavour)
+        for spelling in set(normalize_callname(spelling) for spelling in spellings):
+            if spelling in self.__cards:
+                raise ValueError(f"'{spelling}' is already registered for {self.__cards[spelling].name}.")
+            self.__cards[spelling] = special_card
+        if collectible:
+            self.collectibles.append(special_card)
+        return special_card
+
+    def find(self, cardname: str) -> "SpecialCard | None":
+        """
+        Classifies a called name.
+        :param cardname: Card name as written in the call.
+        :return: The SpecialCard object, None if the name isn't special.
+        """
+        return self.__cards.get(normalize_callname(cardname))
+
+    def find_collectible(self, called_specials: list, available_only: bool = False) -> "SpecialCard | None":
+        """
+        Finds the collectible with the highest priority among the called special cards.
+        :param called_specials: The find() results of the called names.
+        :param available_only: True to skip the collectibles on cooldown.
+        :return: The collectible's SpecialCard object, None if no collectible was called.
+        """
+        for special_card in self.collectibles:
+            if special_card in called_specials and (not available_only or special_card.available()):
+                return special_card
+        return None
@@ -0,0 +1,58 @@
+"""Persistent SQLite store of the newest processed item of each stream."""
+
+import sqlite3
+import threading
+
+from func.base_logger import logger
+
+
+class CheckpointStore:
+    """
+    A (stream name, item type) -> (fullname, created_utc) store in an SQLite database that survives restarts.
+    A stream name is a subreddit name, or with combined streams a multireddit name (sub1+sub2+...).
+    """
+    def __init__(self, db_file: str):
+        """
+        Opens (and creates if needed) the checkpoint database.
+        :param db_file: Path to the SQLite database file.
+        """
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(db_file, check_same_thread=False)
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS stream_checkpoints ("
+                "stream TEXT NOT NULL, item_type TEXT NOT NULL, fullname TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (stream, item_type))"
+            )
+        logger.info(f"Stream checkpoint store opened with {len(self)} checkpoints.")
+
+    def __len__(self):
+        with self.__lock:
+            return self.__connection.execute("SELECT COUNT(*) FROM stream_checkpoints").fetchone()[0]
+
+    def load(self, stream: str, item_type: str) -> "tuple | None":
+        """
+        Finds a stream's checkpoint.
+        :param stream: Stream name.
+        :param item_type: "comment" or "submission".
+        :return: A (fullname, created_utc) tuple of the newest processed item, None if there is no checkpoint.
+        """
+        with self.__lock:
+            row = self.__connection.execute(
+                "SELECT fullname, created FROM stream_checkpoints WHERE stream = ? AND item_type = ?",
+                (stream, item_type)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def save(self, stream: str, item_type: str, fullname: str, created: float):
+        """
+        Stores (or replaces) a stream's checkpoint.
+        :param stream: Stream name.
+        :param item_type: "comment" or "submission".
+        :param fullname: Fullname of the newest processed item.
+        :param created: Unix time of the item's creation.
+        """
+        with self.__lock, self.__connection:
+            self.__connection.execute(
+                "INSERT OR REPLACE INTO stream_checkpoints VALUES (?, ?, ?, ?)", (stream, item_type, fullname, created)
+            )
@@ -2,13 +2,21 @@
 
 import random
 import re
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from func.base_logger import logger
-from data.configs import MiscSettings, negate_timer
+from func.timer import Deadline
+from data.configs import MiscSettings, ScryfallSettings, negate_timer, dreadmaw_timer, stormcrow_timer
 from data.collectibles import ColossalDreadmaw, StormCrow
 from data.rastamon_cards import Rastamon, RastamonCard
 import data.replies as replies
 import func.scryfall_functions as sf
+from func.flavour_pool import flavour_pool
+from func.special_cards import SpecialCardIndex
+
+# Bounded worker pool for the Scryfall lookups of replies
+lookup_executor = ThreadPoolExecutor(max_workers=ScryfallSettings.REPLY_LOOKUP_WORKERS,
+                                     thread_name_prefix="ReplyLookup")
 
 
 class BotReplyText:
@@ -117,6 +125,80 @@ def set_rastamon(reply_text: BotReplyText, rastamon_card: RastamonCard) -> BotRe
     return reply_text
 
 
+def set_negate_once_a_day(reply_text: BotReplyText, cardname: str) -> BotReplyText:
+    """
+    Sets the special Negate reply and puts it on cooldown until tomorrow.
+    """
+    negate_timer.new_expiry_time(MiscSettings.SPECIAL_TIMER)  # Set new expiry in a day from now
+    logger.info("Negate flavour used up for today. See you tomorrow!")
+    return set_negate(reply_text, cardname)
+
+
+def rastamon_handler(rastamon_card: RastamonCard):
+    """
+    :param rastamon_card: A RastamonCard object.
+    :return: A special card handler that sets the Rastamonliveup reply of the card.
+    """
+    def handler(reply_text: BotReplyText, _cardname: str) -> BotReplyText:
+        """Special card handler."""
+        logger.info("Tell the children the truth.")
+        return set_rastamon(reply_text, rastamon_card)
+    return handler
+
+
+# Special cards by normalized name. New special cards only need a handler and a line here.
+# Collectibles bypass the regular reply, Dreadmaw before Storm Crow. The rest override a single card link.
+special_cards = SpecialCardIndex()
+special_cards.register(ColossalDreadmaw.NAME, [ColossalDreadmaw.NAME], set_dreadmaw_waiting, collectible=True,
+                       available=dreadmaw_timer.single_timer)
+special_cards.register(StormCrow.NAME, [StormCrow.NAME], set_stormcrow_waiting, collectible=True,
+                       available=stormcrow_timer.single_timer)
+special_cards.register("Revel in Riches", replies.Spellings.REVEL_IN_RICHES, set_revel)
+special_cards.register("Negate", replies.Spellings.NEGATE, set_negate_once_a_day, available=negate_timer.single_timer,
+                       sets_flavour=True)
+for rastamon in Rastamon.CARDS:
+    special_cards.register(rastamon.proper_name, rastamon.spellings, rastamon_handler(rastamon), sets_flavour=True)
+
+
+def get_random_flavour(deadline: Deadline) -> str:
+    """
+    A random flavour text from the prefetched pool. Scryfall is only asked if the pool is empty.
+    :param deadline: Deadline object that the Scryfall request must finish within.
+    :return: A flavour text, empty string if there's no time left for it.
+    """
+    return flavour_pool.pop() or sf.get_scryfall_flavour(deadline)
+
+
+def resolve_reply_lookups(regex_matches: list, deadline: Deadline, needs_flavour: bool) -> tuple:
+    """
+    Resolves the card images of a reply and, in concurrent mode, starts the random flavour text lookup.
+    In concurrent mode every batch of card images and the flavour text are looked up in parallel,
+    so the reply waits for the slowest lookup instead of the sum of all lookups.
+    :param regex_matches: The regex matches from a comment or a submission.
+    :param deadline: Deadline object that the Scryfall requests must finish within.
+    :param needs_flavour: True if the reply gets a random flavour text.
+    :return: A tuple of a cardname -> image URL dict and a Future of the flavour text
+    (None if the flavour is not looked up in advance).
+    """
+    if not ScryfallSettings.CONCURRENT_LOOKUPS:
+        return sf.get_card_images(regex_matches, deadline), None
+
+    flavour_future: "Future | None" = None
+    if needs_flavour:
+        flavour_future = lookup_executor.submit(get_random_flavour, deadline)
+
+    batch_size = ScryfallSettings.COLLECTION_BATCH_SIZE
+    image_futures = [
+        lookup_executor.submit(sf.get_card_images, regex_matches[start:start + batch_size], deadline)
+        for start in range(0, len(regex_matches), batch_size)
+    ]
+
+    card_images = {}
+    for image_future in image_futures:  # In call order, so the result doesn't depend on which batch finished first
+        card_images.update(image_future.result())
+    return card_images, flavour_future
+
+
 def generate_reply_text(regex_matches: list, links: list) -> str:
     """
     Generates the text that the bot will attempt to reply with.
@@ -125,20 +207,18 @@ def generate_reply_text(regex_matches: list, links: list) -> str:
     :return: Fully formatted reply text.
     """
     reply = BotReplyText()
+    scryfall_deadline = Deadline(ScryfallSettings.REPLY_LATENCY_BUDGET)  # All Scryfall work of this reply
 
-    # Some overrides for Colossal Dreadmaw
-    if ColossalDreadmaw.NAME.casefold() in [item.casefold() for item in regex_matches]:
-
-        # Bypass everything, print this particular response if Dreadmaw is mentioned even once
-        choose_special = -1
-        reply = set_dreadmaw_waiting(reply, ColossalDreadmaw.NAME)
+    # Every called name is classified once
+    called_specials = [special_cards.find(cardname) for cardname in regex_matches]
 
-    # Some overrides for Storm Crow
-    elif StormCrow.NAME.casefold() in [item.casefold() for item in regex_matches]:
+    # Some overrides for the collectibles (Colossal Dreadmaw, Storm Crow)
+    collectible = special_cards.find_collectible(called_specials)
+    if collectible:
 
-        # Bypass everything, print this particular response if Storm Crow is mentioned even once
+        # Bypass everything, print this particular response if a collectible is mentioned even once
         choose_special = -1
-        reply = set_stormcrow_waiting(reply, StormCrow.NAME)
+        reply = collectible.handler(reply, collectible.name)
 
     # Determines whether a regular reply is delivered or if one of the special modes is chosen instead
     else:
@@ -158,25 +238,21 @@ def generate_reply_text(regex_matches: list, links: list) -> str:
     # If a reply with a header chosen add links and all
     if choose_special >= 1:
 
-        # For each regex match loop de loop
-        for cardname in regex_matches:
-            scryfall_image = sf.get_scryfall_image(cardname)
-            rastamon_card = Rastamon.find_card(cardname)
+        # Only single-card replies get a random flavour text, unless a special card sets its own
+        single_special = called_specials[0] if len(regex_matches) == 1 else None
+        needs_flavour = len(regex_matches) == 1 and not (single_special and single_special.sets_flavour
+                                                         and single_special.available())
 
-            # Some overrides for Revel in Riches
-            if cardname.casefold() == "revel in riches":
-                reply = set_revel(reply, cardname)
+        # Resolve all card images at once (and the flavour text in parallel in concurrent mode)
+        card_images, flavour_future = resolve_reply_lookups(regex_matches, scryfall_deadline, needs_flavour)
 
-            # Some overrides for Negate copypasta
-            elif cardname.casefold() in replies.Spellings.NEGATE and negate_timer.single_timer():
-                negate_timer.new_expiry_time(MiscSettings.SPECIAL_TIMER)  # Set new expiry in a day from now
-                reply = set_negate(reply, cardname)
-                logger.info("Negate flavour used up for today. See you tomorrow!")
+        # For each regex match loop de loop
+        for cardname, special_card in zip(regex_matches, called_specials):
+            scryfall_image = card_images[cardname]
 
-            # Some overrides for Rastamonliveup cards
-            elif rastamon_card.proper_name:
-                reply = set_rastamon(reply, rastamon_card)
-                logger.info("Tell the children the truth.")
+            # Some overrides for special cards (Revel in Riches, Negate copypasta, Rastamonliveup cards)
+            if special_card and special_card.available():
+                reply = special_card.handler(reply, cardname)
 
             # If a real cardname matches the regex make a Scryfall link
             elif scryfall_image:
@@ -189,8 +265,11 @@ def generate_reply_text(regex_matches: list, links: list) -> str:
 
         # If there is only a single card to fetch get a random flavour text from Scryfall
         # Also check if a flavour already exists from an override
+        # The reply goes without flavour if there's no time left for it
         if len(regex_matches) == 1 and not reply.flavour:
-            reply.flavour = f'''_{sf.get_scryfall_flavour()}_\n\n'''
+            random_flavour = flavour_future.result() if flavour_future else get_random_flavour(scryfall_deadline)
+            if random_flavour:
+                reply.flavour = f'''_{random_flavour}_\n\n'''
 
     # Add the standard footer text
     reply.footer = "*********\n\nSubmit your content at: r/MTGCardBelcher"
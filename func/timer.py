@@ -1,6 +1,7 @@
-"""Refresh timer function class."""
+"""Refresh timer and deadline function classes."""
 
 import datetime as dt
+import time
 
 
 class RefreshTimer:
@@ -22,6 +23,13 @@ class RefreshTimer:
         """
         self.__expiry_time = dt.datetime.now() + dt.timedelta(seconds=new_time_from_now)
 
+    def seconds_left(self) -> float:
+        """
+        Time until expiry.
+        :return: Seconds until the expiry time, 0 if it has passed.
+        """
+        return max(0.0, (self.__expiry_time - dt.datetime.now()).total_seconds())
+
     def single_timer(self) -> bool:
         """
         Single-use timer.
@@ -42,3 +50,29 @@ class RefreshTimer:
             return True
         else:
             return False
+
+
+class Deadline:
+    """
+    Creates a deadline object: a latency budget that runs out a fixed number of seconds after it's created.
+    """
+
+    def __init__(self, budget: float):
+        self.__expiry_time: float = time.monotonic() + budget
+
+    def __str__(self):
+        return f"Attributes: {self.__dict__}"
+
+    def remaining(self) -> float:
+        """
+        Remaining budget.
+        :return: Seconds until the deadline, zero if the deadline has passed.
+        """
+        return max(0.0, self.__expiry_time - time.monotonic())
+
+    def expired(self) -> bool:
+        """
+        Deadline check.
+        :return: True if the deadline has passed, False if not.
+        """
+        return time.monotonic() >= self.__expiry_time
@@ -0,0 +1 @@
+"""Tests that run against local stand-ins instead of Reddit and Scryfall. Run with: python -m pytest tests"""
@@ -0,0 +1,73 @@
+"""Circuit breaker states: open after failures in a row, one half-open probe, longer cooldowns after failed probes."""
+
+import time
+
+import pytest
+
+from data.exceptions import CircuitOpen
+from func.circuit_breaker import CircuitBreaker
+
+
+def failing():
+    raise ConnectionError("Endpoint down")
+
+
+def test_opens_after_failures_in_a_row_and_refuses_calls():
+    breaker = CircuitBreaker("test", 3, 60, 600, 0, (ConnectionError,))
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    calls = []
+    with pytest.raises(CircuitOpen):
+        breaker.call(calls.append, "not called")
+    assert calls == []
+    assert breaker.seconds_until_retry() == pytest.approx(60, abs=1)
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", 2, 60, 600, 0, (ConnectionError,))
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    assert breaker.call(lambda: "ok") == "ok"
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_successful_probe_closes_the_circuit():
+    breaker = CircuitBreaker("test", 1, 0.01, 600, 0, (ConnectionError,))
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    time.sleep(0.02)
+
+    assert breaker.allow() and breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # Only one probe at a time
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_failed_probe_opens_the_circuit_for_longer():
+    breaker = CircuitBreaker("test", 1, 0.05, 600, 0, (ConnectionError,))
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    time.sleep(0.06)
+
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.seconds_until_retry() > 0.05  # Doubled
+
+
+def test_other_errors_give_the_probe_back():
+    breaker = CircuitBreaker("test", 1, 0.01, 600, 0, (ConnectionError,))
+    with pytest.raises(ConnectionError):
+        breaker.call(failing)
+    time.sleep(0.02)
+
+    with pytest.raises(ValueError):
+        breaker.call(int, "not a number")  # Not a failure of the endpoint
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.trips == 1
+    assert breaker.allow()  # The next call probes again right away
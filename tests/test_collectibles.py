@@ -0,0 +1,106 @@
+"""Collectible counters: loading the counts, issuing collector numbers and writing them back to the counter comments."""
+
+import prawcore
+import pytest
+
+from data.collectibles import CollectibleCounters, StormCrow
+
+NAME = StormCrow.NAME
+COUNT_COMMENT = StormCrow.COUNT_COMMENT
+
+
+class StandInComment:
+    """A counter comment stand-in, its edits change the body. Fails edits while failing is set."""
+    def __init__(self, body: str):
+        self.body = body
+        self.edits = []
+        self.failing = False
+
+    def edit(self, body: str):
+        if self.failing:
+            raise prawcore.PrawcoreException("Reddit is down")
+        self.edits.append(body)
+        self.body = body
+
+
+class StandInReddit:
+    """A praw.Reddit stand-in holding the counter comments by id."""
+    def __init__(self, comments: dict):
+        self.comments = comments
+
+    def comment(self, comment_id: str):
+        return self.comments[comment_id]
+
+
+@pytest.fixture
+def counter_comment():
+    return StandInComment("41")
+
+
+@pytest.fixture
+def open_counters(tmp_path, counter_comment):
+    """Opens counters on the same database file, as a restarted bot would. Stops every background thread after."""
+    opened = []
+
+    def open_counters():
+        counters = CollectibleCounters(StandInReddit({COUNT_COMMENT: counter_comment}),
+                                       str(tmp_path / "collectible_counts.sqlite3"), 60)
+        counters.load(NAME, COUNT_COMMENT)
+        opened.append(counters)
+        return counters
+
+    yield open_counters
+    for counters in opened:
+        counters.stop()
+
+
+def test_numbers_continue_from_the_counter_comment(open_counters, counter_comment):
+    counters = open_counters()
+
+    assert [counters.issue(NAME) for _ in range(3)] == [41, 42, 43]
+    assert counter_comment.edits == []  # Written back only when flushed
+
+
+def test_flush_edits_changed_counts_once(open_counters, counter_comment):
+    counters = open_counters()
+    counters.flush()
+    assert counter_comment.edits == []
+
+    for _ in range(3):
+        counters.issue(NAME)
+    counters.flush()
+    counters.flush()
+    assert counter_comment.edits == ["44"]
+
+
+def test_failed_edit_is_tried_again(open_counters, counter_comment):
+    counters = open_counters()
+    counters.issue(NAME)
+    counter_comment.failing = True
+    counters.flush()
+    assert counter_comment.edits == []
+
+    counter_comment.failing = False
+    counters.flush()
+    assert counter_comment.edits == ["42"]
+
+
+def test_restart_does_not_issue_a_number_again(open_counters, counter_comment):
+    counters = open_counters()
+    counters.issue(NAME)
+    counters.issue(NAME)
+    # Stopped before the counter comment caught up
+    counter_comment.failing = True
+    counters.stop()
+    assert counter_comment.body == "41"
+
+    assert open_counters().issue(NAME) == 43
+
+
+def test_stop_writes_the_counts(open_counters, counter_comment):
+    counters = open_counters()
+    counters.start()
+    counters.issue(NAME)
+    counters.stop()
+
+    assert counter_comment.edits == ["42"]
@@ -0,0 +1,49 @@
+"""Flair updates that fail for good hand the submission back for a re-check."""
+
+import threading
+import types
+
+import prawcore
+
+from func.flair_queue import FlairUpdateQueue
+
+
+def run_update(apply) -> list:
+    """
+    Applies one flair update with a single worker.
+    :param apply: The flair update function.
+    :return: The submissions handed to the failure callback.
+    """
+    failed = []
+    finished = threading.Event()
+
+    def apply_once(reddit, submission, flair_id):
+        apply(reddit, submission, flair_id)
+        finished.set()  # Not reached if the update fails
+
+    flair_queue = FlairUpdateQueue(apply_once, 1, 1000, 10, 0, 0)
+    flair_queue.start(lambda: None)
+    flair_queue.submit(types.SimpleNamespace(id="abc"), "approved",
+                       lambda submission: failed.append(submission.id) or finished.set())
+    assert finished.wait(5)
+    return failed
+
+
+def test_deleted_submission_is_handed_to_the_failure_callback():
+    def apply(_reddit, _submission, _flair_id):
+        raise prawcore.NotFound(types.SimpleNamespace(status_code=404))
+
+    assert run_update(apply) == ["abc"]
+
+
+def test_unexpected_error_is_handed_to_the_failure_callback():
+    def apply(_reddit, _submission, _flair_id):
+        raise ValueError("Broken submission")
+
+    assert run_update(apply) == ["abc"]
+
+
+def test_applied_update_is_not_a_failure():
+    applied = []
+    assert run_update(lambda _reddit, submission, flair_id: applied.append((submission.id, flair_id))) == []
+    assert applied == [("abc", "approved")]
@@ -0,0 +1,47 @@
+"""Misspelled card names matched by the trigram index, one typo of each kind."""
+
+import pytest
+
+from func.fuzzy_match import FuzzyMatcher, edit_distance
+
+MIN_CONFIDENCE = 0.85
+NAMES = ["black lotus", "storm crow", "lotus petal", "stone rain", "lightning bolt", "llanowar elves",
+         "black knight", "storm seeker"] + [f"filler card {number}" for number in range(500)]
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return FuzzyMatcher(NAMES)
+
+
+@pytest.mark.parametrize("query, name", [
+    ("blakc lotus", "black lotus"),  # Transposition, one edit that changes four trigrams
+    ("sotrm crow", "storm crow"),
+    ("lightningg bolt", "lightning bolt"),  # Insertion
+    ("llanowar elvs", "llanowar elves"),  # Deletion
+    ("stone raim", "stone rain"),  # Substitution
+])
+def test_one_typo_matches_the_intended_name(matcher, query, name):
+    match = matcher.match(query, MIN_CONFIDENCE)
+    assert match is not None and match[0] == name
+    assert match[1] == pytest.approx(1 - 1 / max(len(query), len(name)))
+
+
+def test_exact_name_matches_with_full_confidence(matcher):
+    assert matcher.match("storm crow", MIN_CONFIDENCE) == ("storm crow", 1)
+
+
+def test_too_distant_names_do_not_match(matcher):
+    assert matcher.match("storm crowbar bolt", MIN_CONFIDENCE) is None
+    assert matcher.match("zzzzzz", MIN_CONFIDENCE) is None
+    assert matcher.match("", MIN_CONFIDENCE) is None
+
+
+def test_closest_of_the_names_sharing_trigrams_wins(matcher):
+    assert matcher.match("black knigt", MIN_CONFIDENCE)[0] == "black knight"
+
+
+def test_edit_distance_counts_a_swap_as_one_edit():
+    assert edit_distance("blakc", "black", 2) == 1
+    assert edit_distance("storm", "stone", 5) == 2
+    assert edit_distance("storm crow", "lightning bolt", 2) == 3  # Capped at max_distance + 1
@@ -0,0 +1,95 @@
+"""Image pool updates and incremental refreshes, against a stand-in image submission subreddit."""
+
+import time
+import types
+
+import func.reddit_actions as r
+from data.configs import IMGSubmissionParams, Subreddits
+
+SOURCE = "jokeimages"
+
+
+def approved_submission(submission_id: str):
+    """A praw submission stand-in with the approved flair and an image URL."""
+    return types.SimpleNamespace(
+        id=submission_id, fullname=f"t3_{submission_id}", link_flair_template_id=IMGSubmissionParams.APPROVED_FLAIR_ID,
+        created_utc=time.time(), score=50, upvote_ratio=0.9, approved=True, permalink=f"/r/{SOURCE}/{submission_id}",
+        url=f"https://i.redd.it/{submission_id}.png", subreddit=types.SimpleNamespace(display_name=SOURCE)
+    )
+
+
+class StandInReddit:
+    """Lists the submissions newest first. Nothing is listed before a removed submission, like on Reddit."""
+    def __init__(self, submissions: list, removed: set):
+        self.submissions = submissions
+        self.removed = removed
+        self.listings = []  # Limits of the listing requests
+
+    def subreddit(self, _name: str):
+        return types.SimpleNamespace(new=self.new)
+
+    def new(self, limit: int, params: dict = None):
+        self.listings.append(limit)
+        before = (params or {}).get("before")
+        if before in self.removed:
+            return iter([])
+        listed = [submission for submission in self.submissions if submission.fullname not in self.removed]
+        if before:
+            listed = listed[:[submission.fullname for submission in listed].index(before)]
+        return iter(listed[:limit])
+
+    @staticmethod
+    def info(fullnames: list):
+        return iter([])
+
+
+def scanned_pool(reddit: StandInReddit) -> r.ImagePool:
+    """An image pool after its first (full) refresh."""
+    image_pool = r.ImagePool([SOURCE])
+    r.refresh_image_pool(reddit, image_pool)
+    reddit.listings.clear()
+    return image_pool
+
+
+def test_pool_changes_leave_handed_out_lists_intact():
+    image_pool = r.ImagePool([SOURCE])
+    image_pool.update("a", "https://i.redd.it/a.png", True)
+    handed_out = image_pool.urls
+
+    image_pool.update("a", "https://i.redd.it/a.png", False)
+    image_pool.update("b", "https://i.redd.it/b.png", True)
+    image_pool.replace({}, {})
+
+    assert handed_out == [r.ImagePool.DEFAULT_IMAGE, "https://i.redd.it/a.png"]
+    assert image_pool.urls == [r.ImagePool.DEFAULT_IMAGE]
+
+
+def test_incremental_refresh_adds_new_submissions():
+    reddit = StandInReddit([approved_submission("b")], set())
+    image_pool = scanned_pool(reddit)
+    reddit.submissions.insert(0, approved_submission("c"))
+
+    r.refresh_image_pool(reddit, image_pool)
+    assert reddit.listings == [Subreddits.INCREMENTAL_IMAGE_SUBMISSIONS]
+    assert image_pool.urls[-1] == "https://i.redd.it/c.png"
+    assert image_pool.newest_fullnames[SOURCE] == "t3_c"
+
+
+def test_removed_newest_submission_falls_back_to_a_full_rescan():
+    reddit = StandInReddit([approved_submission("b")], set())
+    image_pool = scanned_pool(reddit)
+    reddit.removed.add("t3_b")
+    reddit.submissions.insert(0, approved_submission("c"))
+
+    r.refresh_image_pool(reddit, image_pool)
+    assert reddit.listings == [Subreddits.INCREMENTAL_IMAGE_SUBMISSIONS, 1, Subreddits.MAX_IMAGE_SUBMISSIONS]
+    assert image_pool.urls == [r.ImagePool.DEFAULT_IMAGE, "https://i.redd.it/c.png"]
+    assert image_pool.newest_fullnames[SOURCE] == "t3_c"
+
+
+def test_quiet_subreddit_is_not_rescanned():
+    reddit = StandInReddit([approved_submission("b")], set())
+    image_pool = scanned_pool(reddit)
+
+    r.refresh_image_pool(reddit, image_pool)
+    assert reddit.listings == [Subreddits.INCREMENTAL_IMAGE_SUBMISSIONS, 1]
@@ -0,0 +1,53 @@
+"""The replied item index across restarts: reload from the log file, expiry and a log cut short by a crash."""
+
+import time
+
+from func.replied_index import BloomFilter, RepliedIndex
+
+
+def new_index(log_file, max_age: float = 3600) -> RepliedIndex:
+    return RepliedIndex(str(log_file), max_age, 1000, 0.001, 3600)
+
+
+def test_replies_are_remembered_across_restarts(tmp_path):
+    log_file = tmp_path / "replied_items.log"
+    index = new_index(log_file)
+    index.add("t1_a")
+    index.add("t3_b")
+
+    restarted = new_index(log_file)
+    restarted.load()
+    assert "t1_a" in restarted and "t3_b" in restarted
+    assert "t1_c" not in restarted
+    assert len(restarted) == 2
+
+
+def test_expired_entries_are_dropped_from_memory_and_the_log(tmp_path):
+    log_file = tmp_path / "replied_items.log"
+    log_file.write_text(f"t1_old\t{time.time() - 7200:.0f}\nt1_new\t{time.time():.0f}\n", encoding="utf-8")
+
+    index = new_index(log_file)
+    index.load()
+    assert "t1_old" not in index and "t1_new" in index
+    assert log_file.read_text(encoding="utf-8").startswith("t1_new\t")
+    assert len(log_file.read_text(encoding="utf-8").splitlines()) == 1
+
+
+def test_line_cut_short_by_a_crash_is_skipped(tmp_path):
+    log_file = tmp_path / "replied_items.log"
+    log_file.write_text(f"t1_a\t{time.time():.0f}\nt1_b\t", encoding="utf-8")
+
+    index = new_index(log_file)
+    index.load()
+    assert "t1_a" in index and "t1_b" not in index
+
+
+def test_bloom_filter_never_misses_an_added_string():
+    bloom = BloomFilter(1000, 0.01)
+    added = [f"t1_{number}" for number in range(1000)]
+    for fullname in added:
+        bloom.add(fullname)
+
+    assert all(fullname in bloom for fullname in added)
+    false_positives = sum(f"t3_{number}" in bloom for number in range(10000))
+    assert false_positives < 300  # Sized for 1%
@@ -0,0 +1,107 @@
+"""Reply bursts: merging an author's calls, shedding over the caps or when late, and the staged pipeline."""
+
+import threading
+import time
+import types
+
+from func.reply_pipeline import ReplyJob, ReplyPipeline, ReplyScheduler
+
+
+def call(fullname: str, author: str = "caller", thread: str = "t3_thread", matches: tuple = ("Storm Crow",),
+         age: float = 0, callname: str = None) -> ReplyJob:
+    """A reply job of a call comment posted age seconds ago."""
+    comment = types.SimpleNamespace(fullname=fullname, created_utc=time.time() - age, link_id=thread,
+                                    author=types.SimpleNamespace(name=author), permalink=f"/r/test/{fullname}")
+    return ReplyJob("comment", comment, list(matches), callname, None, [])
+
+
+def new_scheduler(shed: list, max_size: int = 10, max_per_thread: int = 10, max_per_author: int = 2,
+                  max_age: float = 600) -> ReplyScheduler:
+    return ReplyScheduler(max_size, max_per_thread, max_per_author, max_age, lambda: 1.0, shed.append)
+
+
+def test_calls_of_an_author_in_a_thread_are_merged():
+    shed = []
+    scheduler = new_scheduler(shed)
+    scheduler.put(call("t1_a", matches=("Storm Crow", "Fire // Ice"), age=5), 0)
+    scheduler.put(call("t1_b", matches=("storm crow", "Lightning Bolt")), 0)
+
+    assert scheduler.qsize() == 1
+    job = scheduler.get()
+    assert job.item.fullname == "t1_b"
+    assert job.regex_matches == ["Fire // Ice", "storm crow", "Lightning Bolt"]
+    assert job.merged == [("comment", "t1_a")]
+    assert scheduler.counts_snapshot() == {"merged": 1}
+    assert shed == []
+
+
+def test_special_calls_are_not_merged():
+    scheduler = new_scheduler([])
+    scheduler.put(call("t1_a"), 0)
+    scheduler.put(call("t1_b", matches=("Colossal Dreadmaw",), callname="Colossal Dreadmaw"), 0)
+
+    assert scheduler.qsize() == 2
+
+
+def test_calls_over_the_author_cap_are_shed():
+    shed = []
+    scheduler = new_scheduler(shed, max_per_author=2)
+    for number in range(3):
+        scheduler.put(call(f"t1_{number}", thread=f"t3_{number}"), 0)
+
+    assert scheduler.qsize() == 2
+    assert [job.item.fullname for job in shed] == ["t1_2"]
+    assert scheduler.counts_snapshot() == {"shed_author_cap": 1}
+
+
+def test_calls_over_the_thread_cap_are_shed():
+    shed = []
+    scheduler = new_scheduler(shed, max_per_thread=2)
+    for number in range(3):
+        scheduler.put(call(f"t1_{number}", author=f"caller{number}"), 0)
+
+    assert [job.item.fullname for job in shed] == ["t1_2"]
+    assert scheduler.counts_snapshot() == {"shed_thread_cap": 1}
+
+
+def test_calls_that_would_be_answered_too_late_are_shed():
+    shed = []
+    scheduler = new_scheduler(shed, max_age=600)
+
+    assert not scheduler.put(call("t1_a", age=599.5), 0)  # The expected wait is 1 s
+    assert [job.item.fullname for job in shed] == ["t1_a"]
+    assert scheduler.counts_snapshot() == {"shed_stale": 1}
+
+
+def test_full_queue_sheds_the_oldest_call_for_a_fresher_one():
+    shed = []
+    scheduler = new_scheduler(shed, max_size=2)
+    scheduler.put(call("t1_old", author="first", age=30), 0)
+    scheduler.put(call("t1_older", author="second", age=60), 0)
+    scheduler.put(call("t1_fresh", author="third"), 0)
+
+    assert [job.item.fullname for job in shed] == ["t1_older"]
+    assert [scheduler.get().item.fullname for _ in range(2)] == ["t1_fresh", "t1_old"]  # Freshest first
+
+
+def test_pipeline_finishes_every_job():
+    finished = []
+    all_finished = threading.Event()
+
+    def post(job: ReplyJob):
+        if job.item.fullname == "t1_deleted":
+            raise ValueError("Comment deleted")
+
+    def on_finish(job: ReplyJob, replied: bool):
+        finished.append((job.item.fullname, job.reply_text, replied))
+        if len(finished) == 2:
+            all_finished.set()
+
+    pipeline = ReplyPipeline(lambda job: f"Reply to {job.item.fullname}", post, 1, 10, 10, 1000, 10, 1, 10, 10, 600,
+                             on_finish=on_finish)
+    pipeline.start()
+    pipeline.submit(call("t1_a", author="first"))
+    pipeline.submit(call("t1_deleted", author="second"))
+
+    assert all_finished.wait(5)
+    assert sorted(finished) == [("t1_a", "Reply to t1_a", True), ("t1_deleted", "Reply to t1_deleted", False)]
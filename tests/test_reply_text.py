@@ -0,0 +1,41 @@
+"""Reply texts: the random flavour text is only looked up for single-card replies that use it."""
+
+import pytest
+
+import func.text_functions as tf
+from data.configs import ScryfallSettings
+from data.rastamon_cards import Rastamon
+
+LINKS = ["https://example.com/joke.png"]
+
+
+@pytest.fixture
+def flavour_lookups(monkeypatch):
+    """The random flavour lookups made, with the card images looked up as not found."""
+    lookups = []
+
+    def get_random_flavour(_deadline):
+        lookups.append(True)
+        return "Storm Crow descending, winter unending."
+
+    monkeypatch.setattr(ScryfallSettings, "CONCURRENT_LOOKUPS", True)
+    monkeypatch.setattr(tf, "get_random_flavour", get_random_flavour)
+    monkeypatch.setattr(tf.sf, "get_card_images", lambda cardnames, deadline: dict.fromkeys(cardnames, ""))
+    monkeypatch.setattr(tf.random, "randint", lambda low, high: high)  # A regular reply, no easter egg
+    return lookups
+
+
+def test_single_card_reply_gets_a_random_flavour(flavour_lookups):
+    assert "_Storm Crow descending, winter unending._" in tf.generate_reply_text(["Llanowar Elves"], LINKS)
+    assert flavour_lookups == [True]
+
+
+def test_multi_card_reply_has_no_flavour_lookup(flavour_lookups):
+    tf.generate_reply_text(["Llanowar Elves", "Lightning Bolt"], LINKS)
+    assert flavour_lookups == []
+
+
+def test_special_card_with_its_own_flavour_has_no_flavour_lookup(flavour_lookups):
+    reply_text = tf.generate_reply_text([Rastamon.CARDS[0].proper_name], LINKS)
+    assert "Storm Crow descending" not in reply_text
+    assert flavour_lookups == []
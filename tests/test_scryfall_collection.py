@@ -0,0 +1,123 @@
+"""Batched card image lookups against a local stand-in for Scryfall's /cards/collection endpoint."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import func.scryfall_functions as sf
+from data.configs import ScryfallSettings
+from func.lookup_cache import LookupCache
+from func.response_cache import ResponseCache
+
+# Card names known to the stand-in, every other name is not found
+CARDS = ["Storm Crow", "Fire // Ice"] + [f"Card {number}" for number in range(160)]
+
+
+def image_url(card_name: str) -> str:
+    """The stand-in's image URL of a card."""
+    return f"https://example.com/{card_name.replace(' ', '_')}.jpg"
+
+
+class StandInScryfall(BaseHTTPRequestHandler):
+    """Answers /cards/collection like Scryfall: a card matches its full name or any of its face names."""
+    protocol_version = "HTTP/1.1"
+    batches = []  # Identifier counts of the requests
+    error_status = None  # Answer every request with this HTTP error status, None to answer normally
+
+    def do_POST(self):
+        """Card collection."""
+        identifiers = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["identifiers"]
+        self.batches.append(len(identifiers))
+        if self.error_status:
+            self.__reply(self.error_status, {"object": "error", "status": self.error_status})
+            return
+        names = {}
+        for card_name in CARDS:
+            for name in [card_name] + card_name.split(" // "):
+                names[name.casefold()] = card_name
+        data, not_found = [], []
+        for identifier in identifiers:
+            card_name = names.get(identifier["name"].casefold())
+            if card_name:
+                data.append({"object": "card", "name": card_name, "image_uris": {"normal": image_url(card_name)}})
+            else:
+                not_found.append(identifier)
+        self.__reply(200, {"object": "list", "not_found": not_found, "data": data})
+
+    def __reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stand_in_url():
+    """URL of the stand-in server."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInScryfall)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def scryfall(monkeypatch, stand_in_url):
+    """A client of the stand-in server and empty caches for every test, the module's own are put back after."""
+    monkeypatch.setattr(StandInScryfall, "batches", [])
+    monkeypatch.setattr(StandInScryfall, "error_status", None)
+    # The stand-in has no rate limit
+    monkeypatch.setattr(sf, "client", sf.ScryfallClient(stand_in_url, {}, 1000, 1000, 2, 1, 0, 5, 5))
+    monkeypatch.setattr(sf, "image_cache", LookupCache(ScryfallSettings.CACHE_MAX_SIZE, ScryfallSettings.CACHE_TTL,
+                                                       ScryfallSettings.CACHE_NEGATIVE_TTL))
+    monkeypatch.setattr(sf, "response_cache", ResponseCache(":memory:", ScryfallSettings.RESPONSE_CACHE_MAX_AGE,
+                                                            ScryfallSettings.RESPONSE_CACHE_NEGATIVE_MAX_AGE))
+
+
+def test_batches_at_collection_batch_size():
+    cardnames = [f"Card {number}" for number in range(160)]
+    images = sf.get_scryfall_images(cardnames)
+
+    batch_size = ScryfallSettings.COLLECTION_BATCH_SIZE
+    assert StandInScryfall.batches == [batch_size, batch_size, 160 - 2 * batch_size]
+    assert images == {cardname: image_url(cardname) for cardname in cardnames}
+
+
+def test_names_differing_by_case_are_requested_once():
+    images = sf.get_scryfall_images(["Storm Crow", "storm crow", "STORM CROW"])
+
+    assert StandInScryfall.batches == [1]
+    assert set(images.values()) == {image_url("Storm Crow")}
+
+
+def test_face_names_match_the_whole_card():
+    images = sf.get_scryfall_images(["Fire", "ice", "Fire // Ice"])
+
+    assert images == dict.fromkeys(["Fire", "ice", "Fire // Ice"], image_url("Fire // Ice"))
+
+
+def test_names_not_found_are_cached_as_not_cards():
+    images = sf.get_scryfall_images(["Storm Crow", "Stormy Crowbar"])
+
+    assert images == {"Storm Crow": image_url("Storm Crow"), "Stormy Crowbar": ""}
+    assert sf.response_cache.get("stormy crowbar").status == 404
+
+    # Both results are cached, misses too
+    assert sf.get_scryfall_images(["Stormy Crowbar", "Storm Crow"]) == images
+    assert StandInScryfall.batches == [2]
+
+
+def test_failed_requests_are_not_cached():
+    StandInScryfall.error_status = 404
+    assert sf.get_scryfall_images(["Storm Crow"]) == {"Storm Crow": ""}
+    assert sf.response_cache.get("storm crow") is None
+
+    StandInScryfall.error_status = None
+    assert sf.get_scryfall_images(["Storm Crow"]) == {"Storm Crow": image_url("Storm Crow")}
+    assert StandInScryfall.batches == [1, 1]
@@ -0,0 +1,56 @@
+"""Special card lookups: called names are normalized, and collectibles are found in priority order."""
+
+import pytest
+
+from func.special_cards import SpecialCardIndex, normalize_callname
+from func.text_functions import special_cards
+
+
+def handler(reply_text, _cardname):
+    return reply_text
+
+
+@pytest.mark.parametrize("called, normalized", [
+    ("Tōbō Dibi", "tobo dibi"),
+    ("KADŸOBA", "kadyoba"),
+    ("  Komdegé Swígu ", "komdege swigu"),
+    ("Ｎｅｇａｔｅ", "negate"),  # Fullwidth letters decompose to plain ones
+    ("Nægate", "nægate"),  # Not a combining accent, kept
+])
+def test_called_names_are_normalized(called, normalized):
+    assert normalize_callname(called) == normalized
+
+
+@pytest.mark.parametrize("called, name", [
+    ("negate", "Negate"), ("NÆGATE", "Negate"), ("Revel in Riches", "Revel in Riches"),
+    ("Tobo Dibi", "Tōbō Dibi"), ("tōbō dibi", "Tōbō Dibi"), ("Bôsgwan", "Bôsgwan"),
+    ("colossal dreadmaw", "Colossal Dreadmaw"), ("Storm Crow", "Storm Crow"),
+])
+def test_registered_spellings_find_their_card(called, name):
+    assert special_cards.find(called).name == name
+
+
+def test_other_names_are_not_special():
+    assert special_cards.find("Lightning Bolt") is None
+
+
+def test_a_spelling_belongs_to_one_card():
+    index = SpecialCardIndex()
+    index.register("Negate", ["negate"], handler)
+    with pytest.raises(ValueError):
+        index.register("Not Negate", ["NEGATE"], handler)
+
+
+def test_collectibles_are_found_in_registration_order():
+    index = SpecialCardIndex()
+    available = {"Colossal Dreadmaw": True}
+    dreadmaw = index.register("Colossal Dreadmaw", ["colossal dreadmaw"], handler, collectible=True,
+                              available=lambda: available["Colossal Dreadmaw"])
+    storm_crow = index.register("Storm Crow", ["storm crow"], handler, collectible=True)
+    called = [index.find(name) for name in ["Storm Crow", "Lightning Bolt", "Colossal Dreadmaw"]]
+
+    assert index.find_collectible(called) is dreadmaw
+    available["Colossal Dreadmaw"] = False  # On cooldown
+    assert index.find_collectible(called) is dreadmaw
+    assert index.find_collectible(called, available_only=True) is storm_crow
+    assert index.find_collectible([index.find("Lightning Bolt")]) is None
@@ -0,0 +1,123 @@
+"""Stream checkpoints: resuming a stream after a restart, and moving the checkpoint only past handled calls."""
+
+import time
+import types
+
+import pytest
+
+import func.reddit_actions as r
+from data.configs import ReplySettings
+from func.reddit_connection import SubredditData
+from func.stream_checkpoints import CheckpointStore
+
+TARGET = "magicthecirclejerking"
+
+
+def stand_in_comment(comment_id: str, age: float, body: str = "Look at [[Lightning Bolt]]"):
+    """A praw comment stand-in posted age seconds ago."""
+    return types.SimpleNamespace(
+        id=comment_id, fullname=f"t1_{comment_id}", created_utc=time.time() - age, body=body,
+        author=types.SimpleNamespace(name="caller"), subreddit=types.SimpleNamespace(display_name=TARGET),
+        link_id="t3_thread", permalink=f"/r/{TARGET}/comments/thread/_/{comment_id}"
+    )
+
+
+class StandInSubreddit:
+    """Lists the given comments (newest first) and no submissions, its live comment stream records how it was opened."""
+    def __init__(self, listed: list):
+        self.listed = listed
+        self.stream_options = []
+        self.stream = types.SimpleNamespace(comments=self.__live_comments,
+                                            submissions=lambda pause_after, **options: iter([None]))
+
+    def comments(self, limit: int):
+        return iter(self.listed[:limit])
+
+    def new(self, limit: int):
+        return iter([])
+
+    def __live_comments(self, pause_after: int, **options):
+        self.stream_options.append(options)
+        return iter([None])
+
+
+class StandInReddit:
+    """A praw.Reddit stand-in with one subreddit."""
+    def __init__(self, listed: list):
+        self.stand_in_subreddit = StandInSubreddit(listed)
+
+    def subreddit(self, _name: str):
+        return self.stand_in_subreddit
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """The reply jobs queued, in place of the reply pipeline."""
+    jobs = []
+    monkeypatch.setattr(r, "reply_pipeline", types.SimpleNamespace(submit=lambda job: jobs.append(job) or True))
+    r.title_cache.put("t3_thread", "A thread")  # No title prefetch request
+    return jobs
+
+
+def open_stream(tmp_path, checkpoint: tuple, listed: list):
+    """
+    A SubredditData of the stand-in subreddit, resumed from the checkpoint, and a RedditData stand-in holding it.
+    """
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    store.save(TARGET, "comment", *checkpoint)
+    reddit = StandInReddit(listed)
+    stream_data = SubredditData(TARGET, reddit, store)
+    reddit_data = types.SimpleNamespace(reddit=reddit, subreddit_streams={TARGET: stream_data},
+                                        done=stream_data.done)
+    return store, stream_data, reddit_data
+
+
+def test_stale_checkpoint_still_catches_up_on_fresh_calls(tmp_path, submitted):
+    fresh = stand_in_comment("105", 30)
+    too_old = stand_in_comment("102", ReplySettings.MAX_REPLY_AGE + 60)
+    _, _, reddit_data = open_stream(tmp_path, ("t1_100", time.time() - 3600), [fresh, too_old])
+
+    assert r.comment_action(reddit_data, TARGET, []) == 1
+    assert [job.item for job in submitted] == [fresh]
+    assert reddit_data.reddit.stand_in_subreddit.stream_options == [{"continue_after_id": "t1_105"}]
+
+
+def test_resume_continues_after_the_newest_listed_item(tmp_path, submitted):
+    too_old = stand_in_comment("104", ReplySettings.MAX_REPLY_AGE + 60)
+    _, _, reddit_data = open_stream(tmp_path, ("t1_100", time.time() - 3600), [too_old])
+
+    assert r.comment_action(reddit_data, TARGET, []) == 0
+    assert submitted == []
+    # Not the old checkpoint, which praw would page from
+    assert reddit_data.reddit.stand_in_subreddit.stream_options == [{"continue_after_id": "t1_104"}]
+
+
+def test_resume_with_nothing_listed_skips_existing(tmp_path, submitted):
+    _, _, reddit_data = open_stream(tmp_path, ("t1_100", time.time() - 3600), [])
+
+    r.comment_action(reddit_data, TARGET, [])
+    assert reddit_data.reddit.stand_in_subreddit.stream_options == [{"skip_existing": True}]
+
+
+def test_checkpoint_waits_for_queued_replies(tmp_path, submitted):
+    call = stand_in_comment("105", 30)
+    no_call = stand_in_comment("106", 20, body="No cards here")
+    store, stream_data, reddit_data = open_stream(tmp_path, ("t1_100", time.time() - 3600), [no_call, call])
+
+    r.comment_action(reddit_data, TARGET, [])
+    assert store.load(TARGET, "comment")[0] == "t1_100"  # The call is still in the pipeline
+
+    r.finish_reply(submitted[0], True)
+    stream_data.comments = iter([None])
+    r.comment_action(reddit_data, TARGET, [])
+    assert store.load(TARGET, "comment")[0] == "t1_106"
+
+
+def test_delivered_again_after_a_resume_is_skipped(tmp_path, submitted):
+    call = stand_in_comment("105", 30)
+    _, stream_data, reddit_data = open_stream(tmp_path, ("t1_100", time.time() - 3600), [call])
+    r.comment_action(reddit_data, TARGET, [])
+
+    stream_data.comments = iter([call, None])  # Still in flight
+    assert r.comment_action(reddit_data, TARGET, []) == 0
+    assert len(submitted) == 1